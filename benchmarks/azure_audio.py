@@ -0,0 +1,92 @@
+"""
+Per-utterance cost of getting Azure's audio into numpy: the 10MB zero
+filled buffer it used to read into, against azure.read_audio_data().
+
+    python -m benchmarks.azure_audio
+
+No network; FakeStream stands in for speechsdk.AudioDataStream on a
+finished result, and like the real one it writes into the bytes it is
+handed.  Peak memory is from tracemalloc.
+"""
+import ctypes
+import time
+import tracemalloc
+
+import numpy as np
+
+import cnv.engines  # the engine modules need the registry loaded first
+from cnv.engines.azure import RIFF_HEADER_BYTES, read_audio_data
+
+# Riff24Khz16BitMonoPcm
+BYTES_PER_SECOND = 24000 * 2
+# utterance lengths, seconds
+UTTERANCES = (3, 15, 60)
+# best of this many runs
+REPEAT = 20
+
+
+class FakeStream:
+    """
+    read_data() for a result that is done synthesizing: as much as fits,
+    written into the caller's bytes the way the sdk does it.
+    """
+    def __init__(self, data: bytes):
+        self.data = data
+        self.position = 0
+
+    def read_data(self, audio_buffer: bytes) -> int:
+        size = min(len(audio_buffer), len(self.data) - self.position)
+        if size > 0:
+            ctypes.memmove(audio_buffer, self.data[self.position:self.position + size], size)
+            self.position += size
+        return size
+
+
+def ten_megabytes(stream):
+    """
+    get_speech before read_audio_data.
+    """
+    audio_buffer = bytes(10000000)
+    size = stream.read_data(audio_buffer)
+    return np.frombuffer(audio_buffer[:size], dtype=np.int16)
+
+
+def chunked(stream):
+    data = read_audio_data(stream)
+    offset = RIFF_HEADER_BYTES if data[:4] == b"RIFF" else 0
+    return np.frombuffer(data, dtype=np.int16, offset=offset)
+
+
+def measure(read, wav):
+    fastest = None
+    for _ in range(REPEAT):
+        stream = FakeStream(wav)
+        start = time.perf_counter()
+        read(stream)
+        elapsed = time.perf_counter() - start
+        fastest = elapsed if fastest is None else min(fastest, elapsed)
+
+    tracemalloc.start()
+    samples = read(FakeStream(wav))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return fastest, peak, samples
+
+
+def main():
+    rng = np.random.default_rng(0)
+    for seconds in UTTERANCES:
+        pcm = rng.integers(-3000, 3000, seconds * 24000, dtype=np.int16).tobytes()
+        wav = b"RIFF" + bytes(RIFF_HEADER_BYTES - 4) + pcm
+
+        print(f'{seconds}s utterance, {len(wav) / 1e6:.2f}MB:')
+        for label, read in (('10MB buffer', ten_megabytes), ('read_audio_data', chunked)):
+            elapsed, peak, samples = measure(read, wav)
+            print(
+                f'    {label:<16} peak {peak / 1e6:6.2f}MB, {elapsed * 1000:6.2f}ms, '
+                f'{len(samples)} samples'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+combat.parse() against the parsing the tail loop used to do inline: regex
+string literals through re.fullmatch on the re-joined tokens, and
+list.index() for the "You gain" lines.
+
+    python -m benchmarks.combat_lines [chatlog.txt]
+
+Give it a recorded chat log, otherwise it uses a mix of the combat lines in
+combat's docstring and the lines around them that aren't combat at all (a
+fight log is mostly other people hitting you).
+
+The tail loop splits every line into tokens either way, so that isn't
+timed; the inline parser gets the tokens, combat.parse() gets the text.
+"""
+import random
+import re
+import sys
+import time
+
+from cnv.chatlog import combat
+from cnv.chatlog.logline import LogLine
+
+# best of this many runs
+REPEAT = 5
+# made up lines, when there is no log to read
+LINES = 50000
+
+SAMPLES = [
+    (30, "You hit Abomination with your Assassin's Psi Blade for 43.22 points of Psionic damage."),
+    (5, "You hit Zealot with your Bitter Ice Blast for 13088 points of Cold damage (SCOURGE)"),
+    (10, "You hit Button Man Buckshot with your Dart Burst for 10.61 points of Lethal damage over time."),
+    (5, "You hit Arva with your Freeze Ray for 7.49 points of Cold damage over time (SCOURGE)."),
+    (2, "You hit Gravedigger Slammer with your Twilight Grasp reducing their damage and chance to hit and healing you and your allies!"),
+    (8, "MISSED Mamba Blade!! Your Contaminated Strike power had a 95.00% chance to hit, you rolled a 95.29."),
+    (3, "You gain 104 experience and 36 influence."),
+    (1, "You gain 15 experience, work off 15 debt, and gain 14 influence."),
+    (1, "You gain 2 stacks of Blood Frenzy!"),
+    (20, "Hellfrost hits you with their Chilling Embrace for 12.5 points of Cold damage."),
+    (8, "Mamba Blade MISSES! Their Contaminated Strike power had a 95.00% chance to hit, but they rolled a 97.29."),
+    (5, "You have defeated Abomination"),
+    (5, "[Local] Positron: Get to the bridge, we need to stop them there."),
+]
+
+
+def inline_parse(lstring):
+    """
+    What LogStream.tail did before combat.py, minus the database.
+    """
+    if lstring[0] == "You":
+        if lstring[1] == "gain":
+            inf_gain = None
+            xp_gain = None
+            for inftype in ["influence", "information"]:
+                try:
+                    influence_index = lstring.index(inftype) - 1
+                    inf_gain = int(lstring[influence_index].replace(",", ""))
+                except ValueError:
+                    pass
+            try:
+                if 'experience' in lstring:
+                    xp_gain = lstring[lstring.index('experience') - 1]
+                elif 'experience,' in lstring:
+                    xp_gain = lstring[lstring.index('experience,') - 1]
+                if xp_gain:
+                    xp_gain = int(xp_gain.replace(",", ""))
+            except ValueError:
+                pass
+            if inf_gain or xp_gain:
+                return ('gain', xp_gain, inf_gain)
+
+        if lstring[1] == "hit":
+            m = re.fullmatch(
+                r"You hit (?P<target>.*) with your (?P<power>.*) for (?P<damage>.*) points of (?P<damage_type>.*) damage( |\.)?(?P<DOT>[^\n\(\.A-Z]*)[^\nA-Z\(]*\(?(?P<special>[A-Z]*).*",
+                " ".join(lstring)
+            )
+            if m:
+                return ('hit', m['target'], m['power'], int(m['damage']), m['damage_type'])
+            m = re.fullmatch(
+                r"You hit (?P<target>.*) with your (?P<power>.*) reducing .*",
+                " ".join(lstring)
+            )
+            if m:
+                return ('debuff', m['target'], m['power'])
+
+    if lstring[0] == "MISSED":
+        m = re.fullmatch(
+            r"MISSED (?P<target>.*)!! Your (?P<power>.*) power had a (?P<chance_to_hit>[0-9\.]*)% chance to hit, you rolled a (?P<roll>[0-9\.]*).",
+            " ".join(lstring)
+        )
+        if m:
+            return ('miss', ) + m.groups()
+    return None
+
+
+def made_up_corpus(count):
+    rng = random.Random(0)
+    weights, texts = zip(*SAMPLES)
+    return rng.choices(texts, weights, k=count)
+
+
+def tokens(text):
+    # the same tokens LogLine has
+    return text.replace(".", "").split()
+
+
+def seconds(parse, corpus):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for line in corpus:
+            parse(line)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8", errors="replace") as handle:
+            lines = [LogLine.parse(raw) for raw in handle]
+        corpus = [line.text for line in lines if line and line.tokens]
+        source = sys.argv[1]
+    else:
+        corpus = made_up_corpus(LINES)
+        source = "made up"
+
+    print(f'{len(corpus)} lines ({source})')
+    for label, parse, lines in (
+        ('inline', inline_parse, [tokens(text) for text in corpus]),
+        ('combat.parse', combat.parse, corpus),
+    ):
+        elapsed = seconds(parse, lines)
+        understood = sum(1 for line in lines if parse(line) is not None)
+        print(
+            f'    {label:<14} {elapsed / len(corpus) * 1e6:5.2f}us per line, '
+            f'{len(corpus) / elapsed / 1e3:6.0f}k lines/sec, '
+            f'{understood} combat lines'
+        )
+
+    print('per kind of line, us:')
+    for _, text in SAMPLES:
+        count = 10000
+        print(
+            f'    {seconds(inline_parse, [tokens(text)] * count) / count * 1e6:5.2f} -> '
+            f'{seconds(combat.parse, [text] * count) / count * 1e6:5.2f}  {text[:60]}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Character.create_character() for 1,000 NPCs out of the presets.json groups,
+into a file backed database like the real one.
+
+    python -m benchmarks.create_characters [count]
+
+Runs in a temporary directory: a fresh voices.db, the repo's presets.json
+and aliases.json, a config.json with Eleven Labs and Windows TTS as the npc
+engines, and made up voice catalogs for both (nothing goes over the
+network, no engine gets built).  Names come from all_npcs.json, only NPCs
+whose group has a preset; there are fewer of those than 1,000, so each one
+gets created several times.
+"""
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, select
+
+import cnv.database.models as models
+import cnv.lib.settings as settings
+from cnv.engines import manifest
+
+COUNT = 1000
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRIMARY = 'elevenlabs'
+SECONDARY = 'windowstts'
+
+
+def scratch_setup():
+    """
+    Everything create_character reads, in the current directory.
+    """
+    for filename in (settings.PRESETS, settings.ALIASES):
+        shutil.copy(os.path.join(REPO, filename), filename)
+
+    settings.save_config({
+        'npc_engine_primary': manifest.ENGINES[PRIMARY]['cosmetic'],
+        'npc_engine_secondary': manifest.ENGINES[SECONDARY]['cosmetic'],
+        'language': 'English',
+    })
+
+    rng = random.Random(0)
+    settings.diskcache(f'{PRIMARY}_voice_name', [
+        {'id': f'id{index}', 'voice_name': f'Voice {index}', 'gender': rng.choice(['Male', 'Female'])}
+        for index in range(40)
+    ])
+    settings.diskcache(f'{SECONDARY}_voice_name', [
+        {'voice_name': f'Windows {index}', 'gender': rng.choice(['Male', 'Female']),
+         'language_code': ['en-US', 'fr-FR'][index % 2]}
+        for index in range(12)
+    ])
+
+    models.Base.metadata.create_all(models.engine)
+    with models.db() as session:
+        with models.transaction(session):
+            for engine_key in (PRIMARY, SECONDARY):
+                for cosmetic, key, varfunc, default, cfg, gatherfunc in manifest.ENGINES[engine_key]['config']:
+                    session.add(models.EngineConfigMeta(
+                        engine_key=engine_key,
+                        cosmetic=cosmetic,
+                        key=key,
+                        varfunc=varfunc,
+                        default=default,
+                        cfgdict=cfg,
+                        gatherfunc=gatherfunc
+                    ))
+
+
+def npc_names(count):
+    """
+    count names of NPCs whose group has a preset, going round again as
+    often as it takes.
+    """
+    with open(settings.ALL_NPC_FN, encoding="utf-8") as handle:
+        npcs = json.load(handle)
+
+    names = [
+        name for name, npc in npcs.items()
+        if settings.get_preset(npc.get('group_name'))
+    ]
+    groups = {npcs[name]['group_name'] for name in names}
+    return [names[index % len(names)] for index in range(count)], groups
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else COUNT
+    random.seed(0)
+    # create_character logs every character at INFO; that isn't what we're
+    # timing.
+    logging.getLogger().setLevel(logging.WARNING)
+
+    start_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        # models.engine was pointed at voices.db in whatever directory we were
+        # in when it was imported, not this one.
+        models.engine = create_engine(
+            "sqlite:///" + os.path.join(scratch, "voices.db"),
+            connect_args={'timeout': 2},
+            isolation_level="AUTOCOMMIT",
+        )
+        try:
+            scratch_setup()
+            names, groups = npc_names(count)
+            npc = models.category_str2int('npc')
+
+            started = time.perf_counter()
+            with models.db() as session:
+                for name in names:
+                    models.Character.create_character(name, npc, session)
+            elapsed = time.perf_counter() - started
+
+            with models.db() as session:
+                rows = {
+                    table.__tablename__: session.scalar(select(func.count()).select_from(table))
+                    for table in (models.Character, models.BaseTTSConfig, models.Effects, models.EffectSetting)
+                }
+            models.engine.dispose()
+        finally:
+            os.chdir(start_dir)
+
+    print(f'{count} characters from {", ".join(sorted(groups))}:')
+    print(f'    {elapsed:.2f}s, {elapsed / count * 1000:.2f}ms each')
+    print('    ' + ', '.join(f'{rows[table]} {table}' for table in rows))
+
+
+if __name__ == '__main__':
+    main()
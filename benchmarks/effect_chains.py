@@ -0,0 +1,123 @@
+"""
+Samples per second through an effect chain, one PedalboardEffect per plugin
+against the same chain after effects.base.fuse_effects().
+
+    python -m benchmarks.effect_chains
+
+Both ways: the whole clip at once (voice_builder.create) and a piece at a
+time through streaming.StreamingEffects (the streaming path, where the per
+call overhead is what fusing saves).
+"""
+import time
+
+import numpy as np
+import pedalboard
+from voicebox.audio import Audio
+from voicebox.effects import Normalize, PedalboardEffect, RingMod
+
+from cnv.effects.base import fuse_effects
+from cnv.voices.streaming import StreamingEffects
+
+SAMPLE_RATE = 24000
+SECONDS = 5
+# best of this many runs
+REPEAT = 5
+# streaming piece sizes, in samples
+PIECES = (960, 4800)
+
+
+def plugins(*plugins):
+    return [PedalboardEffect(plugin) for plugin in plugins]
+
+
+CHAINS = {
+    'five pedalboard effects': lambda: plugins(
+        pedalboard.Compressor(threshold_db=-20),
+        pedalboard.Chorus(),
+        pedalboard.Distortion(drive_db=10),
+        pedalboard.Gain(gain_db=-3),
+        pedalboard.HighShelfFilter(cutoff_frequency_hz=3000),
+    ),
+    'reverb, pitchshift, highshelf': lambda: plugins(
+        pedalboard.Reverb(room_size=0.3),
+        pedalboard.PitchShift(semitones=-3),
+        pedalboard.HighShelfFilter(cutoff_frequency_hz=3000),
+    ),
+    'gain, lowpass, bitcrush, clipping, ringmod, normalize': lambda: plugins(
+        pedalboard.Gain(gain_db=3),
+        pedalboard.LowpassFilter(cutoff_frequency_hz=4000),
+        pedalboard.Bitcrush(bit_depth=8),
+        pedalboard.Clipping(threshold_db=-6),
+    ) + [RingMod(carrier_freq=30), Normalize()],
+}
+
+
+def whole_clip(effects, audio):
+    for effect in effects:
+        audio = effect.apply(audio)
+    return audio
+
+
+def streamed(effects, audio, piece):
+    chain = StreamingEffects.build(effects)
+    if chain is None:
+        return None
+    for start in range(0, len(audio.signal), piece):
+        chain.process(audio.copy(signal=audio.signal[start:start + piece]))
+    chain.flush(audio.sample_rate)
+    return True
+
+
+def rate(run, effects_factory, audio, *args):
+    """
+    Best samples/sec over REPEAT runs, fresh effects each time so nothing
+    carries state from the run before.  None if run() couldn't do it.
+    """
+    best = None
+    for _ in range(REPEAT):
+        effects = effects_factory()
+        start = time.perf_counter()
+        if run(effects, audio, *args) is None:
+            return None
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(audio.signal) / best
+
+
+def show(label, separate, fused):
+    if separate is None or fused is None:
+        print(f'    {label:<24} can not stream')
+        return
+    print(
+        f'    {label:<24} {separate / 1e6:6.1f}M -> {fused / 1e6:6.1f}M '
+        f'samples/sec ({fused / separate:.2f}x)'
+    )
+
+
+def main():
+    rng = np.random.default_rng(0)
+    audio = Audio(
+        rng.uniform(-0.5, 0.5, SAMPLE_RATE * SECONDS).astype(np.float32),
+        SAMPLE_RATE
+    )
+
+    for name, factory in CHAINS.items():
+        def fused():
+            return fuse_effects(factory())
+
+        print(f'{name}: {len(factory())} effects, {len(fused())} fused')
+        show(
+            'whole clip',
+            rate(whole_clip, factory, audio),
+            rate(whole_clip, fused, audio)
+        )
+        for piece in PIECES:
+            show(
+                f'streaming, {piece} samples',
+                rate(streamed, factory, audio, piece),
+                rate(streamed, fused, audio, piece)
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+The progress chart's query: grouping raw hero_stat_events by STRFTIME
+minute (the way it was) against reading hero_stat_rollup.
+
+    python -m benchmarks.hero_stat_rollup [events]
+
+Builds a scratch database in a temporary directory with one hero and
+`events` (default 2,000,000) xp/influence events, one every few seconds
+going back months, then times what the chart does every minute: the last
+two hours, per minute.  The old query is timed both without the
+hero_id/event_time index (the schema before the rollup) and with it.
+
+Also times the backfill the migration does, and what keeping the rollup up
+to date adds to recording an event.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Index, create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+import cnv.database.models as models
+
+EVENTS = 2000000
+# rows per insert while building the scratch database
+BATCH = 100000
+# best of this many runs
+REPEAT = 5
+# events recorded one at a time, for the write cost
+WRITES = 500
+
+HERO_ID = 1
+# the chart shows the two hours up to the latest event
+WINDOW = timedelta(minutes=120)
+
+
+def populate(session, count):
+    """
+    count events ending now-ish, returns the time of the last one.
+    """
+    rng = random.Random(0)
+    when = datetime(2024, 1, 1, 12, 0, 0)
+    for first in range(0, count, BATCH):
+        rows = []
+        for _ in range(min(BATCH, count - first)):
+            when += timedelta(seconds=rng.randint(1, 10))
+            rows.append({
+                'hero_id': HERO_ID,
+                'event_time': when,
+                'xp_gain': rng.randint(10, 500),
+                'inf_gain': rng.randint(5, 200),
+            })
+        with models.transaction(session):
+            session.execute(insert(models.HeroStatEvent), rows)
+    return when
+
+
+def strftime_query(session, start_time, end_time):
+    """
+    ChartFrame.get_binned_samples before the rollup.
+    """
+    return session.execute(
+        select(
+            func.STRFTIME('%Y-%m-%d %H:%M:00', models.HeroStatEvent.event_time).label('EventMinute'),
+            func.sum(models.HeroStatEvent.xp_gain).label('xp_gain'),
+            func.sum(models.HeroStatEvent.inf_gain).label('inf_gain')
+        ).where(
+            models.HeroStatEvent.hero_id == HERO_ID,
+            models.HeroStatEvent.event_time >= start_time,
+            models.HeroStatEvent.event_time <= end_time,
+        ).group_by(
+            'EventMinute'
+        ).order_by(
+            'EventMinute'
+        )
+    ).all()
+
+
+def rollup_query(session, start_time, end_time):
+    return models.get_hero_stat_rollup(session, HERO_ID, start_time, end_time)
+
+
+def best(run, *args):
+    """
+    (best seconds, what run returned)
+    """
+    fastest = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = run(*args)
+        elapsed = time.perf_counter() - start
+        fastest = elapsed if fastest is None else min(fastest, elapsed)
+    return fastest, result
+
+
+def record_plain(session, event_time):
+    with models.transaction(session):
+        session.add(models.HeroStatEvent(
+            hero_id=HERO_ID, event_time=event_time, xp_gain=100, inf_gain=50
+        ))
+
+
+def record_with_rollup(session, event_time):
+    models.add_hero_stat_event(session, HERO_ID, event_time, 100, 50)
+
+
+def writes(record, session, start):
+    began = time.perf_counter()
+    for index in range(WRITES):
+        record(session, start + timedelta(seconds=index))
+    return (time.perf_counter() - began) / WRITES
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else EVENTS
+
+    with tempfile.TemporaryDirectory() as scratch:
+        engine = create_engine(
+            "sqlite:///" + os.path.join(scratch, "voices.db"),
+            isolation_level="AUTOCOMMIT",
+        )
+        event_index = next(
+            index for index in models.HeroStatEvent.__table__.indexes
+            if index.name == 'ix_hero_stat_events_hero_time'
+        )
+        models.Base.metadata.create_all(engine, tables=[
+            models.Hero.__table__,
+            models.HeroStatRollup.__table__,
+        ])
+        # hero_stat_events the way it was, no index
+        models.HeroStatEvent.__table__.create(engine)
+        event_index.drop(engine)
+
+        with Session(engine) as session:
+            started = time.perf_counter()
+            last = populate(session, count)
+            print(f'{count} events over {last - datetime(2024, 1, 1, 12)} '
+                  f'({time.perf_counter() - started:.1f}s to build)')
+
+            end_time = last
+            start_time = end_time - WINDOW
+
+            unindexed, rows = best(strftime_query, session, start_time, end_time)
+
+            started = time.perf_counter()
+            Index(event_index.name, *event_index.columns).create(engine)
+            print(f'    index hero_id, event_time: {time.perf_counter() - started:.1f}s')
+
+            started = time.perf_counter()
+            models.backfill_hero_stat_rollup(session)
+            print(f'    backfill hero_stat_rollup: {time.perf_counter() - started:.1f}s')
+
+            indexed, _ = best(strftime_query, session, start_time, end_time)
+            rolled, buckets = best(rollup_query, session, start_time, end_time)
+
+            print(f'last two hours, {len(rows)} minutes:')
+            print(f'    STRFTIME, no index   {unindexed * 1000:8.2f}ms')
+            print(f'    STRFTIME, indexed    {indexed * 1000:8.2f}ms')
+            print(f'    hero_stat_rollup     {rolled * 1000:8.2f}ms ({len(buckets)} buckets)')
+
+            # the first minute differs; the rollup has all of it, the old
+            # query only the part after start_time.
+            assert [
+                (row.EventMinute, row.xp_gain, row.inf_gain) for row in rows[1:]
+            ] == [
+                (bucket.bucket_start.strftime('%Y-%m-%d %H:%M:00'), bucket.xp_gain, bucket.inf_gain)
+                for bucket in buckets[1:]
+            ], "the rollup doesn't match the events"
+
+            after = last + timedelta(days=1)
+            plain = writes(record_plain, session, after)
+            rollup = writes(record_with_rollup, session, after + timedelta(days=1))
+            print(f'recording an event, {WRITES} of them:')
+            print(f'    event only           {plain * 1000:8.2f}ms')
+            print(f'    event and rollup     {rollup * 1000:8.2f}ms')
+
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
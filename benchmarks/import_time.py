@@ -0,0 +1,95 @@
+"""
+What it costs to import the startup modules, from `python -X importtime`.
+
+    python -m benchmarks.import_time
+
+Each import gets a fresh interpreter, best of REPEAT.  For each one: the
+total import time, how many modules came in with it, which of the heavy
+engine SDKs got loaded and the packages that took the longest.
+
+Our engines load their SDKs on first use, but voicebox brings in its own
+elevenlabs, google cloud and pedalboard backends whatever we do; anything
+else in that list is a regression.
+"""
+import subprocess
+import sys
+
+# best of this many runs
+REPEAT = 3
+# slowest packages to show
+SHOW = 8
+
+IMPORTS = {
+    'engines registry': 'cnv.engines',
+    'database': 'cnv.database.models',
+    'voice builder': 'cnv.voices.voice_builder',
+    'effects registry': 'cnv.effects',
+    'startup': 'cnv.database.models, cnv.voices.voice_builder, cnv.effects',
+}
+
+# module -> what it is
+SDKS = {
+    'azure.cognitiveservices.speech': 'azure speech',
+    'boto3': 'boto3',
+    'elevenlabs': 'elevenlabs',
+    'google.cloud.texttospeech': 'google cloud tts',
+    'openai': 'openai',
+    'pedalboard': 'pedalboard',
+}
+
+# pygame imports a bit more on the way out, so the report is marked
+REPORT_SDKS = (
+    "import sys; print('sdks:' + ','.join(m for m in %r if m in sys.modules), "
+    "file=sys.stderr)"
+)
+
+
+def profile(modules):
+    """
+    (microseconds, {package: microseconds}, module count, SDKs loaded) for
+    one fresh `import modules`.  A package's time is the time spent in its
+    own modules, not in what they import from other packages.
+    """
+    code = f"import {modules}; " + REPORT_SDKS % (tuple(SDKS), )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, check=True
+    )
+    lines = result.stderr.splitlines()
+
+    packages = {}
+    total = 0
+    count = 0
+    loaded = []
+    for line in lines:
+        if line.startswith('sdks:'):
+            loaded = [SDKS[m] for m in line[len('sdks:'):].split(',') if m]
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        # import time:       self |  cumulative | name
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        count += 1
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        # nested imports are indented under whoever imported them
+        if not name.startswith('  '):
+            total += int(cumulative)
+
+    return total, packages, count, loaded
+
+
+def main():
+    for label, modules in IMPORTS.items():
+        best = min((profile(modules) for _ in range(REPEAT)), key=lambda run: run[0])
+        total, packages, count, loaded = best
+
+        print(f'{label} (import {modules}):')
+        print(f'    {total / 1000:.0f}ms, {count} modules')
+        print(f'    engine SDKs loaded: {", ".join(loaded) or "none"}')
+        slowest = sorted(packages.items(), key=lambda item: -item[1])[:SHOW]
+        for name, us in slowest:
+            print(f'    {us / 1000:8.1f}ms  {name}')
+
+
+if __name__ == '__main__':
+    main()
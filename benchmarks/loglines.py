@@ -0,0 +1,155 @@
+"""
+What the tail loop allocates per chat log line: splitting and re-joining
+the tokens in every parser (the way it was) against one LogLine per line.
+
+    python -m benchmarks.loglines [chatlog.txt]
+
+Give it a recorded chat log, otherwise it makes up a fight's worth of one
+from the kinds of lines the tail loop sees.  Each side asks for the views
+the tail loop and its parsers ask for on that kind of line, and keeps
+whatever got built so tracemalloc can count it.
+"""
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from cnv.chatlog.logline import LogLine
+
+# best of this many runs
+REPEAT = 5
+# made up lines, when there is no log to read
+LINES = 50000
+
+SAMPLES = [
+    (30, "You hit Abomination with your Assassin's Psi Blade for 43.22 points of Psionic damage."),
+    (10, "You hit Arva with your Freeze Ray for 7.49 points of Cold damage over time (SCOURGE)."),
+    (2, "You hit Gravedigger Slammer with your Twilight Grasp reducing their damage and chance to hit and healing you and your allies!"),
+    (8, "MISSED Mamba Blade!! Your Contaminated Strike power had a 95.00% chance to hit, you rolled a 95.29."),
+    (4, "You gain 104 experience and 36 influence."),
+    (15, "Hellfrost hits you with their Chilling Embrace for 12.5 points of Cold damage."),
+    (6, "Hasten is recharged."),
+    (8, "[Local] Positron: Get to the bridge, we need to stop them there."),
+    (6, "[Team] Scrapper: inc, everybody stay on me."),
+    (3, "[Tell] -->Tanker: omw, two minutes."),
+    (3, "[Caption] <scale 1.75><color white>You will not stop the Rikti!"),
+    (5, "You have defeated Abomination"),
+]
+
+
+def made_up_log(count):
+    rng = random.Random(0)
+    weights, texts = zip(*SAMPLES)
+    when = datetime(2024, 4, 26, 18, 40, 13)
+    log = []
+    for text in rng.choices(texts, weights, k=count):
+        when += timedelta(seconds=rng.choice((0, 0, 0, 1)))
+        log.append(f"{when:%Y-%m-%d %H:%M:%S} {text}\n")
+    return log
+
+
+def split_every_time(raw):
+    """
+    The tail loop before LogLine, and the joins its parsers did.
+    """
+    datestr, timestr, line_string = raw.split(None, 2)
+    line_string = line_string.strip()
+    lstring = line_string.replace(".", "").strip().split()
+    built = [datestr, timestr, line_string, lstring]
+
+    if lstring[0][0] == "[":
+        # channel_chat_parser and friends
+        built.append(" ".join(lstring[1:]))
+    elif lstring[0] == "You" and lstring[1] == "gain":
+        built.append(datetime.strptime(f"{datestr} {timestr}", "%Y-%m-%d %H:%M:%S"))
+    elif lstring[0] == "You" and lstring[1] == "hit":
+        # the hit regex, and the debuff one when that didn't match
+        built.append(" ".join(lstring))
+        if "reducing" in lstring:
+            built.append(" ".join(lstring))
+    elif lstring[0] == "MISSED":
+        built.append(" ".join(lstring))
+    elif lstring[-2:] == ["is", "recharged"]:
+        built.append(" ".join(lstring[0:lstring.index("is")]))
+        built.append(" ".join(lstring[0:-2]))
+    else:
+        # the pattern matcher
+        built.append(lstring[0])
+        built.append(" ".join(lstring[1:]))
+    return built
+
+
+def logline(raw):
+    """
+    The tail loop now.
+    """
+    line = LogLine(raw)
+    lstring = line.tokens
+    built = [line]
+
+    if lstring[0][0] == "[":
+        built.append(line.remainder)
+    elif lstring[0] in ("You", "MISSED"):
+        # combat.parse(line.text), nothing new to build
+        if lstring[1] == "gain":
+            built.append(line.timestamp)
+        else:
+            built.append(line.seconds)
+    elif lstring[-2:] == ["is", "recharged"]:
+        built.append(line.joined[:-len(" is recharged")])
+    else:
+        built.append(line.prefix)
+        built.append(line.remainder)
+    return built
+
+
+def allocated(parse, log):
+    """
+    (bytes, blocks) still held by what parse built for every line of log.
+    """
+    kept = [None] * len(log)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    blocks = sys.getallocatedblocks()
+    for index, raw in enumerate(log):
+        kept[index] = parse(raw)
+    blocks = sys.getallocatedblocks() - blocks
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, blocks
+
+
+def seconds(parse, log):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for raw in log:
+            parse(raw)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8", errors="replace") as handle:
+            log = [raw for raw in handle if LogLine.parse(raw) and LogLine(raw).tokens]
+        source = sys.argv[1]
+    else:
+        log = made_up_log(LINES)
+        source = "made up"
+
+    print(f'{len(log)} lines ({source})')
+    for label, parse in (('split every time', split_every_time), ('LogLine', logline)):
+        size, blocks = allocated(parse, log)
+        elapsed = seconds(parse, log)
+        print(
+            f'    {label:<18} {size / len(log):6.0f} bytes, '
+            f'{blocks / len(log):4.1f} blocks, '
+            f'{elapsed / len(log) * 1e6:5.2f}us per line'
+        )
+
+
+if __name__ == '__main__':
+    main()
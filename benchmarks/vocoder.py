@@ -0,0 +1,125 @@
+"""
+effects.vocoder.FilterBankVocoder against voicebox.effects.Vocoder, at the
+Clockwork preset's settings.
+
+    python -m benchmarks.vocoder
+
+The first render after a start has to design the filter bank and filter
+the carrier, every one after that gets them from the cache; both are
+timed.  Then the whole Clockwork chain (vocoder, ringmod, normalize), and
+how far apart the two vocoders' output is.
+"""
+import json
+import os
+import time
+
+import numpy as np
+from voicebox.audio import Audio
+from voicebox.effects import Normalize, RingMod, Vocoder
+
+from cnv.effects import vocoder
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# clip lengths, seconds
+CLIPS = (1.5, 4, 10)
+SAMPLE_RATE = 24000
+# best of this many runs
+REPEAT = 5
+
+
+def clockwork():
+    """
+    The Clockwork preset's effects, straight out of presets.json.
+    """
+    with open(os.path.join(REPO, "presets.json"), encoding="utf-8") as handle:
+        effects = {
+            effect['name']: effect
+            for effect in json.load(handle)['Clockwork']['Effects']
+        }
+
+    vocoder_settings = {
+        key: float(value) for key, value in effects['Vocoder'].items()
+        if key != 'name'
+    }
+    for key in ('bands', 'bandpass_filter_order'):
+        vocoder_settings[key] = int(vocoder_settings[key])
+
+    ringmod = effects['RingMod']
+    chain = [
+        RingMod(
+            carrier_freq=float(ringmod['carrier_freq']),
+            dry=float(ringmod['dry']),
+            wet=float(ringmod['wet'])
+        ),
+        Normalize(
+            max_amplitude=float(effects['Normalize']['max_amplitude']),
+            remove_dc_offset=effects['Normalize']['remove_dc_offset']
+        ),
+    ]
+    return vocoder_settings, chain
+
+
+def forget():
+    vocoder.filter_bank.cache_clear()
+    vocoder.envelope_filter.cache_clear()
+    vocoder._carrier_bank.cache_clear()
+
+
+def render(effects, audio):
+    for effect in effects:
+        audio = effect.apply(audio)
+    return audio
+
+
+def best(run, *args):
+    fastest = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        run(*args)
+        elapsed = time.perf_counter() - start
+        fastest = elapsed if fastest is None else min(fastest, elapsed)
+    return fastest
+
+
+def first(run, *args):
+    forget()
+    start = time.perf_counter()
+    run(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    settings, chain = clockwork()
+    print(f'Clockwork: {settings}')
+    old = Vocoder.build(**settings)
+    new = vocoder.FilterBankVocoder(**settings)
+
+    rng = np.random.default_rng(0)
+    for seconds in CLIPS:
+        audio = Audio(
+            rng.standard_normal(int(SAMPLE_RATE * seconds)) * 0.3, SAMPLE_RATE
+        )
+
+        old_time = best(old.apply, audio)
+        first_time = first(new.apply, audio)
+        new_time = best(new.apply, audio)
+        old_chain = best(render, [old] + chain, audio)
+        new_chain = best(render, [new] + chain, audio)
+
+        expected = old.apply(audio).signal
+        difference = np.abs(new.apply(audio).signal - expected).max() / np.abs(expected).max()
+
+        print(f'{seconds}s at {SAMPLE_RATE}Hz:')
+        print(
+            f'    vocoder   {old_time * 1000:7.1f}ms -> {new_time * 1000:6.1f}ms '
+            f'({old_time / new_time:4.1f}x), {first_time * 1000:.1f}ms the first time'
+        )
+        print(
+            f'    chain     {old_chain * 1000:7.1f}ms -> {new_chain * 1000:6.1f}ms '
+            f'({old_chain / new_chain:4.1f}x)'
+        )
+        print(f'    largest difference {difference:.1e} of the peak')
+
+
+if __name__ == '__main__':
+    main()
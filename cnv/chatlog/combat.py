@@ -0,0 +1,159 @@
+"""
+Combat lines out of the chat log, turned into something we can count.
+
+    You hit Abomination with your Assassin's Psi Blade for 43.22 points of Psionic damage.
+    You hit Zealot with your Bitter Ice Blast for 13088 points of Cold damage (SCOURGE)
+    You hit Button Man Buckshot with your Dart Burst for 10.61 points of Lethal damage over time.
+    You hit Arva with your Freeze Ray for 7.49 points of Cold damage over time (SCOURGE).
+    You hit Gravedigger Slammer with your Twilight Grasp reducing their damage and chance to hit and healing you and your allies!
+    MISSED Mamba Blade!! Your Contaminated Strike power had a 95.00% chance to hit, you rolled a 95.29.
+    You gain 104 experience and 36 influence.
+    You gain 15 experience, work off 15 debt, and gain 14 influence.
+    You gain 26 experience and work off 2,676 debt.
+    You gain 70 experience.
+    You gain 250 influence.
+    You gain 2 stacks of Blood Frenzy!   <-- not a Gain, parse() returns None
+
+parse() wants the line text with the "." still in it, (LogLine.text, not
+LogLine.joined) otherwise 43.22 points of damage turns into 4322.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+HIT_PREFIX = "You hit "
+MISS_PREFIX = "MISSED "
+GAIN_PREFIX = "You gain "
+
+HIT_PATTERN = re.compile(
+    r"You hit (?P<target>.+?) with your (?P<power>.+?) "
+    r"for (?P<damage>[0-9][0-9,]*(?:\.[0-9]+)?) points? of (?P<damage_type>.+?) damage"
+    r"(?P<over_time> over time)?\.?"
+    r"(?: ?\((?P<special>[A-Za-z ]+)\))?\.?\s*"
+)
+
+# debuffs that "hit" without doing any damage
+NO_DAMAGE_PATTERN = re.compile(
+    r"You hit (?P<target>.+?) with your (?P<power>.+?) reducing .*"
+)
+
+MISS_PATTERN = re.compile(
+    r"MISSED (?P<target>.+?)!! Your (?P<power>.+?) power had a "
+    r"(?P<chance_to_hit>[0-9.]+)% chance to hit, you rolled a (?P<roll>[0-9.]+?)\.?\s*"
+)
+
+GAIN_EXPERIENCE = re.compile(r"([0-9][0-9,]*) experience")
+GAIN_INFLUENCE = re.compile(r"([0-9][0-9,]*) (?:influence|information|infamy)")
+GAIN_DEBT = re.compile(r"work off ([0-9][0-9,]*) debt")
+
+
+def _number(value: str):
+    return int(value.replace(",", ""))
+
+
+@dataclass
+class Hit:
+    target: str
+    power: str
+    damage: float
+    damage_type: str
+    over_time: bool = False
+    # Critical, Scourge, etc.. Title case, "" when there isn't one.
+    special: str = ""
+
+    @property
+    def critical(self) -> bool:
+        return self.special == "Critical"
+
+
+@dataclass
+class Debuff:
+    """
+    A hit that didn't do any damage, there is nothing to record.
+    """
+    target: str
+    power: str
+
+
+@dataclass
+class Miss:
+    target: str
+    power: str
+    chance_to_hit: float
+    roll: float
+
+
+@dataclass
+class Gain:
+    experience: Optional[int] = None
+    influence: Optional[int] = None
+    debt: Optional[int] = None
+
+
+def parse_hit(text: str):
+    m = HIT_PATTERN.fullmatch(text)
+    if m:
+        special = m['special'] or ""
+        return Hit(
+            target=m['target'],
+            power=m['power'],
+            damage=float(m['damage'].replace(",", "")),
+            damage_type=m['damage_type'],
+            over_time=m['over_time'] is not None,
+            special=special.strip().title()
+        )
+
+    m = NO_DAMAGE_PATTERN.fullmatch(text)
+    if m:
+        return Debuff(target=m['target'], power=m['power'])
+
+    return None
+
+
+def parse_miss(text: str):
+    m = MISS_PATTERN.fullmatch(text)
+    if m:
+        return Miss(
+            target=m['target'],
+            power=m['power'],
+            chance_to_hit=float(m['chance_to_hit']),
+            roll=float(m['roll'])
+        )
+    return None
+
+
+def parse_gain(text: str):
+    # a substring check is a lot cheaper than a search that finds nothing
+    experience = GAIN_EXPERIENCE.search(text) if "experience" in text else None
+    influence = GAIN_INFLUENCE.search(text) if " inf" in text else None
+
+    if experience is None and influence is None:
+        # You gain 2 stacks of Blood Frenzy!
+        return None
+
+    debt = GAIN_DEBT.search(text) if "debt" in text else None
+    return Gain(
+        experience=_number(experience.group(1)) if experience else None,
+        influence=_number(influence.group(1)) if influence else None,
+        debt=_number(debt.group(1)) if debt else None,
+    )
+
+
+def parse(text: str):
+    """
+    Returns a Hit, Debuff, Miss or Gain.  None when this isn't a combat line
+    (or it is one we don't understand).
+
+    The prefix checks are cheap and rule out nearly every line before any
+    regular expression gets involved.
+    """
+    if text.startswith(HIT_PREFIX):
+        return parse_hit(text)
+    elif text.startswith(MISS_PREFIX):
+        return parse_miss(text)
+    elif text.startswith(GAIN_PREFIX):
+        return parse_gain(text)
+    return None
@@ -0,0 +1,208 @@
+"""
+Running damage totals for the Damage panel.
+
+The log parser feeds every Hit/Miss in here as it happens.  Once per batch of
+log lines flush() hands back only the powers that changed, the GUI gets those
+over the event_queue and touches only those rows.  Nobody has to re-read the
+damage table and redraw the whole grid every time we swing a sword.
+"""
+import logging
+import time
+from collections import deque
+
+from cnv.chatlog import combat
+
+log = logging.getLogger(__name__)
+
+# sliding DPS windows, in seconds
+DPS_WINDOWS = (10, 60)
+
+# when nothing new has happened, only send the falling DPS numbers this often
+DECAY_INTERVAL = 1.0
+
+
+class TypedDamage:
+    def __init__(self, damage_type, special=''):
+        self.damage_type = damage_type
+        self.special = special
+        self.count = 0
+        self.total = 0.0
+
+
+class PowerStat:
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.tries = 0
+        self.total = 0.0
+        self.typed = {}
+        # (seconds, damage), oldest on the left
+        self.recent = deque()
+
+        if ':' in name:
+            self.label = name.split(':')[0] + " (proc)"
+        else:
+            self.label = name
+
+    def record_hit(self, hit: combat.Hit, seconds: int):
+        self.hits += 1
+        self.tries += 1
+        self.total += hit.damage
+
+        key = (hit.damage_type, hit.special)
+        if key not in self.typed:
+            self.typed[key] = TypedDamage(hit.damage_type, hit.special)
+
+        self.typed[key].count += 1
+        self.typed[key].total += hit.damage
+        self.recent.append((seconds, hit.damage))
+
+    def record_miss(self):
+        self.tries += 1
+
+    def expire(self, now: int):
+        """
+        forget about anything too old to be in any window
+        """
+        oldest = now - max(DPS_WINDOWS)
+        while self.recent and self.recent[0][0] <= oldest:
+            self.recent.popleft()
+
+    def dps(self, now: int):
+        dps = {}
+        for window in DPS_WINDOWS:
+            start = now - window
+            dps[window] = sum(
+                damage for seconds, damage in self.recent if seconds > start
+            ) / window
+        return dps
+
+    def snapshot(self, now: int):
+        """
+        Everything the GUI needs to draw this power, as plain picklable data.
+        """
+        return {
+            'power': self.name,
+            'label': self.label,
+            'hits': self.hits,
+            'tries': self.tries,
+            'total': self.total,
+            'dps': self.dps(now),
+            'typed': [
+                {
+                    'damage_type': typed.damage_type,
+                    'special': typed.special,
+                    'count': typed.count,
+                    'total': typed.total,
+                } for typed in self.typed.values()
+            ]
+        }
+
+
+class DamageAggregator:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.powers = {}
+        self.dirty = set()
+        # powers that still had something inside a DPS window the last time
+        # we flushed.  Their DPS keeps falling even when they aren't used.
+        self.active = set()
+        self.total = 0.0
+        self.hits = 0
+        self.tries = 0
+        self.log_seconds = None
+        self.observed_at = None
+        self.flushed_at = 0
+
+    def observe(self, seconds: int):
+        """
+        The log is our clock.  Remember the most recent log time and when we
+        saw it.
+        """
+        self.log_seconds = seconds
+        self.observed_at = time.monotonic()
+
+    def now(self):
+        if self.log_seconds is None:
+            return None
+        # the log goes quiet between fights, keep the clock moving anyway.
+        return self.log_seconds + int(time.monotonic() - self.observed_at)
+
+    def record(self, event, seconds: int):
+        """
+        Returns True if the event was something we count.
+        """
+        if isinstance(event, combat.Hit):
+            power = self.get_power(event.power)
+            power.record_hit(event, seconds)
+            self.total += event.damage
+            self.hits += 1
+            self.tries += 1
+        elif isinstance(event, combat.Miss):
+            power = self.get_power(event.power)
+            power.record_miss()
+            self.tries += 1
+        else:
+            return False
+
+        self.observe(seconds)
+        self.dirty.add(power.name)
+        return True
+
+    def get_power(self, name):
+        if name not in self.powers:
+            self.powers[name] = PowerStat(name)
+        return self.powers[name]
+
+    def session_dps(self, now):
+        dps = {}
+        for window in DPS_WINDOWS:
+            start = now - window
+            dps[window] = sum(
+                damage
+                for power in self.powers.values()
+                for seconds, damage in power.recent
+                if seconds > start
+            ) / window
+        return dps
+
+    def flush(self):
+        """
+        The changes since the last flush, or None when there aren't any.
+        """
+        now = self.now()
+        if now is None:
+            return None
+
+        if not self.dirty and (
+            not self.active or
+            time.monotonic() - self.flushed_at < DECAY_INTERVAL
+        ):
+            return None
+
+        changed = self.dirty | self.active
+
+        powers = []
+        active = set()
+        for name in changed:
+            power = self.powers[name]
+            power.expire(now)
+            if power.recent:
+                active.add(name)
+            powers.append(power.snapshot(now))
+
+        self.dirty = set()
+        self.active = active
+        self.flushed_at = time.monotonic()
+
+        return {
+            'powers': powers,
+            'session': {
+                'total': self.total,
+                'hits': self.hits,
+                'tries': self.tries,
+                'dps': self.session_dps(now),
+            }
+        }
@@ -0,0 +1,133 @@
+"""
+One line out of the City of Heroes chat log.
+
+    2024-04-26 18:40:13 [Caption] <scale 1.75><color white>Positron here.
+    ^datestr   ^timestr ^text
+
+Every parser wants a slightly different view of the same line; tokens, the
+tokens glued back together, everything after the first word.  Rebuilding those
+in each parser was allocating the same string over and over, so LogLine splits
+the line once and works out the rest the first time somebody asks.
+"""
+import logging
+from datetime import datetime
+from functools import lru_cache
+from typing import NamedTuple
+
+log = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class LogTimestamp(NamedTuple):
+    """
+    when is the wall clock time of the line.  seconds only counts up, it is
+    the number of seconds since the start of the proleptic Gregorian calendar
+    which makes "how long since" math work across midnight.
+    """
+    when: datetime
+    seconds: int
+
+
+@lru_cache(maxsize=64)
+def parse_timestamp(datestr: str, timestr: str) -> LogTimestamp:
+    """
+    The log prefix is always fixed width:  2024-04-26 18:40:13
+
+    Slicing and int() is a lot cheaper than strptime, and since a busy fight
+    writes dozens of lines with the same timestamp this is cached too; each
+    second gets parsed once.
+    """
+    if len(datestr) != 10 or len(timestr) != 8:
+        raise ValueError(f'Invalid log timestamp: {datestr} {timestr}')
+
+    when = datetime(
+        int(datestr[0:4]), int(datestr[5:7]), int(datestr[8:10]),
+        int(timestr[0:2]), int(timestr[3:5]), int(timestr[6:8])
+    )
+    seconds = (
+        (when.toordinal() * SECONDS_PER_DAY) +
+        (when.hour * 3600) + (when.minute * 60) + when.second
+    )
+    return LogTimestamp(when, seconds)
+
+
+class LogLine:
+    """
+    A busy fight writes dozens of these a second, so no instance __dict__;
+    the views live in slots and are filled in the first time they are asked
+    for.
+    """
+    __slots__ = ('raw', 'datestr', 'timestr', 'text', '_tokens', '_joined', '_remainder')
+
+    def __init__(self, raw: str):
+        # peel off the datestr and timestr, raises ValueError if they are not
+        # there.
+        self.raw = raw
+        self.datestr, self.timestr, text = raw.split(None, 2)
+        self.text = text.strip()
+        self._tokens = None
+        self._joined = None
+        self._remainder = None
+
+    @classmethod
+    def parse(cls, raw: str):
+        """
+        LogLine, or None when raw isn't a timestamped log line.
+        """
+        try:
+            return cls(raw)
+        except ValueError:
+            return None
+
+    @property
+    def tokens(self) -> list:
+        if self._tokens is None:
+            # removing "." was a bad idea, but everything downstream expects it.
+            self._tokens = self.text.replace(".", "").split()
+        return self._tokens
+
+    @property
+    def prefix(self) -> str:
+        tokens = self.tokens
+        if tokens:
+            return tokens[0]
+        return ""
+
+    @property
+    def joined(self) -> str:
+        """
+        The tokens glued back together with single spaces.
+        """
+        if self._joined is None:
+            self._joined = " ".join(self.tokens)
+        return self._joined
+
+    @property
+    def remainder(self) -> str:
+        """
+        Everything after the first token, glued back together.
+        """
+        if self._remainder is None:
+            if self._joined is not None:
+                self._remainder = self._joined.partition(" ")[2]
+            else:
+                # most lines only want this one; building joined just to
+                # cut the front off it was two strings the size of the line
+                # instead of one.
+                self._remainder = " ".join(self.tokens[1:])
+        return self._remainder
+
+    @property
+    def timestamp(self) -> datetime:
+        return parse_timestamp(self.datestr, self.timestr).when
+
+    @property
+    def seconds(self) -> int:
+        """
+        Monotonic seconds for soak/stopwatch math, see LogTimestamp
+        """
+        return parse_timestamp(self.datestr, self.timestr).seconds
+
+    def __repr__(self):
+        return f"<LogLine {self.datestr} {self.timestr} {self.text!r}>"
@@ -0,0 +1,192 @@
+"""
+City of Heroes sprinkles a little markup into chat lines:
+
+    [Caption] <scale 1.75><color white><bgcolor DarkGreen>Positron here.
+    Mr. Delaine: <color #38a7ff><bgcolor #010101>wanted to make sure they stacked
+
+The speech path wants the text without any of it, the console wants the text
+and the colors.  parse() walks the string once and hands back both.
+"""
+import colorsys
+import functools
+import logging
+
+import webcolors
+
+log = logging.getLogger(__name__)
+
+# the tags we know how to interpret (and strip).  Anything else that happens to
+# be inside <angle brackets> is left alone, players type "<3" and "<grin>".
+KNOWN_TAGS = ('color', 'bgcolor', 'bordercolor', 'scale')
+
+DEFAULT_FG = '#FFFFFF'
+DEFAULT_BG = '#000000'
+
+
+def parse(dialog):
+    """
+    Returns (plain_text, tags) where tags is a dict like:
+        {'scale': '1.75', 'color': 'white', 'bgcolor': 'DarkGreen'}
+
+    If a tag shows up more than once the last one wins.
+    """
+    if dialog is None:
+        return "", {}
+
+    if "<" not in dialog:
+        # by far the most common case
+        return dialog.strip(), {}
+
+    tags = {}
+    pieces = []
+    position = 0
+    while True:
+        start = dialog.find("<", position)
+        if start == -1:
+            break
+
+        end = dialog.find(">", start + 1)
+        if end == -1:
+            break
+
+        inner = dialog[start + 1:end]
+        if "<" in inner:
+            # "<3 <color red>", the first < is just text.
+            pieces.append(dialog[position:start + 1])
+            position = start + 1
+            continue
+
+        name, _, value = inner.partition(" ")
+        name = name.lower()
+        value = value.strip()
+
+        if name in KNOWN_TAGS and value:
+            pieces.append(dialog[position:start])
+            tags[name] = value
+        else:
+            pieces.append(dialog[position:end + 1])
+
+        position = end + 1
+
+    pieces.append(dialog[position:])
+    return "".join(pieces).strip(), tags
+
+
+def plain(dialog):
+    """
+    Just the text, hold the markup.
+    """
+    return parse(dialog)[0]
+
+
+@functools.lru_cache(maxsize=256)
+def to_hex(color, default):
+    """
+    Named ('DarkGreen') or hex ('#010101') color to a '#rrggbb' string.  Junk
+    gets the default.
+    """
+    if not color:
+        return default
+
+    try:
+        if color.startswith('#'):
+            return webcolors.normalize_hex(color)
+        return webcolors.name_to_hex(color)
+    except ValueError:
+        log.debug('Unknown color %r, using %s', color, default)
+        return default
+
+
+def luminance(rgb_hexstring):
+    """
+    Returns a value between 0 (black) and 255 (pure white)
+    """
+    red, green, blue = webcolors.hex_to_rgb(rgb_hexstring)
+    return (.299 * red) + (.587 * green) + (.114 * blue)
+
+
+def adjust_brightness(rgb_hexstring, change=0.1):
+    """
+    Convert to HSL, increase luminance, convert back to RGB.
+    """
+    # we want 0-1 floats for each color
+    red, green, blue = [x / 255.0 for x in webcolors.hex_to_rgb(rgb_hexstring)]
+    hue, luminosity, saturation = colorsys.rgb_to_hls(red, green, blue)
+
+    luminosity += change
+    luminosity = min(1.0, luminosity)
+    luminosity = max(0.0, luminosity)
+
+    # and back to 0-255 values
+    red, green, blue = [int(x * 255) for x in colorsys.hls_to_rgb(hue, luminosity, saturation)]
+
+    # and back to a hex string
+    return webcolors.rgb_to_hex((red, green, blue))
+
+
+def darken(rgb_hexstring, value=0.1):
+    """
+    Return the same color but a little darker
+    """
+    return adjust_brightness(rgb_hexstring, change=-1 * value)
+
+
+def lighten(rgb_hexstring, value=0.1):
+    """
+    Return the same color but a little brighter
+    """
+    return adjust_brightness(rgb_hexstring, change=value)
+
+
+def color_contrast(fg_luminance, bg_luminance):
+    fg_luminance /= 255
+    bg_luminance /= 255
+
+    contrast = (
+        max((fg_luminance, bg_luminance)) + 0.05
+    ) / (
+        min((fg_luminance, bg_luminance)) + 0.05
+    )
+    return contrast
+
+
+@functools.lru_cache(maxsize=1024)
+def expand_contrast(fgcolor, bgcolor, threshold=10):
+    """
+    Pull fgcolor and bgcolor apart until they are readable.  The game only uses
+    a handful of color pairs so this is cached; each pair gets worked out once.
+    """
+    fg_luminance = luminance(fgcolor)
+    bg_luminance = luminance(bgcolor)
+
+    contrast = color_contrast(fg_luminance, bg_luminance)
+
+    while contrast < threshold:
+        # light on dark or dark on light?
+        if fg_luminance > bg_luminance:
+            # light on dark, pull them further apart
+            bgcolor = darken(bgcolor)
+            fgcolor = lighten(fgcolor)
+        else:
+            # dark on light, pull them further apart
+            bgcolor = lighten(bgcolor)
+            fgcolor = darken(fgcolor)
+
+        fg_luminance = luminance(fgcolor)
+        bg_luminance = luminance(bgcolor)
+
+        contrast = color_contrast(fg_luminance, bg_luminance)
+
+    return fgcolor, bgcolor, contrast
+
+
+def colorize(text, tags):
+    """
+    Wrap text in rich console markup using the color/bgcolor from tags, adjusted
+    to meet contrast requirements so black on black turns into grey on black.
+    """
+    fg_color, bg_color, _ = expand_contrast(
+        to_hex(tags.get('color'), DEFAULT_FG),
+        to_hex(tags.get('bgcolor'), DEFAULT_BG)
+    )
+    return f"[{fg_color} on {bg_color}]{text}[/]"
@@ -1,10 +1,8 @@
 import glob
 import hashlib
 import io
-import colorsys
 import json
 import logging
-import webcolors
 import os
 import re
 import random
@@ -25,9 +23,11 @@ from pedalboard.io import AudioFile
 import cnv.database.models as models
 import cnv.logger
 import cnv.voices.voice_builder as voice_builder
+from cnv.voices import streaming
 from cnv.lib.proc import send_log_lock
 
-from cnv.chatlog import patterns
+from cnv.chatlog import combat, dps, markup, patterns
+from cnv.chatlog.logline import LogLine
 
 from cnv import engines
 
@@ -65,6 +65,9 @@ class TightTTS(threading.Thread):
         self.event_queue = event_queue
         self.daemon = True
         self.all_npcs = {}
+        # True while we are working on a message
+        self.working = False
+        self.channels = []
 
         # so we can do this much once.
          
@@ -133,6 +136,14 @@ class TightTTS(threading.Thread):
         return self.channels[channel_index]
 
 
+    def busy(self):
+        """
+        Is live speech happening (or about to)?  Background work should wait.
+        """
+        if self.working or not self.speaking_queue.empty():
+            return True
+        return any(channel.get_busy() for channel in self.channels)
+
     def play(self, channel, wav_fn):
         # is there an audio already queued?
         if channel.get_queue():
@@ -152,6 +163,15 @@ class TightTTS(threading.Thread):
         )
         log.debug('[TightTTS.play()] Play Complete')
 
+    def first_audio(self, how, started):
+        """
+        time-to-first-audio; how long between the line showing up and somebody
+        hearing it.
+        """
+        log.info(
+            f'[TightTTS] First audio after '
+            f'{(time.monotonic() - started) * 1000:.0f}ms ({how})'
+        )
 
     def run(self):
         log.info('[TightTTS] !! TightTTS is RUNNING !!')
@@ -175,12 +195,15 @@ class TightTTS(threading.Thread):
         
         while True:
             log.debug('[TightTTS] Top of True')
+            self.working = False
             while self.speaking_queue.empty():
                 time.sleep(0.25)
 
             played = False
             log.debug('Retrieving queued message')
             raw_message = self.speaking_queue.get()
+            self.working = True
+            started = time.monotonic()
 
             log.debug('[TightTTS] TTS Message received: %s', raw_message)
             # we got a message
@@ -214,6 +237,7 @@ class TightTTS(threading.Thread):
                 if os.path.exists(wav_fn):
                     # log.info(f'[TightTTS] [{category}][{channel}] Playing wav file {wav_fn}')
                     self.play(channel=channel, wav_fn=wav_fn)
+                    self.first_audio("cached", started)
                     played = True
                     break
                 else:
@@ -236,6 +260,7 @@ class TightTTS(threading.Thread):
                         
                         log.debug(f'[TightTTS] [{category_str}][{channel}] Playing wav file {wav_fn}')
                         self.play(channel=channel, wav_fn=wav_fn)
+                        self.first_audio("cached mp3", started)
                         played = True
                         break
 
@@ -247,13 +272,28 @@ class TightTTS(threading.Thread):
                     character = models.Character.get(name, category_str, session)
 
                     models.update_character_last_spoke(character.id, session)
+                    self.event_queue.put(("SPOKE", (name, category_str)))
+
+                    # start playing while it is still rendering, if we can
+                    feeder = None
+                    if settings.get_toggle(settings.taggify(streaming.TOGGLE)):
+                        feeder = streaming.ChannelFeeder(channel, started=started)
 
                     # it isn't very well named, but this will speak "message" as
                     # character and cache a copy into cachefile.
                     try:
-                        voice_builder.create(character, message, session)
+                        hedge = settings.get_toggle(settings.taggify(voice_builder.HEDGE_TOGGLE))
+                        if voice_builder.create(character, message, session, play=feeder, hedge=hedge):
+                            log.info(
+                                f'[TightTTS] First audio after '
+                                f'{feeder.first_audio * 1000:.0f}ms (streamed)'
+                            )
+                            played = True
                     
                         for rank in ['primary', 'secondary']:
+                            if played:
+                                break
+
                             try:
                                 cachefile = settings.get_cachefile(name, message, category_str, rank)
                                 wav_fn = str(cachefile + ".wav")
@@ -268,6 +308,7 @@ class TightTTS(threading.Thread):
 
                             if os.path.exists(wav_fn):
                                 self.play(channel=channel, wav_fn=wav_fn)
+                                self.first_audio("rendered", started)
                                 played = True
                                 break
 
@@ -279,97 +320,7 @@ def plainstring(dialog):
     """
     Clean up any color codes and give us just the basic text string
     """
-    dialog = re.sub(r"<scale [#a-zA-Z0-9]+>", "", dialog).strip()
-    dialog = re.sub(r"<color [#a-zA-Z0-9]+>", "", dialog).strip()
-    dialog = re.sub(r"<bgcolor [#a-zA-Z0-9]+>", "", dialog).strip()
-    dialog = re.sub(r"<bordercolor [#a-zA-Z0-9]+>", "", dialog).strip()
-    return dialog
-
-
-def luminance(rgb_hexstring):
-    """
-    Returns a value between 0 (black) and 255 (pure white)
-    """
-    red, green, blue = webcolors.hex_to_rgb(rgb_hexstring)
-    return (.299 * red) + (.587 * green) + (.114 * blue)
-
-
-def adjust_brightness(rgb_hexstring, change=0.1):
-    """
-    Convert to HSL, increase luminance, convert back to RGB.
-    """
-    log.debug('Adjusting brightness of %s by %s', rgb_hexstring, change)
-    # we want 0-1 floats for each color
-    red, green, blue = [x / 255.0 for x in webcolors.hex_to_rgb(rgb_hexstring)]
-    hue, luminosity, saturation = colorsys.rgb_to_hls(red, green, blue)
-    
-    log.debug('Luminosity before: %s', luminosity)
-    
-    luminosity += change
-    luminosity = min(1.0, luminosity)
-    luminosity = max(0.0, luminosity)
-    
-    log.debug('Luminosity after: %s', luminosity)
-
-    # and back to 0-255 values 
-    red, green, blue = [int(x * 255) for x in colorsys.hls_to_rgb(hue, luminosity, saturation)]
-    log.debug('As 0-255 tuple: (%s, %s, %s)', red, green, blue)
-
-    # and back to a hex string
-    hexstr = webcolors.rgb_to_hex((red, green, blue))
-    log.debug('Adjustment complete.  New color: %s', hexstr)
-    return hexstr
-
-
-def darken(rgb_hexstring, value=0.1):
-    """
-    Return the same color but a little darker
-    """
-    return adjust_brightness(rgb_hexstring, change=-1 * value)
-
-
-def lighten(rgb_hexstring, value=0.1):
-    """
-    Return the same color but a little brighter
-    """
-    return adjust_brightness(rgb_hexstring, change=value)
-
-
-def color_contrast(fg_luminance, bg_luminance):
-    fg_luminance /= 255
-    bg_luminance /= 255
-
-    contrast = (
-        max((fg_luminance, bg_luminance)) + 0.05
-    ) / (
-        min((fg_luminance, bg_luminance)) + 0.05
-    )    
-    return contrast
-
-
-def expand_contrast(fgcolor, bgcolor, threshold=10):
-    fg_luminance = luminance(fgcolor)
-    bg_luminance = luminance(bgcolor)
-    
-    contrast = color_contrast(fg_luminance, bg_luminance)
-
-    while contrast < threshold:   
-        # light on dark or dark on light?
-        if fg_luminance > bg_luminance:
-            # light on dark, pull them further apart
-            bgcolor = darken(bgcolor)
-            fgcolor = lighten(fgcolor)
-        else:
-            # dark on light, pull them further apart
-            bgcolor = lighten(bgcolor)
-            fgcolor = darken(fgcolor)
-
-        fg_luminance = luminance(fgcolor)
-        bg_luminance = luminance(bgcolor)
-
-        contrast = color_contrast(fg_luminance, bg_luminance)
-
-    return fgcolor, bgcolor, contrast
+    return markup.plain(dialog)
 
 
 def colorstring(dialog):
@@ -383,58 +334,8 @@ def colorstring(dialog):
     if dialog is None:
         return ""
 
-    # Impulse: <color #40ff01><bgcolor #010101>speed tinpex lfm, pst 2/8
-    for tag, color in [
-        ['color', '#FFFFFF'], ['bgcolor', '#000000']
-    ]:
-
-        if f"<{tag}" in dialog:
-            color_match = re.match(
-                r"(?P<before>.*)<" + tag + r" (?P<color>#?[a-zA-F0-9]*)>(?P<after>.*)",
-                dialog,
-                re.IGNORECASE
-            )
-
-            if color_match is not None:
-                color = color_match.group('color')
-                if "#" not in color:
-                    color_rgb = webcolors.name_to_rgb(color)
-                    color = webcolors.rgb_to_hex(color_rgb)
-
-                before = color_match.group('before')
-                after = color_match.group('after')
-                dialog = f"{before}{after}"
-            else:
-                # our regex failed, but it could be a named color
-                color_match = re.match(
-                    r"(?P<before>.*)<color (?P<color>[a-zA-Z]*)>(?P<after>.*)",
-                    dialog,
-                    re.IGNORECASE
-                )
-                if color_match is not None:
-                    # potentially a named color
-                    try:
-                        color_rgb = webcolors.name_to_rgb(color_match.group('color'))
-                        color = webcolors.rgb_to_hex(color_rgb)
-                                       
-                        before = color_match.group('before')
-                        after = color_match.group('after')
-                        dialog = f"{before}{after}"
-                    except ValueError:
-                        pass
-
-        if tag == "color":
-            fg_color = color
-        elif tag == "bgcolor":
-            bg_color = color
-
-    # adjust to meet contrast requirements, so black on black turns into grey on black
-    fg_color, bg_color, contrast = expand_contrast(fg_color, bg_color)
-
-    # log.debug(f'fgcolor: {fg_color}  bgcolor: {bg_color}  contrast: {contrast}')
-    dialog = f"[{fg_color} on {bg_color}]{dialog}[/]"
-
-    return dialog
+    text, tags = markup.parse(dialog)
+    return markup.colorize(text, tags)
 
 DARKEST_SOAK = 5  # for how many seconds after the first darkest night do we want to ignore subsequent messages?
 
@@ -522,6 +423,21 @@ class LogStream:
         self.first_tail = True
         log.debug(f'(init) Setting {self.logfile=}')
 
+        # running damage totals for the Damage panel
+        self.damage = dps.DamageAggregator()
+
+    def reset_damage(self):
+        self.damage.reset()
+        self.event_queue.put(("DAMAGE_RESET", None))
+
+    def publish_damage(self):
+        """
+        Send whatever damage stats changed since the last time up to the GUI.
+        """
+        delta = self.damage.flush()
+        if delta:
+            self.event_queue.put(("DAMAGE", delta))
+
     def open_latest_log(self):
         all_files = glob.glob(os.path.join(self.logdir, "*.txt"))
         filename = max(all_files, key=os.path.getctime)
@@ -545,14 +461,17 @@ class LogStream:
         #)
         with open(self.open_latest_log(), 'r', encoding="utf-8") as handle:
             log.info('Searching for welcome message')
-            for line in handle:
-                try:
-                    datestr, timestr, line_string = line.split(None, 2)
-                except ValueError:
+            for raw in handle:
+                line = LogLine.parse(raw)
+                if line is None:
+                    continue
+
+                # this one is deliberately not line.tokens, we want to keep
+                # any "." in the hero name.
+                lstring = line.text.split()
+                if not lstring:
                     continue
 
-                lstring = line_string.split()
-                
                 if lstring[0] == "Welcome":
                     # Welcome to City of Heroes, <HERO NAME>
                     self.is_hero = True
@@ -681,18 +600,19 @@ class LogStream:
 
         return dialog
 
-    def channel_chat_parser(self, lstring):
-        speaker, dialog = " ".join(lstring[1:]).split(":", maxsplit=1)
+    def channel_chat_parser(self, line: LogLine):
+        speaker, dialog = line.remainder.split(":", maxsplit=1)
         dialog = plainstring(dialog)
         # TODO:  these should only be applied to player speech, it is wasted CPU on NPCs.
         dialog = self.gamerspeak_expansion(dialog)
         dialog = self.profanity_filter(dialog)
         return speaker, dialog
 
-    def tell_chat_parser(self, lstring):
+    def tell_chat_parser(self, line: LogLine):
         """
         Who is talking, what are they saying?
         """
+        lstring = line.tokens
         # why is there an extra colon for Tell?  IDK.        
         if lstring[1][:3] == "-->":
             # note: target names with spaces are not parsed
@@ -706,7 +626,7 @@ class LogStream:
             # [Tell] :Ghlorius: [SIDEKICK] name="Ghlorius" 
             # [Tell] -->Ghlorius: [SIDEKICK] name="Ghlorius"
             dialog = (
-                " ".join(lstring[1:]).split(":", maxsplit=1)[-1].strip()
+                line.remainder.split(":", maxsplit=1)[-1].strip()
             )
             dialog_list = dialog.split()
             if dialog_list and dialog_list[0] == "[SIDEKICK]":
@@ -740,7 +660,7 @@ class LogStream:
             try:
                 # ["", "Dressy Bessie", "I can bump you"]
                 # ['', 'StoneRipper', ' it:s underneath']
-                full_string = " ".join(lstring[1:])
+                full_string = line.remainder
 
                 if ':' in full_string:
                     _, speaker, dialog = full_string.split(
@@ -757,14 +677,14 @@ class LogStream:
                 # 2024-07-27 17:17:07 [Tell] You are banned from talking for 2 minutes, 0 seconds.
                 # logging at info so I can maybe catch it in the future.
                 log.info(f'1 ADD DOC: {lstring=}')
-                speaker, dialog = " ".join(lstring[1:]).split(":", maxsplit=1)
+                speaker, dialog = line.remainder.split(":", maxsplit=1)
         
         dialog = plainstring(dialog)
         dialog = self.profanity_filter(dialog)
 
         return speaker, dialog
 
-    def caption_parser(self, lstring):
+    def caption_parser(self, line: LogLine):
         """
         Caption messages are a liitle.. fun.  Usually the first message from a
         given speaker identifies the speaker by name but subsequent messages do
@@ -782,16 +702,13 @@ class LogStream:
         """
         # [Caption] <scalxe 2.75><color red><bgcolor White>My Shadow Simulacrum will destroy Task Force White Sands!
         # [Caption] <scale 1.75><color white><bgcolor DarkGreen>Positron here. I'm monitoring your current progress in the sewers. 
-        log.debug(f'CAPTION: {lstring}')
-        dialog = plainstring(" ".join(lstring[1:]))
+        log.debug(f'CAPTION: {line}')
+        # one pass gets us the text and the tags
+        dialog, tags = markup.parse(line.remainder)
         dialog = dialog.replace('*', '')  # the stupid TTS engine say "asterisk" and it is tediously dumb.
 
         # make an effort to identify the speaker
         # Positron here. I'm monitoring your current progress in the sewers.
-        tags = {keyvalue.split()[0]: keyvalue.split()[1] for keyvalue in re.findall(
-            r'<([^<>]*)>',
-            " ".join(lstring)
-        )}
 
         color = tags.get('bgcolor')
         if color:
@@ -815,32 +732,35 @@ class LogStream:
         
         return self.caption_speaker, dialog
 
-    def channel_messager(self, lstring, line_string: str):
+    def channel_messager(self, line: LogLine):
         """
-        All we know is that line_string starts with a [
+        All we know is that line.text starts with a [
         """
         # channel message
-        dialog = line_string.strip()
+        dialog = line.text
         if ']' in dialog:
             close_bracket_index = dialog.find(']')
             channel = dialog[1: close_bracket_index]
             dialog = dialog[close_bracket_index + 1:].strip()
         else:
-            log.error('Malformed channel message: %s', line_string)
+            log.error('Malformed channel message: %s', line.text)
             return       
-        
+
+        # the colors are for the console, the parsers below strip them for speech
+        plain_dialog, tags = markup.parse(dialog)
+
         guide = self.channel_guide.get(channel, None)
         if guide and guide['enabled']:
             # log.info('Applying channel guide %s', guide)
             # channel messages are _from_ someone, the parsers extract that.
             parser = getattr(self, guide['parser'])
-            speaker, dialog = parser(lstring)
+            speaker, dialog = parser(line)
             if dialog:
                 dialog = self.gamerspeak_expansion(dialog)
                 dialog = self.profanity_filter(dialog)
-                console.log(f"\\[{channel}] {speaker}: " + colorstring(dialog))
+                console.log(f"\\[{channel}] {speaker}: " + markup.colorize(dialog, tags))
             else:
-                log.debug('Invalid lstring has no dialog: %s', lstring)
+                log.debug('Invalid line has no dialog: %s', line)
 
             # sometimes people don't say anything we can vocalize, like "..." so we drop any
             # non-dialog messages.
@@ -855,7 +775,7 @@ class LogStream:
 
                 self.speaking_queue.put((speaker, dialog, guide['name']))
             else:
-                log.debug('Not speaking: %s', lstring)
+                log.debug('Not speaking: %s', line)
 
         elif guide is None:
             # long lines will wrap
@@ -947,14 +867,14 @@ Ten missions, ends in fight against AV Vandal'''
             # there is no guide enabled, so we aren't giong to _speak_ this
             # but we might as well make the display pretty.
             
-            console.log(f"\\[{channel}] " + colorstring(dialog))
+            console.log(f"\\[{channel}] " + markup.colorize(plain_dialog, tags))
             
             for references, helptext in hints:
                 if found:
                     break
 
                 for reference in references:
-                    if reference.upper() in dialog.upper():
+                    if reference.upper() in plain_dialog.upper():
                         narrow_console = Console(width=60)
                         narrow_console.print(Panel(helptext))
                         found = True
@@ -979,7 +899,6 @@ Ten missions, ends in fight against AV Vandal'''
         self.open_latest_log needs to return an open, read-able file handle.
         """
         log.info('tail() invoked')
-        lstring = ""
 
         # New character selected
         self.ssay('Log file found')
@@ -987,6 +906,7 @@ Ten missions, ends in fight against AV Vandal'''
         
         log.info('Clearing damage data')
         models.clear_damage()
+        self.reset_damage()
 
         self.first_tail = True
 
@@ -1004,149 +924,64 @@ Ten missions, ends in fight against AV Vandal'''
                 else:
                     activity_count += 1
 
-                for line in handle:
-                    # log.debug("line: '%s'", line)
+                for raw in handle:
+                    # log.debug("raw: '%s'", raw)
 
-                    if line.strip():
+                    if raw.strip():
                         log.debug('Top of True')               
                         talking = True
                         
-                        # peel off the datestr and timestr, these are only rarely useful to us.
-                        try:
-                            datestr, timestr, line_string = line.split(None, 2)
-                            line_string = line_string.strip()
-                        except ValueError:
+                        # split once, the views parsers need are cached on
+                        # the LogLine.
+                        line = LogLine.parse(raw)
+                        if line is None:
                             continue
 
-                        # log.info('line_string: %s', line_string)
-                        try:
-                            # removing "." was a bad idea
-                            lstring = line_string.replace(".", "").strip().split()
-                        except Exception as err:
-                            log.error(err)
-                            raise
+                        lstring = line.tokens
+                        if not lstring:
+                            continue
 
                         # if the first word starts with [, it is a channel indicator.  Send this off to channel_messager and move on.
                         if lstring[0][0] == "[":
                             log.debug('Invoking channel_messager()')
-                            self.channel_messager(lstring, line_string)
+                            self.channel_messager(line)
                             log.debug('Returned from channel_messager()')
                             continue
 
-                        if lstring[0] == "You":
-                            if self.hero and lstring[1] == "gain":
-                                # You gain 104 experience and 36 influence.
-                                # You gain 15 experience, work off 15 debt, and gain 14 influence.
-                                # You gain 26 experience and work off 2,676 debt.
-                                # You gain 70 experience.
-                                # You gain 2 stacks of Blood Frenzy!
-                                log.debug(lstring)
-                                # You gain 250 influence.
-
-                                inf_gain = None
-                                xp_gain = None
-
-                                for inftype in ["influence", "information"]:
-                                    try:
-                                        influence_index = lstring.index(inftype) - 1
-                                        inf_gain = int(
-                                            lstring[influence_index].replace(",", "")
-                                        )
-                                    except ValueError:
-                                        pass
+                        if self.hero and lstring[0] in ("You", "MISSED"):
+                            # one pass through the combat parser, it works on
+                            # line.text so the damage keeps its decimal point.
+                            event = combat.parse(line.text)
 
-                                try:
-                                    if 'experience' in lstring:
-                                        xp_gain = lstring[lstring.index('experience') - 1]
-                                    elif 'experience,' in lstring:
-                                        xp_gain = lstring[lstring.index('experience,') - 1]
-
-                                    if xp_gain:
-                                        xp_gain = int(xp_gain.replace(",", ""))
-                                except ValueError:
-                                    pass                            
-
-                                if inf_gain or xp_gain:
+                            if isinstance(event, combat.Gain):
+                                # You gain 104 experience and 36 influence.
+                                if event.experience or event.influence:
                                     if not settings.REPLAY or settings.XP_IN_REPLAY:
-                                        log.debug(f"Awarding xp: {xp_gain} and inf: {inf_gain}")
+                                        log.debug(f"Awarding xp: {event.experience} and inf: {event.influence}")
                                         with models.db() as session:
-                                            new_event = models.HeroStatEvent(
+                                            models.add_hero_stat_event(
+                                                session,
                                                 hero_id=self.hero.id,
-                                                event_time=datetime.strptime(
-                                                    f"{datestr} {timestr}", "%Y-%m-%d %H:%M:%S"
-                                                ),
-                                                xp_gain=xp_gain,
-                                                inf_gain=inf_gain,
+                                                event_time=line.timestamp,
+                                                xp_gain=event.experience,
+                                                inf_gain=event.influence,
                                             )
-                                            session.add(new_event)
-                                            session.commit()
 
-                            if self.hero and lstring[1] == "hit":
+                            elif isinstance(event, (combat.Hit, combat.Miss)):
                                 # You hit Abomination with your Assassin's Psi Blade for 43.22 points of Psionic damage.
-                                # You hit Zealot with your Bitter Ice Blast for 13088 points of Cold damage (SCOURGE)
-                                # You hit Button Man Buckshot with your Dart Burst for 10.61 points of Lethal damage over time.
-                                # You hit Arva with your Freeze Ray for 7.49 points of Cold damage over time (SCOURGE).
-                                
-                                m = re.fullmatch(
-                                    r"You hit (?P<target>.*) with your (?P<power>.*) for (?P<damage>.*) points of (?P<damage_type>.*) damage( |\.)?(?P<DOT>[^\n\(\.A-Z]*)[^\nA-Z\(]*\(?(?P<special>[A-Z]*).*",
-                                    " ".join(lstring)
-                                )
-                                if m:
-                                    #target, power, damage, damagetype, special = m.groups()
-                                    if m['special'] is None:
-                                        special = ""
-                                    else:
-                                        special = m['special'].strip("() \t\n\r\x0b\x0c").title()
+                                # MISSED Mamba Blade!! Your Contaminated Strike power had a 95.00% chance to hit, you rolled a 95.29.
+                                self.damage.record(event, line.seconds)
 
-                                    d = models.Damage(
-                                        hero_id=self.hero.id,
-                                        target=m['target'],
-                                        power=m['power'],
-                                        damage=int(m['damage']),
-                                        damage_type=m['damage_type'],
-                                        special=special
-                                    )
-                                    
-                                    with models.db() as session:
-                                        session.add(d)
-                                        session.commit()
-                                else:
-                                    # You hit Gravedigger Slammer with your Twilight Grasp reducing their damage and chance to hit and healing you and your allies!
-                                    m = re.fullmatch(
-                                        r"You hit (?P<target>.*) with your (?P<power>.*) reducing .*",
-                                        " ".join(lstring)
-                                    )
-                                    if m:
-                                        # nothing to record
-                                        pass
-                                    else:
-                                        dialog = plainstring(" ".join(lstring))
-                                        log.warning(f'hit failed regex: {dialog}')
+                            elif isinstance(event, combat.Debuff):
+                                # nothing to record
+                                pass
+
+                            elif lstring[0] == "MISSED" or lstring[1:2] == ["hit"]:
+                                log.warning('String failed regex:\n%s' % plainstring(line.text))
 
                         if self.hero and lstring[0] == "MISSED":
-                            # MISSED Mamba Blade!! Your Contaminated Strike power had a 95.00% chance to hit, you rolled a 95.29.
-                            m = re.fullmatch(
-                                r"MISSED (?P<target>.*)!! Your (?P<power>.*) power had a (?P<chance_to_hit>[0-9\.]*)% chance to hit, you rolled a (?P<roll>[0-9\.]*).",
-                                " ".join(lstring)
-                            )
-                            if m:
-                                target, power, change_to_hit, roll = m.groups()
-                                
-                                # Okay to tuck a "miss" in here?
-                                d = models.Damage(
-                                    hero_id=self.hero.id,
-                                    target=target,
-                                    power=power,
-                                    damage=0,
-                                    damage_type="",
-                                    special=""
-                                )
-                                
-                                with models.db() as session:
-                                    session.add(d)
-                                    session.commit()
-                            else:
-                                log.warning('String failed regex:\n%s' % " ".join(lstring))
+                            # handled above, nothing to say about it.
+                            pass
 
                         elif lstring[0] == "Welcome":
                             if self.hero:
@@ -1156,6 +991,7 @@ Ten missions, ends in fight against AV Vandal'''
                                 hero_name = " ".join(lstring[5:]).strip("!")
                                 if hero_name != self.hero.name:
                                     self.hero = Hero(hero_name)
+                                    self.reset_damage()
 
                                     # we want to notify upstream UI about this.
                                     self.event_queue.put(("SET_CHARACTER", self.hero.name))
@@ -1166,24 +1002,18 @@ Ten missions, ends in fight against AV Vandal'''
 
                         elif lstring[-2:] == ["is", "recharged"]:
 
+                            # "Hasten is recharged"
+                            power_name = line.joined[:-len(" is recharged")]
+
                             log.debug('Adding RECHARGED event to event_queue...')
                             self.event_queue.put(
-                                ("RECHARGED", " ".join(lstring[0:lstring.index("is")]))
+                                ("RECHARGED", power_name)
                             )
 
                             # how long ago did this power last recharge?
-                            power_name = " ".join(lstring[0:-2])
                             if power_name in self.previous_stopwatch:
-                                dur_h, dur_m, dur_s = self.previous_stopwatch[power_name].split(':')
-                                this_h, this_m, this_s = timestr.split(':')
-
-                                h, m, s = (
-                                    int(this_h) - int(dur_h),
-                                    int(this_m) - int(dur_m),
-                                    int(this_s) - int(dur_s)
-                                )
-
-                                total_seconds = (s + (m * 60) + (h * 3600))
+                                # line.seconds keeps counting past midnight
+                                total_seconds = line.seconds - self.previous_stopwatch[power_name]
                                 # if this is a power we don't use very often, it's more likely we're interested in knowing when
                                 # it recharges.  Two minutes feels about right to me.
 
@@ -1195,11 +1025,11 @@ Ten missions, ends in fight against AV Vandal'''
                                         )
                                         self.ssay(dialog)
 
-                            self.previous_stopwatch[power_name] = timestr
+                            self.previous_stopwatch[power_name] = line.seconds
                      
                         else:
-                            prefix = lstring[0]
-                            remainder = " ".join(lstring[1:])
+                            prefix = line.prefix
+                            remainder = line.remainder
                             done = False
                             if prefix in ['Ember', 'Cold', 'Fiery']:
                                 continue
@@ -1235,8 +1065,7 @@ Ten missions, ends in fight against AV Vandal'''
                                                     # seconds have passed since we
                                                     # last spoke this pattern
                                 
-                                                    h, m, s = timestr.split(':')
-                                                    total_seconds = (int(h) * 3600) + (int(m) * 60) + int(s)
+                                                    total_seconds = line.seconds
 
                                                     if (
                                                         soak_key in self.previous_stopwatch and
@@ -1305,8 +1134,7 @@ Ten missions, ends in fight against AV Vandal'''
                                                     # seconds have passed since we
                                                     # last spoke this pattern
                                 
-                                                    h, m, s = timestr.split(':')
-                                                    total_seconds = (int(h) * 3600) + (int(m) * 60) + int(s)
+                                                    total_seconds = line.seconds
 
                                                     if (
                                                         soak_key in self.previous_stopwatch and
@@ -1348,6 +1176,7 @@ Ten missions, ends in fight against AV Vandal'''
                         # A new team task has been chosen.                           
             
                 # we've exhausted to EOF
+                self.publish_damage()
                 time.sleep(0.25)
 
 
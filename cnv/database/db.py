@@ -6,8 +6,9 @@ from pathlib import Path
 
 # import alembic.config
 import cnv.database.models as models
+import cnv.database.search as search
 import cnv.lib.settings as settings
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from sqlalchemy_utils import create_database, database_exists
 
 sqlite_database_filename = "voices.db"
@@ -58,8 +59,48 @@ def build_migrate():
         create_database(engine.url)
 
         models.Base.metadata.create_all(engine)    
+        search.build()
     return
 
+def build_rollups():
+    """
+    hero_stat_rollup showed up long after plenty of databases already existed
+    (and alembic isn't wired up), so create and backfill it here if it's
+    missing.  It is all derived from hero_stat_events, so one from before the
+    resolution column went away is simply rebuilt.
+    """
+    inspector = inspect(models.engine)
+    table = models.HeroStatRollup.__tablename__
+    if inspector.has_table(table):
+        columns = [column['name'] for column in inspector.get_columns(table)]
+        if 'resolution' not in columns:
+            return
+        log.info(f'Rebuilding {table} without per-resolution buckets...')
+        models.HeroStatRollup.__table__.drop(models.engine)
+
+    log.info('Building hero_stat_rollup from hero_stat_events...')
+    models.HeroStatRollup.__table__.create(models.engine)
+    
+    existing = [index['name'] for index in inspector.get_indexes('hero_stat_events')]
+    for index in models.HeroStatEvent.__table__.indexes:
+        if index.name not in existing:
+            index.create(models.engine)
+
+    with models.Session(models.engine) as session:
+        models.backfill_hero_stat_rollup(session)
+
+
+def build_shared_state():
+    """
+    The tables the processes share (models.SHARED_STATE_TABLES), for
+    databases from before they existed.
+    """
+    models.Base.metadata.create_all(
+        models.engine,
+        tables=models.SHARED_STATE_TABLES
+    )
+
+
 NEW_DB = False
 
 if not database_exists(engine.url):
@@ -79,6 +120,9 @@ if not database_exists(engine.url):
 else:
     # log.info('Checking for database migration...')
     # alembic.config.main(argv=alembicArgs)
+    build_rollups()
+    build_shared_state()
+    search.build()
 
     if not settings.REPLAY or settings.SESSION_CLEAR_IN_REPLAY:
         log.info('Clearing session storage...')   
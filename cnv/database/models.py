@@ -1,9 +1,7 @@
 import json
 import logging
 import random
-import re
 import sys
-import copy
 import tkinter as tk
 from contextlib import contextmanager
 from datetime import datetime
@@ -11,19 +9,26 @@ from typing import Optional, Self
 
 import pyfiglet
 from cnv.lib import settings
-from cnv.lib.settings import diskcache
-from cnv.engines import registry
+from cnv.lib import catalog
+import cnv.engines  # registers engine voice catalogs
 from sqlalchemy import (
     JSON,
+    Boolean,
     DateTime,
+    Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     create_engine,
     delete,
+    insert,
     orm,
     select,
+    text,
+    update,
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.engine.interfaces import Connectable
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Mapped, Session, mapped_column, scoped_session, sessionmaker
@@ -63,6 +68,26 @@ def db():
     yield session
     session.close()
 
+
+@contextmanager
+def transaction(session):
+    """
+    The engine is AUTOCOMMIT, so every statement is its own transaction (and
+    its own fsync).  Everything inside this is one.
+
+        with transaction(session):
+            session.add(...)
+            session.flush()
+    """
+    session.execute(text("BEGIN"))
+    try:
+        yield session
+        session.flush()
+    except Exception:
+        session.execute(text("ROLLBACK"))
+        raise
+    session.execute(text("COMMIT"))
+
 # parent class for all the table models
 Base = declarative_base()
 
@@ -133,8 +158,10 @@ class Character(Base):
         
         str_category = category_int2str(category)
 
-        log.debug("\n" + pyfiglet.figlet_format(f'New {str_category}', font="3d_diagonal", width=120))
-        log.debug("\n" + pyfiglet.figlet_format(name, font="3d_diagonal", width=120))
+        if log.isEnabledFor(logging.DEBUG):
+            # figlet isn't free, don't draw banners nobody will see
+            log.debug("\n" + pyfiglet.figlet_format(f'New {str_category}', font="3d_diagonal", width=120))
+            log.debug("\n" + pyfiglet.figlet_format(name, font="3d_diagonal", width=120))
         if character is None:
             log.info(f'|- Creating new "{str_category}" character "{name}" in database...')
         else:
@@ -173,44 +200,6 @@ class Character(Base):
         log.debug(f"Primary engine ({pkey}): {primary_engine_name}")
         log.debug(f"Secondary engine ({skey}): {secondary_engine_name}")
 
-        # default to the primary voice engine for this category of character
-        if character is not None:
-            # we want to re-create this character.
-            character = cls.get(
-                name=name,
-                category=category, 
-                session=session
-            )
-            character.engine = primary_engine_name
-            character.engine_secondary = secondary_engine_name
-            character.group_name=group_name
-            
-            # remove any existing tts config
-            session.execute(
-                delete(BaseTTSConfig).where(
-                    BaseTTSConfig.character_id==character.id
-                )
-            )
-
-            # remove any existing effects
-            session.execute(
-                delete(Effects).where(
-                    Effects.character_id==character.id
-                )
-            )
-            session.commit()
-        else:
-            character = cls(
-                name=name,
-                engine=primary_engine_name,
-                engine_secondary=secondary_engine_name,
-                category=category,
-                group_name=group_name
-            )
-            session.add(character)
-            session.commit()
-            session.refresh(character)
-               
         # if all_npc provided a gender, we will use that.
         if gender is None:
             # otherwise, use the gender value in preset.  IE: the preset gender
@@ -226,177 +215,201 @@ class Character(Base):
                 else:
                     gender = random.choice(['Male', 'Female'])
 
-        for rank, engine_key in [
+        engine_keys = [
             ["primary", ENGINE_COSMETIC_TO_ID[primary_engine_name]],
             ["secondary", ENGINE_COSMETIC_TO_ID[secondary_engine_name]]
-        ]:
-            # all of the available _engine_ configuration values
-            engine_config_meta = session.scalars(
-                select(EngineConfigMeta).where(
-                    EngineConfigMeta.engine_key==engine_key
+        ]
+
+        # all of the available _engine_ configuration values, for both
+        # engines at once
+        engine_config_meta = session.scalars(
+            select(EngineConfigMeta).where(
+                EngineConfigMeta.engine_key.in_(
+                    [engine_key for _, engine_key in engine_keys]
                 )
-            ).all()            
+            )
+        ).all()
 
+        # decide everything before we start writing; the catalog might have
+        # to go ask somebody and we don't want the database locked while it
+        # does.
+        config_rows = []
+        for rank, engine_key in engine_keys:
             log.debug(f'|-  The configuration fields relevant to the {engine_key} TTS Engine are:')
             # loop through the availabe configuration settings
             for config_meta in engine_config_meta:
+                if config_meta.engine_key != engine_key:
+                    continue
                 log.debug(f"|-    {config_meta}")
-                # we want sensible defaults with some jitter
-                # for each voice engine config setting.
-                value = None
-
-                # does this configuration setting take a string value from a list of
-                # possible choices?
-                if config_meta.varfunc == "StringVar":
-                    # we don't know what the possible values are since we can't run
-                    # the function without instantiating the engine, which will drag
-                    # in TK baggage. 
-
-                    # but.. we can accesss the cache?.  does that introduce a
-                    # sequence dependency (yes)
-                    all_values = diskcache(f"{engine_key}_{config_meta.key}")
-                    log.debug(f'{engine_key=} {config_meta.key=}')
-                    
-                    if all_values is None or len(all_values) == 0:
-                        log.warning(f'Cache {engine_key}_{config_meta.key} is empty')
-                        registry.get_engine(engine_key)(None, None, None, None)
-                        # (parent, rank, name, category, *args, **kwargs):
-                        all_values = list(
-                            diskcache(f"{engine_key}_{config_meta.key}")
-                        )                        
-
-                    else:
-                        try:
-                            all_values = list(all_values)
-                        except TypeError:
-                            log.warning(f'Cache {engine_key}_{config_meta.key} is empty')
-                            value = "<Cache Failure>"
-
-                            # just creating this should be enough to populate the
-                            # engine cache?  I guess not.
-                            registry.get_engine(engine_key)(None, None, None, None)
-                            # (parent, rank, name, category, *args, **kwargs):
-                            all_values = list(
-                                diskcache(f"{engine_key}_{config_meta.key}")
-                            )
-                        except AttributeError:
-                            log.warning(f'Cache {engine_key}_{config_meta.key} is invalid')
-                            # Cache openai_voice_name is empty
-                            value = "<Cache Failure>"
-
-                            # just creating this should be enough to populate the
-                            # engine cache.
-                            registry.get_engine(engine_key)(None, None, None, None)
-                            all_values = list(
-                                diskcache(f"{engine_key}_{config_meta.key}")
-                            )
 
-                    if all_values:
-                        # it's a dict, key is a voice_name
-                        language_code_regex = settings.get_language_code_regex()
-
-                        if language_code_regex and 'language_code' in all_values[0].keys():
-                            # pass through languages that satisfy the regex
-                            out = []
-                            for v in all_values:
-                                code = v.get('language_code', '')
-                                if re.match(language_code_regex, code):
-                                    out.append(v)
-                            all_values = list(out)
-                        
-                        # if we have a gender, filter out the voices that don't
-                        # have the same gender.
-                        pre_gender_filter = copy.copy(all_values)
-                        if gender and 'gender' in all_values[0].keys():
-                            def gender_filter(voice):
-                                return voice['gender'].title() == gender.title()
-                            all_values = list(filter(gender_filter, all_values))
-                        
-                        if len(all_values) == 0:
-                            log.debug('Gender filter removed all voice name entries')
-                            all_values = pre_gender_filter
-
-                        # does the preset have any more guidance?
-                        # use the preset if there is one.  Otherwise
-                        # choose randomly from the available options.
-                        log.debug(f"{all_values=} {engine_key}/{config_meta.key}")
-
-                        if config_meta.key in preset:
-                            value = preset[config_meta.key]
-                        else:
-                            if all_values:
-                                chosen_row = random.choice(all_values)
-                                log.debug(f'Random selection: {chosen_row}')
-                                value = chosen_row[config_meta.key]
-
-                # do we have a numeric value, with a min/max and some
-                # hints about useful granularity?
-                elif config_meta.varfunc == "DoubleVar":
-                    # no cache, use the preset or a random choice in the range.
-                    # this shouldn't be .uniform, it should be more likely 
-                    # for the values that are more common.
-                    value = preset.get(
-                        config_meta.key,
-                        random.uniform(
-                            config_meta.cfgdict['min'], 
-                            config_meta.cfgdict['max']
-                        )
+                value = cls.choose_config_value(config_meta, preset, gender)
+                log.debug(f'Configuring {rank} engine {engine_key}:  Setting {config_meta.key} to {value}')
+                config_rows.append({
+                    'rank': rank,
+                    'key': config_meta.key,
+                    'value': value
+                })
+
+        # All of the writing is one transaction.  flush() when we need an id
+        # back; a new NPC mid-fight used to be a commit (and an fsync) for
+        # every config row and every effect.
+        with transaction(session):
+            # default to the primary voice engine for this category of character
+            if character is not None:
+                # we want to re-create this character.
+                character = cls.get(
+                    name=name,
+                    category=category, 
+                    session=session
+                )
+                character.engine = primary_engine_name
+                character.engine_secondary = secondary_engine_name
+                character.group_name=group_name
+            
+                # remove any existing tts config
+                session.execute(
+                    delete(BaseTTSConfig).where(
+                        BaseTTSConfig.character_id==character.id
                     )
+                )
 
-                    # round to nearest multiple of 'resolution'
-                    resolution = config_meta.cfgdict.get('resolution', 1.0)
-                    value = (
-                        resolution * round(value / resolution)
+                # remove any existing effects, and their settings
+                session.execute(
+                    delete(EffectSetting).where(
+                        EffectSetting.effect_id.in_(
+                            select(Effects.id).where(
+                                Effects.character_id==character.id
+                            )
+                        )
                     )
-
-                # do we have a true/false, enable/disable sort thing?
-                elif config_meta.varfunc == "BooleanVar":
-                    # to be or not to be, that is the question.
-                    value = preset.get(
-                        config_meta.key,
-                        random.choice([True, False])
+                )
+                session.execute(
+                    delete(Effects).where(
+                        Effects.character_id==character.id
                     )
-
-                # write our value for this configuration setting to the database
-                log.debug(f'Configuring {rank} engine {engine_key}:  Setting {config_meta.key} to {value}')
-                new_config_entry = BaseTTSConfig(
-                    character_id=character.id,
-                    rank=rank,
-                    key=config_meta.key,
-                    value=value
                 )
-                session.add(new_config_entry)
-                session.commit()
-
-        # add effects but only if there is a preset, no random effects.
-        for effect_dict in preset.get('Effects', []):
-            # create the effect itself
-            log.debug(f'Adding effect: {effect_dict}')
-            effect = Effects(
-                character_id=character.id,
-                effect_name=effect_dict['name']
-            )
-            session.add(effect)
-            session.commit()
-            session.refresh(effect)
+            else:
+                character = cls(
+                    name=name,
+                    engine=primary_engine_name,
+                    engine_secondary=secondary_engine_name,
+                    category=category,
+                    group_name=group_name
+                )
+                session.add(character)
+            session.flush()
+
+            # write our value for each configuration setting to the database
+            if config_rows:
+                session.execute(
+                    insert(BaseTTSConfig),
+                    [dict(row, character_id=character.id) for row in config_rows]
+                )
 
-            # add the settings      
-            for key, value in effect_dict.items():
-                # we've already baked the name field
-                if key == "name":
-                    continue
+            # add effects but only if there is a preset, no random effects.
+            effects = []
+            for effect_dict in preset.get('Effects', []):
+                # create the effect itself
+                log.debug(f'Adding effect: {effect_dict}')
+                effects.append(Effects(
+                    character_id=character.id,
+                    effect_name=effect_dict['name']
+                ))
+
+            if effects:
+                session.add_all(effects)
+                # the settings need the effect ids
+                session.flush()
+
+                setting_rows = []
+                for effect, effect_dict in zip(effects, preset['Effects']):
+                    # add the settings      
+                    for key, value in effect_dict.items():
+                        # we've already baked the name field
+                        if key == "name":
+                            continue
+
+                        setting_rows.append({
+                            'effect_id': effect.id,
+                            'key': key,
+                            'value': value
+                        })
+
+                if setting_rows:
+                    session.execute(insert(EffectSetting), setting_rows)
 
-                effect_settings = EffectSetting(
-                    effect_id=effect.id,
-                    key=key,
-                    value=value
-                )
-                session.add(effect_settings)
-            session.commit()
+        session.commit()
 
         log.info('create_character() complete: %s', character)
         return character
 
+    @staticmethod
+    def choose_config_value(config_meta, preset, gender):
+        """
+        A sensible value, with some jitter, for one engine configuration
+        setting of a new character.  The preset wins if it has one.
+
+        Choices come from the voice catalog, we never build an engine (and
+        its widgets) to find out what they are.
+        """
+        # does this configuration setting take a string value from a list of
+        # possible choices?
+        if config_meta.varfunc == "StringVar":
+            if config_meta.key in preset:
+                return preset[config_meta.key]
+
+            catalog_key = f"{config_meta.engine_key}_{config_meta.key}"
+            voices = catalog.get(catalog_key)
+            if not voices:
+                log.warning(f'Cache {catalog_key} is empty, using the default')
+                return config_meta.default
+
+            # pass through languages that satisfy the regex, and if we have
+            # a gender, filter out the voices that don't have the same
+            # gender.  The catalog remembers the answer, every character
+            # after the first is free.
+            all_values = voices.choices(
+                settings.get_language_code_regex(),
+                gender
+            )
+            log.debug(f"{all_values=} {catalog_key}")
+
+            # nothing in this language/gender, the default will have to do
+            if not all_values:
+                log.warning(f'No {catalog_key} choices for {gender=}, using the default')
+                return config_meta.default
+
+            # choose randomly from the available options.
+            chosen_row = random.choice(all_values)
+            log.debug(f'Random selection: {chosen_row}')
+            return chosen_row[config_meta.key]
+
+        # do we have a numeric value, with a min/max and some
+        # hints about useful granularity?
+        elif config_meta.varfunc == "DoubleVar":
+            # no cache, use the preset or a random choice in the range.
+            # this shouldn't be .uniform, it should be more likely 
+            # for the values that are more common.
+            value = preset.get(
+                config_meta.key,
+                random.uniform(
+                    config_meta.cfgdict['min'], 
+                    config_meta.cfgdict['max']
+                )
+            )
+
+            # round to nearest multiple of 'resolution'
+            resolution = config_meta.cfgdict.get('resolution', 1.0)
+            return resolution * round(value / resolution)
+
+        # do we have a true/false, enable/disable sort thing?
+        elif config_meta.varfunc == "BooleanVar":
+            # to be or not to be, that is the question.
+            return preset.get(
+                config_meta.key,
+                random.choice([True, False])
+            )
+
     @classmethod
     def get(cls, name: str, category: int, session: Connectable) -> Self:
         """
@@ -525,6 +538,97 @@ def update_character_last_spoke(character_id, session):
     character.last_spoke = datetime.now()
 
 
+def get_group_preset(group_name):
+    """
+    The preset for characters in group_name.  group_name is whatever
+    create_character() stored, sometimes the all_npcs group and sometimes the
+    alias it maps to.
+    """
+    preset = settings.get_preset(group_name)
+    if not preset:
+        preset = settings.get_preset(settings.get_alias(group_name))
+    return preset
+
+
+def apply_group_preset(group_name, session):
+    """
+    Re-apply the preset for group_name to every character already in it, in
+    one transaction.  Returns the ids of the characters it touched.
+
+    Engine settings the preset has replace that setting for both ranks,
+    everything else about their voices is left alone.  If the preset has
+    Effects they replace each character's effects.  The preset gender only
+    matters when a character is created, it picks the voice.
+    """
+    preset = get_group_preset(group_name)
+    in_group = select(Character.id).where(Character.group_name == group_name)
+    character_ids = session.scalars(in_group).all()
+    if not character_ids or not preset:
+        log.info(f'Nothing to apply to {group_name}: {len(character_ids)} characters, {preset=}')
+        return []
+
+    engine_settings = {
+        key: value
+        for key, value in preset.items()
+        if key not in ('Effects', 'gender')
+    }
+
+    with transaction(session):
+        for key, value in engine_settings.items():
+            session.execute(
+                update(BaseTTSConfig).where(
+                    BaseTTSConfig.character_id.in_(in_group),
+                    BaseTTSConfig.key == key
+                ).values(value=value)
+            )
+
+        if 'Effects' in preset:
+            group_effects = select(Effects.id).where(
+                Effects.character_id.in_(in_group)
+            )
+            session.execute(
+                delete(EffectSetting).where(
+                    EffectSetting.effect_id.in_(group_effects)
+                )
+            )
+            session.execute(
+                delete(Effects).where(Effects.character_id.in_(in_group))
+            )
+
+            effects = []
+            effect_dicts = []
+            for character_id in character_ids:
+                for effect_dict in preset['Effects']:
+                    effects.append(Effects(
+                        character_id=character_id,
+                        effect_name=effect_dict['name']
+                    ))
+                    effect_dicts.append(effect_dict)
+
+            if effects:
+                session.add_all(effects)
+                # the settings need the effect ids
+                session.flush()
+
+                setting_rows = []
+                for effect, effect_dict in zip(effects, effect_dicts):
+                    for key, value in effect_dict.items():
+                        if key == "name":
+                            continue
+                        setting_rows.append({
+                            'effect_id': effect.id,
+                            'key': key,
+                            'value': value
+                        })
+
+                if setting_rows:
+                    session.execute(insert(EffectSetting), setting_rows)
+
+    session.commit()
+    log.info(f'Applied the {group_name} preset to {len(character_ids)} characters')
+    return character_ids
+
+
 class EngineConfigMeta(Base):
     __tablename__ = "engine_config_meta"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -562,7 +666,9 @@ def get_engine_config(character_id, rank):
 
 def set_engine_config(character_id, rank, new_config):
     """
+    Returns True if anything actually changed.
     """
+    changed = False
     old_config = get_engine_config(character_id, rank)
     # log.debug(pyfiglet.figlet_format("Engine Edit", font="3d_diagonal", width=120))
     log.debug(f"Setting Engine Config: {character_id=} {old_config=} {new_config=}")
@@ -571,6 +677,7 @@ def set_engine_config(character_id, rank, new_config):
             if key in old_config:
                 if str(old_config[key]) != str(new_config[key]):
                     log.debug(f'change in {key}: {old_config[key]} != {new_config[key]}')
+                    changed = True
                     # this value has changed
                     row = session.scalar(
                         select(BaseTTSConfig).where(
@@ -597,6 +704,7 @@ def set_engine_config(character_id, rank, new_config):
                 # we have a new key/value, this will only 
                 # happen when upgrading/downgrading.
                 log.debug(f'new key: {key} = {new_config[key]}')
+                changed = True
                 row = BaseTTSConfig(
                     character_id=character_id,
                     rank=rank,
@@ -607,6 +715,7 @@ def set_engine_config(character_id, rank, new_config):
 
         for key in old_config:
             if key not in new_config:
+                changed = True
                 # this key is no longer part of the config, this
                 # will also only happen when upgrading/downgrading.
                 row = session.execute(
@@ -619,6 +728,8 @@ def set_engine_config(character_id, rank, new_config):
 
         session.commit()
 
+    return changed
+
 
 class BaseTTSConfig(Base):
     __tablename__ = "base_tts_config"
@@ -826,3 +937,197 @@ class HeroStatEvent(Base):
     event_time: orm.Mapped[datetime] 
     xp_gain: Mapped[Optional[int]]
     inf_gain: Mapped[Optional[int]]
+
+    __table_args__ = (
+        Index('ix_hero_stat_events_hero_time', 'hero_id', 'event_time'),
+    )
+
+
+# bucket size for HeroStatRollup, in seconds.  The charts only ever show the
+# last two hours so per-minute is all anybody reads; bucket_start() rounds
+# down to it.
+ROLLUP_MINUTE = 60
+
+
+class HeroStatRollup(Base):
+    """
+    HeroStatEvent summed up per-minute.  The charts read these
+    instead of grouping every raw event, every time they redraw.
+    """
+    __tablename__ = "hero_stat_rollup"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    hero_id = mapped_column(ForeignKey("hero.id"))
+    bucket_start: Mapped[datetime] = mapped_column(DateTime)
+    xp_gain: Mapped[int] = mapped_column(Integer, default=0)
+    inf_gain: Mapped[int] = mapped_column(Integer, default=0)
+    events: Mapped[int] = mapped_column(Integer, default=0)
+
+    __table_args__ = (
+        Index(
+            'ix_hero_stat_rollup_bucket',
+            'hero_id', 'bucket_start',
+            unique=True
+        ),
+    )
+
+
+def bucket_start(event_time):
+    """
+    The start of the ROLLUP_MINUTE bucket event_time belongs in.
+    """
+    return event_time.replace(second=0, microsecond=0)
+
+
+def add_hero_stat_event(session, hero_id, event_time, xp_gain, inf_gain):
+    """
+    Record a HeroStatEvent and add it to the rollup bucket it belongs in.
+    Both or neither, a backfill in between would count it twice.
+    """
+    statement = sqlite_insert(HeroStatRollup).values(
+        hero_id=hero_id,
+        bucket_start=bucket_start(event_time),
+        xp_gain=xp_gain or 0,
+        inf_gain=inf_gain or 0,
+        events=1,
+    )
+
+    with transaction(session):
+        session.add(
+            HeroStatEvent(
+                hero_id=hero_id,
+                event_time=event_time,
+                xp_gain=xp_gain,
+                inf_gain=inf_gain,
+            )
+        )
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=['hero_id', 'bucket_start'],
+                set_={
+                    'xp_gain': HeroStatRollup.xp_gain + statement.excluded.xp_gain,
+                    'inf_gain': HeroStatRollup.inf_gain + statement.excluded.inf_gain,
+                    'events': HeroStatRollup.events + 1,
+                }
+            )
+        )
+
+
+# bucket_start for rebuilding the rollup from hero_stat_events.  It has to
+# match what sqlalchemy writes for a DateTime or the range queries won't line
+# up.
+ROLLUP_BACKFILL_FORMAT = "%Y-%m-%d %H:%M:00.000000"
+
+
+def backfill_hero_stat_rollup(session):
+    """
+    Rebuild hero_stat_rollup from every HeroStatEvent we have.  One
+    transaction, nobody sees it half built.
+    """
+    with transaction(session):
+        session.execute(text("DELETE FROM hero_stat_rollup"))
+        session.execute(
+            text(
+                "INSERT INTO hero_stat_rollup "
+                "(hero_id, bucket_start, xp_gain, inf_gain, events) "
+                "SELECT hero_id, STRFTIME(:bucket_format, event_time), "
+                "COALESCE(SUM(xp_gain), 0), COALESCE(SUM(inf_gain), 0), COUNT(*) "
+                "FROM hero_stat_events "
+                "GROUP BY hero_id, STRFTIME(:bucket_format, event_time)"
+            ),
+            {'bucket_format': ROLLUP_BACKFILL_FORMAT}
+        )
+
+
+def get_hero_stat_rollup(session, hero_id, start_time, end_time):
+    """
+    The buckets for hero_id between start_time and end_time, oldest first.
+    """
+    return session.scalars(
+        select(HeroStatRollup).where(
+            HeroStatRollup.hero_id == hero_id,
+            HeroStatRollup.bucket_start >= bucket_start(start_time),
+            HeroStatRollup.bucket_start <= end_time,
+        ).order_by(
+            HeroStatRollup.bucket_start
+        )
+    ).all()
+
+
+# Shared between the editor, the chatter and the re-render workers.  These used
+# to live in state.json, but that is read-modify-write of the whole file and
+# the processes kept dropping each other's changes.  Here each change is one
+# statement.
+
+class PrerenderRequest(Base):
+    """
+    A character with a new voice; the pre-renderer re-renders any of their
+    clips older than requested.  See voices/prerender.py
+    """
+    __tablename__ = "prerender_request"
+    character_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # unix time
+    requested: Mapped[float] = mapped_column(Float)
+
+
+class PrerenderSpend(Base):
+    """
+    Characters the pre-renderer has sent to each paid engine, per day.
+    """
+    __tablename__ = "prerender_spend"
+    day: Mapped[str] = mapped_column(String(10), primary_key=True)
+    engine: Mapped[str] = mapped_column(String(64), primary_key=True)
+    characters: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class EngineHealth(Base):
+    """
+    Each engine's circuit breaker, see engines/health.py
+    """
+    __tablename__ = "engine_health"
+    engine: Mapped[str] = mapped_column(String(64), primary_key=True)
+    state: Mapped[str] = mapped_column(String(16))
+    failures: Mapped[int] = mapped_column(Integer, default=0)
+    opened_at: Mapped[float] = mapped_column(Float, default=0)
+    open_seconds: Mapped[float] = mapped_column(Float)
+    probe_at: Mapped[float] = mapped_column(Float, default=0)
+    # unix time of the last state change, the newest one wins
+    updated: Mapped[float] = mapped_column(Float, default=0)
+    # latency, error rate and hedging, for the configuration tab
+    stats = mapped_column(JSON, nullable=True)
+
+
+class RateBucket(Base):
+    """
+    Each engine's token bucket, see engines/quota.py
+    """
+    __tablename__ = "rate_bucket"
+    engine: Mapped[str] = mapped_column(String(64), primary_key=True)
+    tokens: Mapped[float] = mapped_column(Float)
+    # unix time tokens was counted at
+    at: Mapped[float] = mapped_column(Float, default=0)
+
+
+class QuotaLedger(Base):
+    """
+    Characters sent to each engine this billing period, see engines/quota.py
+    """
+    __tablename__ = "quota_ledger"
+    engine: Mapped[str] = mapped_column(String(64), primary_key=True)
+    used: Mapped[int] = mapped_column(Integer, default=0)
+    # characters per period, None for no limit
+    quota_limit: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # unix time the count starts over
+    resets: Mapped[float] = mapped_column(Float, default=0)
+    # unix time we last asked the engine itself
+    synced: Mapped[float] = mapped_column(Float, default=0)
+    # the engine told us we're out
+    exhausted: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+SHARED_STATE_TABLES = [
+    PrerenderRequest.__table__,
+    PrerenderSpend.__table__,
+    EngineHealth.__table__,
+    RateBucket.__table__,
+    QuotaLedger.__table__,
+]
@@ -0,0 +1,293 @@
+"""
+Full text search over everything anybody has said.
+
+phrases_fts and translations_fts are sqlite FTS5 indexes over phrases.text and
+translations.text.  They are "external content" tables, they don't keep their
+own copy of the text, and the triggers below keep them in step with the real
+tables so nobody has to remember to update them.
+"""
+import logging
+import os
+from typing import NamedTuple, Optional
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.exc import OperationalError
+
+import cnv.database.models as models
+from cnv.lib import settings
+
+log = logging.getLogger(__name__)
+
+FTS_TABLES = (
+    # fts table, content table
+    ('phrases_fts', 'phrases'),
+    ('translations_fts', 'translations'),
+)
+
+
+def fts_ddl(fts_table, content_table):
+    """
+    The full text table and the triggers that keep it in step with
+    content_table.  Migration a3f1c9e07d52 has a frozen copy of this; if it
+    changes, so does the schema, and that needs a migration of its own.
+    """
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"text, content='{content_table}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {content_table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, text) VALUES (new.id, new.text); "
+        "END",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {content_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, text) VALUES ('delete', old.id, old.text); "
+        "END",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {content_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, text) VALUES ('delete', old.id, old.text); "
+        f"INSERT INTO {fts_table}(rowid, text) VALUES (new.id, new.text); "
+        "END",
+    ]
+
+
+def build(engine=models.engine):
+    """
+    Create the search tables and triggers if they are missing, and index
+    whatever is already in phrases/translations.
+    """
+    inspector = inspect(engine)
+    with engine.connect() as connection:
+        for fts_table, content_table in FTS_TABLES:
+            if inspector.has_table(fts_table):
+                continue
+
+            log.info(f'Building full text index {fts_table}...')
+            try:
+                for statement in fts_ddl(fts_table, content_table):
+                    connection.execute(text(statement))
+            except OperationalError as err:
+                # "no such module: fts5", search() falls back to LIKE
+                log.warning(f'Full text search is not available: {err}')
+                return
+
+            connection.execute(
+                text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+            )
+
+
+def match_expression(query):
+    """
+    Turn whatever the user typed into a safe FTS5 query; every word has to be
+    there, the last one can be the start of a word.
+
+        positron here  ->  "positron" "here"*
+    """
+    words = [
+        '"' + word.replace('"', '""') + '"' for word in query.split()
+    ]
+    if not words:
+        return None
+    words[-1] += "*"
+    return " ".join(words)
+
+
+class PhraseHit(NamedTuple):
+    phrase_id: int
+    character_id: int
+    name: str
+    category: str
+    # the text that matched, which is the translation for translated hits
+    text: str
+    # None for the original phrase, or the translation language
+    language_code: Optional[str]
+    # bm25, smaller is better
+    rank: float
+
+    def clip(self, rank="primary"):
+        """
+        The rendered audio file for this hit, or None if there isn't one.
+        """
+        cachefile = settings.get_cachefile(
+            self.name, self.text, self.category, rank
+        ) + ".wav"
+        if os.path.exists(cachefile):
+            return cachefile
+        return None
+
+
+SEARCH_SQL = """
+    SELECT hits.id, hits.character_id, character.name, character.category,
+           hits.text, hits.language_code, hits.rank
+    FROM (
+        SELECT phrases.id, phrases.character_id, phrases.text,
+               NULL AS language_code, bm25(phrases_fts) AS rank
+        FROM phrases_fts
+        JOIN phrases ON phrases.id = phrases_fts.rowid
+        WHERE phrases_fts MATCH :match
+        UNION ALL
+        SELECT translations.phrase_id, phrases.character_id, translations.text,
+               translations.language_code, bm25(translations_fts) AS rank
+        FROM translations_fts
+        JOIN translations ON translations.id = translations_fts.rowid
+        JOIN phrases ON phrases.id = translations.phrase_id
+        WHERE translations_fts MATCH :match
+    ) AS hits
+    JOIN character ON character.id = hits.character_id
+    {where}
+    ORDER BY rank
+    LIMIT :limit
+"""
+
+LIKE_SQL = """
+    SELECT phrases.id, phrases.character_id, character.name, character.category,
+           phrases.text, NULL AS language_code, 0 AS rank
+    FROM phrases
+    JOIN character ON character.id = phrases.character_id
+    WHERE phrases.text LIKE :like ESCAPE '\\'
+    {where}
+    LIMIT :limit
+"""
+
+
+def search(session, query, limit=50, character_id=None, exact=False):
+    """
+    Ranked phrase hits for query, best first.  character_id limits it to what
+    one character said.  exact only returns phrases that are exactly query.
+    """
+    match = match_expression(query)
+    if match is None:
+        return []
+
+    params = {'match': match, 'limit': limit}
+    conditions = []
+    if character_id is not None:
+        conditions.append("character.id = :character_id")
+        params['character_id'] = character_id
+
+    if exact:
+        # fts narrows it down, then we only want the real thing
+        conditions.append("hits.text = :exact")
+        params['exact'] = query
+
+    where = ""
+    if conditions:
+        where = "WHERE " + " AND ".join(conditions)
+
+    try:
+        rows = session.execute(
+            text(SEARCH_SQL.format(where=where)),
+            params
+        ).all()
+    except OperationalError as err:
+        log.debug(f'Full text search failed ({err}), using LIKE')
+        rows = like_search(session, query, limit, character_id, exact)
+
+    return [
+        PhraseHit(
+            phrase_id=phrase_id,
+            character_id=phrase_character_id,
+            name=name,
+            category=models.category_int2str(category),
+            text=phrase_text,
+            language_code=language_code,
+            rank=rank
+        ) for (
+            phrase_id, phrase_character_id, name, category,
+            phrase_text, language_code, rank
+        ) in rows
+    ]
+
+
+def like_search(session, query, limit, character_id, exact):
+    """
+    The slow way, for a sqlite without fts5.
+    """
+    params = {'limit': limit}
+    if exact:
+        params['like'] = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    else:
+        params['like'] = "%" + "%".join(
+            word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            for word in query.split()
+        ) + "%"
+
+    where = ""
+    if character_id is not None:
+        where = "AND character.id = :character_id"
+        params['character_id'] = character_id
+
+    return session.execute(
+        text(LIKE_SQL.format(where=where)),
+        params
+    ).all()
+
+
+def find_clips(message, exclude_character_id=None, rank="primary", limit=20, session=None):
+    """
+    Who else has already said exactly this, and has the audio on disk?  Returns
+    (PhraseHit, clip filename) pairs.
+    """
+    if session is None:
+        with models.db() as session:
+            hits = search(session, message, limit=limit, exact=True)
+    else:
+        hits = search(session, message, limit=limit, exact=True)
+
+    found = []
+    for hit in hits:
+        if hit.character_id == exclude_character_id:
+            continue
+        clip = hit.clip(rank)
+        if clip:
+            found.append((hit, clip))
+    return found
+
+
+def voice_signature(session, character_id, rank):
+    """
+    Everything besides the engine that decides how character_id sounds at
+    rank: the engine settings and the effects (in order) with theirs.  Two
+    characters with the same engine and signature say a line the same way,
+    so one can have the other's clip.
+    """
+    config = session.execute(
+        select(
+            models.BaseTTSConfig.key,
+            models.BaseTTSConfig.value
+        ).where(
+            models.BaseTTSConfig.character_id == character_id,
+            models.BaseTTSConfig.rank == rank
+        ).order_by(
+            models.BaseTTSConfig.key
+        )
+    ).all()
+
+    effects = session.execute(
+        select(
+            models.Effects.id,
+            models.Effects.effect_name,
+            models.EffectSetting.key,
+            models.EffectSetting.value
+        ).outerjoin(
+            models.EffectSetting,
+            models.EffectSetting.effect_id == models.Effects.id
+        ).where(
+            models.Effects.character_id == character_id
+        ).order_by(
+            models.Effects.id,
+            models.EffectSetting.key
+        )
+    ).all()
+
+    # the effect ids differ between characters, only the order matters
+    chain = {}
+    for effect_id, effect_name, key, value in effects:
+        name, effect_settings = chain.setdefault(effect_id, (effect_name, []))
+        if key is not None:
+            effect_settings.append((key, str(value)))
+
+    return (
+        tuple((key, str(value)) for key, value in config),
+        tuple((name, tuple(effect_settings)) for name, effect_settings in chain.values())
+    )
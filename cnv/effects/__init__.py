@@ -1,26 +1,37 @@
 from .base import registry
+from . import manifest
 import glob
 import os
 import logging
 
 log = logging.getLogger(__name__)
 
+# The effects we ship are listed in the manifest and imported when somebody
+# uses one.
+for cosmetic, module in manifest.EFFECTS.items():
+    registry.add_manifest(cosmetic, module)
+
 # importing dynamically so we can just drop compatable effects into this
 # directory and they can plug themselves in.  Each plugin registers itself and
-# provides its own configuration widgets. 
+# provides its own configuration widgets.  Anything not in the manifest is
+# imported right away.
 
 effect_plugins = glob.glob(
     os.path.join(os.path.dirname(__file__), '*.py')
 )
+in_manifest = set(manifest.EFFECTS.values())
 
 for potential in effect_plugins:
     if os.path.isfile(potential):
         module_name = os.path.splitext(os.path.basename(potential))[0]
-        if module_name in ['base', '__init__']:
+        if module_name in ['base', 'manifest', '__init__']:
             continue
 
         full_module_name = "cnv.effects." + module_name
+        if full_module_name in in_manifest:
+            continue
+
         log.debug(f'Loading {full_module_name} ({potential})')
         __import__(full_module_name, locals(), globals())
 
-log.info(f'* {registry.count()} Effect plugins loaded')
+log.info(f'* {registry.count()} Effect plugins available')
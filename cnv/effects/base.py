@@ -1,10 +1,14 @@
+import importlib
 import logging
 import tkinter as tk
 
 import customtkinter as ctk
+import pedalboard
 from sqlalchemy import select
+from voicebox.effects import PedalboardEffect
 
 import cnv.database.models as models
+from cnv.voices import prerender
 from cnv.lib.gui import Feather
 
 log = logging.getLogger(__name__)
@@ -20,27 +24,72 @@ IGNORE_SETTING = ['blend', ]
 class EffectRegistry:
     def __init__(self):
         self.effects = {}
+        # cosmetic -> module, for effects that aren't imported until they
+        # are wanted.  see cnv.effects.manifest
+        self.manifest = {}
+
+    def add_manifest(self, cosmetic, module):
+        self.manifest[cosmetic] = module
 
     def add_effect(self, cosmetic, effect_parameter_editor):
         log.debug(f'Registering plugin: {cosmetic}')
         self.effects[cosmetic] = effect_parameter_editor
 
     def get_effect(self, key):
+        if key not in self.effects and key in self.manifest:
+            log.debug(f'Loading {self.manifest[key]}')
+            importlib.import_module(self.manifest[key])
         return self.effects[key]
 
     def effect_list(self):
-        return sorted(list(self.effects.keys()))
+        return sorted(set(self.effects) | set(self.manifest))
 
     def get_effects(self):
+        for key in self.manifest:
+            self.get_effect(key)
         return self.effects
     
     def count(self):
-        return len(self.effects)
+        return len(set(self.effects) | set(self.manifest))
 
 
 registry = EffectRegistry()
 
 
+def fuse_effects(effects):
+    """
+    effects, with every run of consecutive pedalboard plugins turned into a
+    single Pedalboard.  One PedalboardEffect per plugin meant converting and
+    copying the whole clip once per plugin; a Pedalboard does the lot in one
+    process() call.  Anything that isn't pedalboard (the scipy filters, the
+    vocoder, ringmod, glitch, normalize..) stays where it is and splits the
+    run.
+    """
+    fused = []
+    run = []
+
+    def end_run():
+        if len(run) == 1:
+            fused.append(run[0])
+        elif run:
+            fused.append(PedalboardEffect(
+                pedalboard.Pedalboard([effect.plugin for effect in run])
+            ))
+        run.clear()
+
+    for effect in effects:
+        if isinstance(effect, PedalboardEffect):
+            run.append(effect)
+        else:
+            end_run()
+            fused.append(effect)
+    end_run()
+
+    if len(fused) < len(effects):
+        log.debug(f'Fused {len(effects)} effects into {len(fused)}')
+    return fused
+
+
 class LScale(ctk.CTkFrame):
     """
     Labeled choose-a-number
@@ -324,6 +373,11 @@ class EffectParameterEditor(ctk.CTkFrame):
                     # we have in the database
                     effect_setting.value = new_value
                     session.commit()
+
+                    # the clips for this character are out of date now
+                    effect = session.get(models.Effects, effect_id)
+                    if effect:
+                        prerender.request(effect.character_id)
                 else:
                     log.debug(f'Value for {effect_setting.key} has not changed')
 
@@ -0,0 +1,27 @@
+"""
+Every effect we ship, name -> module, so the effect registry can list them
+without importing them.  An effect's module is imported the first time
+somebody asks the registry for it.
+"""
+
+EFFECTS = {
+    'Bandpass Filter': 'cnv.effects.bandpassfilter',
+    'Bandstop Filter': 'cnv.effects.bandstopfilter',
+    'Bitcrush': 'cnv.effects.bitcrush',
+    'Chorus': 'cnv.effects.chorus',
+    'Clipping': 'cnv.effects.clipping',
+    'Compressor': 'cnv.effects.compressor',
+    'Delay': 'cnv.effects.delay',
+    'Distortion': 'cnv.effects.distortion',
+    'Gain': 'cnv.effects.gain',
+    'Glitch': 'cnv.effects.glitch',
+    'HighShelfFilter': 'cnv.effects.highshelffilter',
+    'Highpass Filter': 'cnv.effects.highpassfilter',
+    'LadderFilter': 'cnv.effects.ladderfilter',
+    'Lowpass Filter': 'cnv.effects.lowpassfilter',
+    'Normalize': 'cnv.effects.normalize',
+    'PitchShift': 'cnv.effects.pitchshift',
+    'Reverb': 'cnv.effects.reverb',
+    'RingMod': 'cnv.effects.ringmod',
+    'Vocoder': 'cnv.effects.vocoder',
+}
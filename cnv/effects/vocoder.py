@@ -1,6 +1,28 @@
+"""
+The vocoder, our own copy of voicebox.effects.Vocoder.
+
+voicebox builds a new set of filters for every clip and runs the bands one
+at a time, filtering the voice and the carrier through each band separately
+and copying the Audio three or four times per band on the way.  Robot voices
+were the slowest thing we render.
+
+Here the filter bank is designed once per (sample rate, bands, min/max freq,
+bandwidth, order) and kept.  The carrier is the same sawtooth for every clip,
+so it goes through the filter bank once too; a clip only uses as much of it
+as it needs.  What is left per clip is filtering the voice into its bands and
+one sosfilt() over all of them stacked for the envelopes.  sosfilt() takes
+one set of coefficients per call, so the bands themselves can't go through in
+one call.
+
+Same filters, same carrier, same order of operations; it sounds exactly like
+the voicebox one, only quicker.
+"""
+import functools
 import logging
 
-import voicebox
+import numpy as np
+from scipy.signal import iirfilter, sosfilt
+from voicebox.effects.effect import EffectWithDryWet
 
 from cnv.effects.base import (
     registry,
@@ -10,6 +32,165 @@ from cnv.effects.base import (
 
 log = logging.getLogger(__name__)
 
+# the envelope follower, same as voicebox
+ENVELOPE_FREQ = 50
+ENVELOPE_ORDER = 1
+
+# how much of the filtered carrier we keep around, in samples across all the
+# bands: 40 bands get 50,000 samples each (2s at 24khz).  Kept as float32
+# that's 8MB, and _carrier_bank keeps two.  Anything longer carries on from
+# where this stops.
+CARRIER_CACHE_VALUES = 2_000_000
+
+
+@functools.lru_cache(maxsize=32)
+def filter_bank(sample_rate, bands, min_freq, max_freq, bandwidth, order):
+    """
+    SOS for each band we can have at this sample rate.  Bands too close to
+    (or above) nyquist are left out, voicebox drops those too.
+    """
+    sos_bank = []
+    alpha = np.log2(max_freq / min_freq)
+    for band in range(bands):
+        f = min_freq * 2 ** (alpha * band / bands)
+        f_next = min_freq * 2 ** (alpha * (band + 1) / bands)
+        width = bandwidth * (f_next - f)
+
+        try:
+            sos = iirfilter(
+                order,
+                (f - width / 2, f + width / 2),
+                btype="bandpass",
+                ftype="butter",
+                output="sos",
+                fs=sample_rate,
+            )
+        except ValueError:
+            continue
+        sos_bank.append(sos)
+
+    if len(sos_bank) < bands:
+        log.warning(
+            f'Vocoder max_freq={max_freq} is too high for '
+            f'sample_rate={sample_rate}, {bands - len(sos_bank)} of {bands} '
+            f'bands dropped.'
+        )
+    return tuple(sos_bank)
+
+
+@functools.lru_cache(maxsize=8)
+def envelope_filter(sample_rate):
+    return iirfilter(
+        ENVELOPE_ORDER,
+        ENVELOPE_FREQ,
+        btype="lowpass",
+        ftype="butter",
+        output="sos",
+        fs=sample_rate,
+    )
+
+
+def sawtooth(freq, length, sample_rate):
+    """
+    length samples of a sawtooth wave between -1 and 1
+    """
+    radians = 2 * np.pi * freq * (np.arange(length) * (1 / sample_rate))
+    return (radians % (2 * np.pi)) / (2 * np.pi) * 2 - 1
+
+
+@functools.lru_cache(maxsize=2)
+def _carrier_bank(carrier_freq, sample_rate, *bank):
+    """
+    (bands, filter states) for the start of the carrier through each band of
+    filter_bank(sample_rate, *bank), CARRIER_CACHE_VALUES between them.  The
+    filtering is float64 like everything else, only what we keep is float32;
+    that is still well under what a 16 bit wav can tell apart.
+    """
+    sos_bank = filter_bank(sample_rate, *bank)
+    carrier = sawtooth(
+        carrier_freq,
+        CARRIER_CACHE_VALUES // max(len(sos_bank), 1),
+        sample_rate
+    )
+
+    bands = np.empty((len(sos_bank), len(carrier)), dtype=np.float32)
+    states = []
+    for band, sos in enumerate(sos_bank):
+        zi = np.zeros((sos.shape[0], 2))
+        bands[band], zf = sosfilt(sos, carrier, zi=zi)
+        states.append(zf)
+
+    # everybody gets this same array
+    bands.flags.writeable = False
+    return bands, states
+
+
+def carrier_bands(carrier_freq, length, sample_rate, *bank):
+    """
+    length samples of the carrier through every band, a (bands, length) array
+    """
+    cached, states = _carrier_bank(carrier_freq, sample_rate, *bank)
+    if length <= cached.shape[1]:
+        return cached[:, :length]
+
+    # longer than we keep, carry on from where the cached part stopped
+    tail = sawtooth(carrier_freq, length, sample_rate)[cached.shape[1]:]
+    sos_bank = filter_bank(sample_rate, *bank)
+    bands = np.empty((len(sos_bank), length))
+    bands[:, :cached.shape[1]] = cached
+    for band, sos in enumerate(sos_bank):
+        bands[band, cached.shape[1]:], _ = sosfilt(sos, tail, zi=states[band])
+    return bands
+
+
+class FilterBankVocoder(EffectWithDryWet):
+    """
+    Drop-in for voicebox.effects.Vocoder.build(...) with a sawtooth carrier.
+    """
+    def __init__(
+        self,
+        carrier_freq=160,
+        min_freq=80,
+        max_freq=8000,
+        bands=40,
+        bandwidth=0.8,
+        bandpass_filter_order=3,
+        dry=0,
+        wet=1
+    ):
+        super().__init__(dry, wet)
+        self.carrier_freq = float(carrier_freq)
+        self.bank = (
+            int(bands),
+            float(min_freq),
+            float(max_freq),
+            float(bandwidth),
+            int(bandpass_filter_order)
+        )
+
+    def get_wet_signal(self, audio):
+        signal = audio.signal
+        sos_bank = filter_bank(audio.sample_rate, *self.bank)
+        if not sos_bank:
+            return np.zeros_like(signal)
+
+        voice_bands = np.empty((len(sos_bank), len(signal)))
+        for band, sos in enumerate(sos_bank):
+            voice_bands[band] = sosfilt(sos, signal)
+
+        # how loud the voice is in each band, all of them at once
+        np.abs(voice_bands, out=voice_bands)
+        levels = sosfilt(envelope_filter(audio.sample_rate), voice_bands)
+
+        carrier = carrier_bands(
+            self.carrier_freq,
+            len(signal),
+            audio.sample_rate,
+            *self.bank
+        )
+        # sum(levels[band] * carrier[band])
+        return np.einsum('ij,ij->j', levels, carrier)
+
 
 class Vocoder(EffectParameterEditor):
     label = "Vocoder"
@@ -92,7 +273,7 @@ class Vocoder(EffectParameterEditor):
         ).pack(side='top', fill='x', expand=True)
 
     def get_effect(self):
-        effect = voicebox.effects.Vocoder.build(
+        effect = FilterBankVocoder(
             carrier_freq=self.tkvars['carrier_freq'].get(),
             min_freq=self.tkvars['min_freq'].get(),
             max_freq=self.tkvars['max_freq'].get(),
@@ -1,4 +1,6 @@
 from .base import registry
+from . import manifest
+from cnv.lib import catalog
 import glob
 import os
 import logging
@@ -7,13 +9,38 @@ logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
 
+def _lazy_fetch(engine_key, catalog_key):
+    """
+    A catalog fetch() that imports the engine first.  The engine registers
+    its own fetch() for catalog_key when it loads, replacing this one.
+    """
+    def fetch():
+        registry.load(engine_key)
+        real_fetch = catalog.REFRESHERS.get(catalog_key)
+        if real_fetch is None or real_fetch is fetch:
+            raise RuntimeError(f'{engine_key} did not register {catalog_key}')
+        return real_fetch()
+    return fetch
+
+
+# The engines we ship are in the manifest; they get listed now and imported
+# the first time somebody needs one.
+for key, entry in manifest.ENGINES.items():
+    registry.add_manifest(key, entry)
+    for row in entry['config']:
+        if row[2] == "StringVar":
+            catalog_key = f"{key}_{row[1]}"
+            catalog.register(catalog_key, _lazy_fetch(key, catalog_key))
+
 # importing dynamically so we can just drop compatable engine configurations
 # into this directory and they just plug themselves in.  Each plugin registers
-# itself and provides its own configuration widgets. 
+# itself and provides its own configuration widgets.  Anything not in the
+# manifest is imported right away, same as always.
 
 engine_path = os.path.join(os.path.dirname(__file__), '*.py')
+in_manifest = [entry['module'] for entry in manifest.ENGINES.values()]
 
-log.info(f'Loading TTS Engines... [{engine_path}]')
+log.debug(f'Looking for TTS Engines... [{engine_path}]')
 tts_engines = glob.glob(
     engine_path
 )
@@ -22,11 +49,14 @@ for potential in tts_engines:
     # log.debug(f'Checking {potential} for TTS Engines...')
     if os.path.isfile(potential):
         module_name = os.path.splitext(os.path.basename(potential))[0]
-        if module_name in ['base', '__init__']:
+        if module_name in ['base', 'health', 'manifest', 'quota', 'runtime', '__init__']:
             continue
 
         full_module_name = "cnv.engines." + module_name
+        if full_module_name in in_manifest:
+            continue
+
         log.info(f'Loading {full_module_name}')
         __import__(full_module_name, locals(), globals())
 
-log.info(f'* {registry.count()} TTS Engines loaded')
+log.info(f'* {registry.count()} TTS Engines available')
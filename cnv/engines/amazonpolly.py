@@ -6,12 +6,15 @@ import webbrowser
 from tkinter import ttk
 
 import boto3
+from botocore.config import Config
 import customtkinter as ctk
 from voicebox.tts.amazonpolly import AmazonPolly as AmazonPollyTTS
 
 import cnv.database.models as models
 import cnv.lib.settings as settings
+from cnv.lib import catalog
 
+from . import manifest, runtime
 from .base import MarkdownLabel, TTSEngine, registry
 
 log = logging.getLogger(__name__)
@@ -142,6 +145,7 @@ class AmazonPollyAuthUI(ttk.Frame):
         config[cred_key] = value
         with open(self.credential_fn, 'w') as configfile:
             config.write(configfile)
+        runtime.reset('amazonpolly')
 
     def get_access_key_id(self):
         config = self._read_credentials()
@@ -169,6 +173,60 @@ class AmazonPollyAuthUI(ttk.Frame):
             cred_key="aws_secret_access_key",
         )
 
+def build_polly_client():
+    """
+    boto3 reads ~/.aws once, when the session is created.  The client keeps a
+    pool of connections to polly alive between requests.
+    """
+    session = boto3.Session()
+    return session.client(
+        'polly',
+        config=Config(
+            max_pool_connections=runtime.POOL_SIZE,
+            tcp_keepalive=True
+        )
+    )
+
+
+runtime.register('amazonpolly', build_polly_client)
+
+
+def fetch_voices():
+    client = runtime.get_client('amazonpolly')
+
+    all_voices = []
+    for voice in client.describe_voices()['Voices']:
+        log.debug(f'{voice=}')
+        voice['voice_name'] = voice["Name"]
+        voice['language_code'] = voice["LanguageCode"]
+        voice['gender'] = voice["Gender"]
+        all_voices.append(voice)
+    return all_voices
+
+
+catalog.register('amazonpolly_voice_name', fetch_voices)
+
+
+def fetch_engine_names():
+    """
+    Every engine any voice supports; AmazonPolly.get_engine_names() narrows
+    it down by language and gender when it has an instance to ask.
+    """
+    out = set()
+    for voice in catalog.values('amazonpolly_voice_name') or []:
+        out.update(voice.get('SupportedEngines', []))
+    return [{'engine': engine_name} for engine_name in sorted(out)]
+
+
+catalog.register('amazonpolly_engine', fetch_engine_names)
+
+# see get_sample_rates()
+catalog.register('amazonpolly_sample_rate', lambda: [
+    {"sample_rate": "8000"},
+    {"sample_rate": "16000"}
+])
+
+
 class AmazonPolly(TTSEngine):
     """
     Pricing:
@@ -182,22 +240,13 @@ class AmazonPolly(TTSEngine):
     """
     cosmetic = "Amazon Polly"
     key = "amazonpolly"
+    chunked = True
     auth_ui_class = AmazonPollyAuthUI
 
-    config = (
-        ('Engine', 'engine', "StringVar", 'standard', {}, "get_engine_names"),
-        ('Voice Name', 'voice_name', "StringVar", "<unconfigured>", {}, "get_voice_names"),
-        ('Sample Rate', 'sample_rate', "StringVar", '16000', {}, "get_sample_rates")
-    )
-    client = None
+    config = manifest.ENGINES['amazonpolly']['config']
 
     def get_client(self):
-        if self.client:
-            return self.client
-        
-        self.session = boto3.Session()
-        self.client = self.session.client('polly')
-        return self.client       
+        return runtime.get_client('amazonpolly')       
 
     def _language_code_filter(self, voice):
         """
@@ -302,11 +351,10 @@ class AmazonPolly(TTSEngine):
             return []
 
     def voice_name_to_voice_id(self, voice_name):
-        voice_name = voice_name.strip()
-        all_voices = self.get_voices()
-        for voice in all_voices:
-            if voice['Name'] == voice_name:
-                return voice['Id']
+        voices = catalog.get(f'{self.key}_voice_name')
+        voice = voices.by_name.get(voice_name.strip()) if voices else None
+        if voice:
+            return voice['Id']
 
         log.error(f'Could not convert {voice_name=} to a voice_id')
         return None
@@ -321,15 +369,7 @@ class AmazonPolly(TTSEngine):
 
         # why is this being cached?  stupid?  ridiculous?
         # this lets us treat all stringvar fields the same way, so yes, but no.
-        all_sample_rates = models.diskcache(f'{self.key}_sample_rate')
-
-        if all_sample_rates is None:
-            all_sample_rates = [
-                {"sample_rate": "8000"}, 
-                {"sample_rate": "16000"}
-            ]
-            models.diskcache(f'{self.key}_sample_rate', all_sample_rates)
-        
+        all_sample_rates = catalog.values(f'{self.key}_sample_rate')
         return [ rate['sample_rate'] for rate in all_sample_rates ]
 
     def get_tts(self):
@@ -382,23 +422,7 @@ class AmazonPolly(TTSEngine):
 
         # We aren't really interested in listing _every_ language code.  We only
         # want the ones that have at least one Amazon Polly voice.
-        all_voices = models.diskcache(f'{self.key}_voice_name')
-
-        if all_voices is None:
-            session = boto3.Session()
-            client = session.client('polly')
-
-            all_voices = []
-            for voice in client.describe_voices()['Voices']:
-                log.debug(f'{voice=}')
-                voice['voice_name'] = voice["Name"]
-                voice['language_code'] = voice["LanguageCode"]
-                voice['gender'] = voice["Gender"]
-                all_voices.append(voice)
-            
-            models.diskcache(f'{self.key}_voice_name', all_voices)
-
-        return all_voices
+        return catalog.values(f'{self.key}_voice_name') or []
 
 # add this class to the the registry of engines
 registry.add_engine(AmazonPolly)
\ No newline at end of file
@@ -8,18 +8,24 @@ import customtkinter as ctk
 from typing import Union
 
 import azure.cognitiveservices.speech as speechsdk
-import cnv.database.models as models
-from cnv.lib import settings
+from cnv.lib import audio, catalog, settings
 import numpy as np
 import voicebox
 from voicebox.audio import Audio
 from voicebox.types import StrOrSSML
 
+from . import manifest, runtime
 from .base import MarkdownLabel, TTSEngine, registry
 
 log = logging.getLogger(__name__)
 
 AZURE_AUTH_FILE = "azure.json"
+# bytes per read when streaming, ~40ms of 24khz 16 bit audio
+STREAM_CHUNK_BYTES = 2048
+# bytes per read when we want all of it, ~0.7s
+READ_CHUNK_BYTES = 32768
+# Riff24Khz16BitMonoPcm puts a wav header in front of the samples
+RIFF_HEADER_BYTES = 44
 
 class AzureAuthUI(ctk.CTkFrame):
     label = "Azure"
@@ -80,6 +86,7 @@ class AzureAuthUI(ctk.CTkFrame):
                     'service_region': self.region.get()
                 })
             )
+        runtime.reset('azure')
 
     def get_azure_authentication(self, key):
         if os.path.exists(AZURE_AUTH_FILE):
@@ -97,33 +104,107 @@ class AzureAuthUI(ctk.CTkFrame):
         return self.get_azure_authentication('service_region')
 
 
-def get_azure_config():
+def load_azure_auth():
     if os.path.exists(AZURE_AUTH_FILE):
         with open(AZURE_AUTH_FILE) as h:
-            config = json.loads(h.read())
+            return json.loads(h.read())
 
-        speech_key = config['subscription_key']
-        service_region = config['service_region']
 
+def get_azure_config():
+    config = runtime.get_credentials('azure')
+    if config:
         client = speechsdk.SpeechConfig(
-            subscription=speech_key,
-            region=service_region
+            subscription=config['subscription_key'],
+            region=config['service_region']
         )
         return client
     else:
         log.warning(f"Azure Requires valid {AZURE_AUTH_FILE} file")
 
 
+def read_audio_data(stream):
+    """
+    Everything in an AudioDataStream, as one bytearray.
+
+    read_data() insists on a bytes (it writes into it, bytes or not), so we
+    keep re-using one small one and append what each read gave us.  The
+    bytearray grows as needed and np.frombuffer can use it as-is.
+    """
+    chunk = bytes(READ_CHUNK_BYTES)
+    view = memoryview(chunk)
+    data = bytearray()
+
+    size = stream.read_data(chunk)
+    while size > 0:
+        data += view[:size]
+        size = stream.read_data(chunk)
+
+    return data
+
+
+def build_azure_synthesizer(voice):
+    """
+    A synthesizer for voice.  It holds its connection to the speech service
+    open between utterances, building a new one every time meant a new
+    websocket every time.  It only does one utterance at a time though, so
+    chunks rendering in parallel each check out their own (runtime.checkout).
+    """
+    speech_config = get_azure_config()
+    if speech_config is None:
+        return None
+
+    speech_config.speech_synthesis_voice_name = voice
+    speech_config.set_speech_synthesis_output_format(
+        speechsdk.SpeechSynthesisOutputFormat['Riff24Khz16BitMonoPcm']
+    )
+
+    speech_synthesizer = speechsdk.SpeechSynthesizer(
+        speech_config=speech_config,
+        audio_config=None
+    )
+    # open the connection now instead of on the first utterance
+    speechsdk.Connection.from_speech_synthesizer(speech_synthesizer).open(True)
+    return speech_synthesizer
+
+
+runtime.register('azure', build_azure_synthesizer, credentials=load_azure_auth)
+
+
+def fetch_voices():
+    speech_config = get_azure_config()
+
+    speech_synthesizer = speechsdk.SpeechSynthesizer(
+        speech_config=speech_config,
+        audio_config=None
+    )
+    
+    # Request the list of available voices
+    result = speech_synthesizer.get_voices_async().get()
+
+    all_voices = []
+    for entry in result.voices:
+        # log.info(f"{entry.gender.name=} {dir(entry.gender)}")
+
+        all_voices.append({
+            'voice': entry.short_name,
+            'gender': entry.gender.name,
+            'locale': entry.locale
+        })
+    return all_voices
+
+
+catalog.register('azure_voice', fetch_voices)
+
+
 class Azure(TTSEngine):
     """
     """
     cosmetic = "Azure"
     key = "azure"
+    chunked = True
     auth_ui_class = AzureAuthUI
 
-    config = (
-        ('Voice Name', 'voice', "StringVar", "<unconfigured>", {}, "get_voice_names"),
-    )
+    config = manifest.ENGINES['azure']['config']
 
     def get_models(self):
         return [
@@ -156,32 +237,7 @@ class Azure(TTSEngine):
             return [v['voice'] for v in language_filtered]
 
     def get_voices(self):
-        all_voices = models.diskcache(f'{self.key}_voice')
-
-        if all_voices is None:
-            speech_config = get_azure_config()
-
-            speech_synthesizer = speechsdk.SpeechSynthesizer(
-                speech_config=speech_config,
-                audio_config=None
-            )
-            
-            # Request the list of available voices
-            result = speech_synthesizer.get_voices_async().get()
-
-            all_voices = []
-            for entry in result.voices:
-                # log.info(f"{entry.gender.name=} {dir(entry.gender)}")
-
-                all_voices.append({
-                    'voice': entry.short_name,
-                    'gender': entry.gender.name,
-                    'locale': entry.locale
-                })
-
-            models.diskcache(f'{self.key}_voice', all_voices)
-
-        return all_voices
+        return catalog.values(f'{self.key}_voice') or []
    
     def get_tts(self):
         voice = self.override.get('voice', self.config_vars["voice"].get())
@@ -198,32 +254,22 @@ class ttsOpenAI(voicebox.tts.TTS):
     voice: Union[str] = "en-US-AvaMultilingualNeural"
 
     def get_speech(self, text: StrOrSSML) -> Audio:
-        speech_config = get_azure_config()
-
         log.debug(f"self.voice: {self.voice}")
-
-        speech_config.speech_synthesis_voice_name = self.voice
-        speech_config.set_speech_synthesis_output_format(
-            speechsdk.SpeechSynthesisOutputFormat['Riff24Khz16BitMonoPcm']
-        )
-
-        speech_synthesizer = speechsdk.SpeechSynthesizer(
-            speech_config=speech_config,
-            audio_config=None
-        )
-
-        result = speech_synthesizer.speak_text(text)
+        with runtime.checkout('azure', self.voice) as speech_synthesizer:
+            result = speech_synthesizer.speak_text(text)
 
         if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:   
             stream = speechsdk.AudioDataStream(result)
-            
-            audio_buffer = bytes(10000000)
-            size = stream.read_data(audio_buffer)
+            data = read_audio_data(stream)
+
+            # skip the wav header, it isn't audio
+            offset = RIFF_HEADER_BYTES if data[:4] == b"RIFF" else 0
 
             log.debug('Creating numpy buffer')
             samples = np.frombuffer(
-                audio_buffer[:size],
-                dtype=np.int16
+                data,
+                dtype=np.int16,
+                offset=offset
             )
 
             return voicebox.tts.utils.get_audio_from_samples(
@@ -231,5 +277,30 @@ class ttsOpenAI(voicebox.tts.TTS):
                 24000
             )
 
+    def stream_speech(self, text: StrOrSSML):
+        """
+        Yields the audio while azure is still synthesizing the rest of it.
+        """
+        log.debug(f"self.voice: {self.voice}")
+
+        def read_chunks(stream):
+            audio_buffer = bytes(STREAM_CHUNK_BYTES)
+            first = True
+            size = stream.read_data(audio_buffer)
+            while size > 0:
+                chunk = audio_buffer[:size]
+                if first and chunk[:4] == b"RIFF":
+                    chunk = chunk[RIFF_HEADER_BYTES:]
+                first = False
+                yield chunk
+                size = stream.read_data(audio_buffer)
+
+        # ours until the last of the audio is read, it is still synthesizing
+        with runtime.checkout('azure', self.voice) as speech_synthesizer:
+            # returns as soon as synthesis has started, not when it is done
+            result = speech_synthesizer.start_speaking_text(text)
+            stream = speechsdk.AudioDataStream(result)
+            yield from audio.pcm_chunks(read_chunks(stream), 24000)
+
 # add this class to the the registry of engines
 registry.add_engine(Azure)
\ No newline at end of file
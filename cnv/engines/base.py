@@ -1,3 +1,4 @@
+import importlib
 import logging
 import random
 import tkinter as tk
@@ -11,6 +12,9 @@ from tkinterweb import HtmlLabel
 
 import cnv.database.models as models
 import cnv.lib.settings as settings
+from cnv.voices import chunker, prerender, streaming
+
+from . import quota
 
 log = logging.getLogger(__name__)
 
@@ -45,6 +49,9 @@ class TTSEngine(ctk.CTkFrame):
     cosmetic="TTSEngine Base Class (You screwed up buddy)"
     key = "base"
     loading = False
+    # cloud engines get faster with shorter requests, long messages are
+    # rendered a sentence at a time in parallel.  see cnv.voices.chunker
+    chunked = False
 
     category = 3  # default to system
     rank = "primary"
@@ -107,8 +114,12 @@ class TTSEngine(ctk.CTkFrame):
                     session.add(field)
                 session.commit()
 
-    def say(self, message, effects, sink=None, *args, **kwargs):
-        tts = self.get_tts()
+    def say(self, message, effects, sink=None, *args, tts=None, **kwargs):
+        """
+        tts is get_chunked_tts(), for anybody who already has it.
+        """
+        if tts is None:
+            tts = self.get_chunked_tts()
         # log.info(f'{self}.say({message=}, {effects=}, {sink=}, {args=}, {kwargs=}')
         log.debug(f'Invoking voicebox.SimpleVoicebox({tts=}, {effects=}, {sink=})')
         vb = voicebox.SimpleVoicebox(
@@ -140,13 +151,50 @@ class TTSEngine(ctk.CTkFrame):
                     log.error(err.body)
                     if err.body.get('detail', {}).get('status') == "quota_exceeded":
                         log.error('ElevelLabs quota exceeded.  Switching to secondary.')
+                        quota.exhausted(self.cosmetic)
                         raise USE_SECONDARY
 
                 raise USE_SECONDARY
 
+    def say_streaming(self, message, effects, sink, play, tts=None):
+        """
+        say(), but play() gets the audio as it arrives instead of after all of
+        it is rendered.  sink still gets the complete clip.
+
+        Returns False, having done nothing, when this engine or one of these
+        effects can't stream.  Use say() instead.
+        """
+        if tts is None:
+            tts = self.get_chunked_tts()
+        if not message or not chunker.can_stream(tts, message):
+            return False
+
+        chain = streaming.StreamingEffects.build(effects)
+        if chain is None:
+            return False
+
+        try:
+            streaming.speak(tts, message, chain, sink, play)
+        except USE_SECONDARY:
+            raise
+        except Exception as err:
+            log.error("Error in TTSEngine.say_streaming(): %s", err)
+            raise USE_SECONDARY
+
+        return True
+
     def get_tts(self):
         return voicebox.tts.tts.TTS()
 
+    def get_chunked_tts(self):
+        """
+        get_tts(), wrapped to split long messages if this engine wants that.
+        """
+        tts = self.get_tts()
+        if self.chunked:
+            return chunker.ChunkedTTS(tts, self.key)
+        return tts
+
     def load_character(self, category, name):
         # Retrieve configuration settings from the DB
         # and use them to set values on widgets
@@ -382,7 +430,8 @@ class TTSEngine(ctk.CTkFrame):
         
         log.debug(f'GUI config values are: {config}')
         
-        models.set_engine_config(character.id, self.rank, config)
+        if models.set_engine_config(character.id, self.rank, config):
+            prerender.request(character.id)
         self.repopulate_options()
 
     def repopulate_options(self):
@@ -440,32 +489,94 @@ class UnknownEngine(Exception):
 class EngineRegistry:
     """
     engines in this registry are expected to be subclasses of TTSEngine.
+
+    Engines in the manifest are listed without being imported; the first
+    get_engine() for one imports its module, which calls add_engine().
     """
     def __init__(self):
         self.engines = {}
         self.engines_by_cosmetic = {}
+        # key -> manifest entry, see cnv.engines.manifest
+        self.manifest = {}
+
+    def add_manifest(self, key, entry):
+        self.manifest[key] = entry
 
     def add_engine(self, cls):
         key = cls.key
         self.engines[key] = cls
         self.engines_by_cosmetic[cls.cosmetic] = cls
-    
+
+    def load(self, key):
+        """
+        Import the module for key (or cosmetic) if we know of one.  Returns
+        False if we don't, or it wouldn't import.
+        """
+        for engine_key, entry in self.manifest.items():
+            if key in (engine_key, entry['cosmetic']):
+                break
+        else:
+            return False
+
+        log.info(f"Loading {entry['module']}")
+        try:
+            importlib.import_module(entry['module'])
+        except Exception as err:
+            log.error(f"Could not load the {entry['cosmetic']} engine: {err}")
+            return False
+        return True
+
     def get_engine(self, key) -> Type[TTSEngine]:
-        if key in self.engines:
-            return self.engines[key]
-        
-        if key in self.engines_by_cosmetic:
-            return self.engines_by_cosmetic[key]
-        
+        for attempt in range(2):
+            if key in self.engines:
+                return self.engines[key]
+
+            if key in self.engines_by_cosmetic:
+                return self.engines_by_cosmetic[key]
+
+            if attempt == 0 and not self.load(key):
+                break
+
         raise UnknownEngine(key)
     
     def engine_list(self) -> list:
+        """
+        [(key, engine class)] for every engine.  Imports all of them, use
+        cosmetic_list() if names are all you need.
+        """
+        for key in self.manifest:
+            if key not in self.engines:
+                self.load(key)
+
         out = []
         for engine in self.engines:
             out.append((engine, self.engines[engine]))
         return out
-    
+
+    def cosmetic_list(self) -> list:
+        """
+        The name of every engine, without importing any of them.
+        """
+        out = [entry['cosmetic'] for entry in self.manifest.values()]
+        for cosmetic in self.engines_by_cosmetic:
+            if cosmetic not in out:
+                out.append(cosmetic)
+        return out
+
+    def auth_list(self) -> list:
+        """
+        [(tab label, key)] for the engines that need credentials.
+        """
+        out = []
+        for key, entry in self.manifest.items():
+            if entry.get('auth'):
+                out.append((entry['auth'], key))
+        for key, cls in self.engines.items():
+            if key not in self.manifest and cls.auth_ui_class:
+                out.append((cls.auth_ui_class.label, key))
+        return out
+
     def count(self):
-        return len(self.engines)
+        return len(set(self.manifest) | set(self.engines))
     
 registry = EngineRegistry()
\ No newline at end of file
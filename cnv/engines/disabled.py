@@ -1,4 +1,5 @@
 import logging
+from . import manifest
 from .base import TTSEngine, registry
 
 log = logging.getLogger(__name__)
@@ -12,7 +13,7 @@ class Disabled(TTSEngine):
     key = "disabled"
     api_key = None
     auth_ui_class = None
-    config = []
+    config = manifest.ENGINES['disabled']['config']
 
     def say(self, message, effects, sink, *args, **kwargs):
         return
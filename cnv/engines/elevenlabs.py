@@ -1,7 +1,6 @@
 import logging
 import os
 import random
-import tempfile
 import tkinter as tk
 from dataclasses import dataclass, field
 from tkinter import ttk
@@ -9,18 +8,25 @@ from typing import Union
 
 import customtkinter as ctk
 import elevenlabs
+import numpy as np
 import voicebox
 from elevenlabs.client import ElevenLabs as ELABS
 from voicebox.audio import Audio
 from voicebox.types import StrOrSSML
 
-import cnv.database.models as models
 import cnv.lib.audio as audio
+from cnv.lib import catalog
 
+from . import manifest, quota, runtime
 from .base import MarkdownLabel, TTSEngine, registry
 
 log = logging.getLogger(__name__)
 
+# raw 16 bit signed little-endian samples, no container.  pcm_44100 needs a
+# pro subscription, 24khz is what everyone gets.
+PCM_FORMAT = "pcm_24000"
+PCM_SAMPLE_RATE = 24000
+
 class ElevenLabsAuthUI(ctk.CTkFrame):
     label = "ElevenLabs"
     def __init__(self, *args, **kwargs):
@@ -66,6 +72,7 @@ class ElevenLabsAuthUI(ctk.CTkFrame):
     def change_elevenlabs_key(self, a, b, c):
         with open("eleven_labs.key", 'w') as h:
             h.write(self.elevenlabs_key.get())
+        runtime.reset('elevenlabs')
 
     def get_elevenlabs_key(self):
         keyfile = 'eleven_labs.key'
@@ -77,17 +84,66 @@ class ElevenLabsAuthUI(ctk.CTkFrame):
         return value
 
 
-def get_elevenlabs_client():
+def load_elevenlabs_key():
     if os.path.exists("./eleven_labs.key"):
         with open("./eleven_labs.key") as h:
             # umm, I can't do that, can I?
-            elvenlabs_api_key = h.read().strip()
+            return h.read().strip()
+
 
-        # https://github.com/elevenlabs/elevenlabs-python/blob/main/src/elevenlabs/client.py#L42
-        client = ELABS(api_key=elvenlabs_api_key)
-        return client
-    else:
+def build_elevenlabs_client():
+    elvenlabs_api_key = runtime.get_credentials('elevenlabs')
+    if not elvenlabs_api_key:
         log.warning("Elevenlabs Requires valid eleven_labs.key file")
+        return None
+
+    # https://github.com/elevenlabs/elevenlabs-python/blob/main/src/elevenlabs/client.py#L42
+    # it keeps an httpx client (and its connection pool) for as long as we
+    # keep it.
+    return ELABS(api_key=elvenlabs_api_key)
+
+
+runtime.register(
+    'elevenlabs', build_elevenlabs_client, credentials=load_elevenlabs_key
+)
+
+
+def get_elevenlabs_client():
+    return runtime.get_client('elevenlabs')
+
+
+def elevenlabs_quota():
+    """
+    (characters used, character limit, when it resets) according to Eleven
+    Labs.
+    """
+    subscription = get_elevenlabs_client().user.get_subscription()
+    return (
+        subscription.character_count,
+        subscription.character_limit,
+        subscription.next_character_count_reset_unix
+    )
+
+
+quota.register_source("Eleven Labs", elevenlabs_quota)
+
+
+def fetch_voices():
+    client = get_elevenlabs_client()
+    all_raw_voices = client.voices.get_all()
+
+    all_voices = []
+    for voice in all_raw_voices.voices:
+        # log.info(f"{voice=}")
+        all_voices.append({
+            'id': voice.voice_id,
+            'voice_name': voice.name,
+            'gender': voice.labels['gender'].title()
+        })
+    return all_voices
+
+
+catalog.register('elevenlabs_voice_name', fetch_voices)
 
 
 class InvalidVoiceException(Exception):
@@ -105,17 +161,12 @@ class ElevenLabs(TTSEngine):
     """
     cosmetic = "Eleven Labs"
     key = "elevenlabs"
+    chunked = True
     api_key = None
     auth_ui_class = ElevenLabsAuthUI
 
     # we describe the data, how that translated into widgets is in TTSEngine
-    config = (
-        ('Voice Name', 'voice_name', "StringVar", "<unconfigured>", {}, "get_voice_names"),
-        ('Stability', 'stability', "DoubleVar", 0.5, {'min': 0, 'max': 1, 'resolution': 0.025}, None),
-        ('Similarity Boost', 'similarity_boost', "DoubleVar", 0, {'min': 0, 'max': 1, 'resolution': 0.025}, None),
-        ('Style', 'style', "DoubleVar", 0.0, {'min': 0, 'max': 1, 'resolution': 0.025}, None),
-        ('Speaker Boost', 'use_speaker_boost', "BooleanVar", True, {}, None)
-    )
+    config = manifest.ENGINES['elevenlabs']['config']
 
     def get_voice_names(self, gender=None):
         """
@@ -169,25 +220,7 @@ class ElevenLabs(TTSEngine):
             return []
 
     def get_voices(self):
-        all_voices = models.diskcache(f'{self.key}_voice_name')
-
-        if all_voices is None:
-            client = get_elevenlabs_client()
-            all_raw_voices = client.voices.get_all()
-
-            all_voices = []
-            for voice in all_raw_voices.voices:
-                # log.info(f"{voice=}")
-                all_voices.append({
-                    'id': voice.voice_id,
-                    'voice_name': voice.name,
-                    'gender': voice.labels['gender'].title()
-                })
-       
-            # log.info(all_voices)
-            models.diskcache(f'{self.key}_voice_name', all_voices)
-        
-        return all_voices
+        return catalog.values(f'{self.key}_voice_name') or []
 
     def get_tts(self):
         # voice is an elevenlabs.Voice instance,  We need input from the user
@@ -255,21 +288,42 @@ class ttsElevenLabs(voicebox.tts.TTS):
     use_speaker_boost : bool = True
 
     def voice_name_to_id(self, voice_name):
-        voice_name = voice_name.strip()
-        for voice in models.diskcache('elevenlabs_voice_name'):
-            if voice['voice_name'] == voice_name:
-                return voice['id']
+        voices = catalog.get('elevenlabs_voice_name')
+        voice = voices.by_name.get(voice_name.strip()) if voices else None
+        if voice:
+            return voice['id']
 
         log.error('Unknown voice:  %s', voice_name)
 
     def get_speech(self, text: StrOrSSML) -> Audio:
+        # generate() streams the response back in chunks
+        samples = np.frombuffer(
+            b"".join(self.generate(text)),
+            dtype=np.int16
+        )
+
+        return voicebox.tts.utils.get_audio_from_samples(
+            samples,
+            PCM_SAMPLE_RATE
+        )
+
+    def stream_speech(self, text: StrOrSSML):
+        """
+        Same as get_speech(), without waiting for the last chunk.
+        """
+        yield from audio.pcm_chunks(self.generate(text), PCM_SAMPLE_RATE)
+
+    def generate(self, text: StrOrSSML):
+        """
+        An iterator of raw PCM bytes, as they arrive.
+        """
         client = get_elevenlabs_client()
         # https://github.com/elevenlabs/elevenlabs-python/blob/main/src/elevenlabs/client.py#L118
         # default response is an iterator providing an mp3_44100_128.
         #
-        # I tried asking 11labs for a PCM response (wav),so we don't need to decompress an mp3
-        # but the PCM wav format returned by 11labs isn't direcly compatible with the 
-        # wav format that the python wave library known how to open.
+        # The PCM response isn't a wav file the python wave library can open,
+        # it has no header at all.  That is fine, we don't need a file.  It is
+        # exactly the samples, same as ttsOpenAI gets.
         log.debug(f"self.voice: {self.voice}")
         
         voice_id = self.voice_name_to_id(self.voice)
@@ -287,16 +341,11 @@ class ttsElevenLabs(voicebox.tts.TTS):
                     style=self.style,
                     use_speaker_boost=self.use_speaker_boost
                 )
-            )
+            ),
+            output_format=PCM_FORMAT,
+            stream=True
         )
-
-        with tempfile.NamedTemporaryFile() as tmp:
-            tmp.close()
-            # start with an mp3 file
-            mp3filename = tmp.name + ".mp3"
-            elevenlabs.save(audio_data, mp3filename)
-
-            return audio.mp3file_to_Audio(mp3filename)
+        return audio_data
 
 # add this class to the the registry of engines
 registry.add_engine(ElevenLabs)
\ No newline at end of file
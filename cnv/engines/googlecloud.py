@@ -14,7 +14,9 @@ from sqlalchemy import select
 
 import cnv.database.models as models
 import cnv.lib.settings as settings
+from cnv.lib import catalog
 
+from . import manifest, runtime
 from .base import MarkdownLabel, TTSEngine, registry
 
 
@@ -101,6 +103,51 @@ def get_credentials():
     return creds
 
 
+def build_google_client():
+    """
+    One grpc channel for everybody, every request is multiplexed over it.
+    The credentials refresh themselves as they expire.
+    """
+    kwargs = {}
+    credentials = runtime.get_credentials('googletts')
+    if credentials:
+        kwargs['credentials'] = credentials
+
+    return texttospeech.TextToSpeechClient(**kwargs)
+
+
+runtime.register('googletts', build_google_client, credentials=get_credentials)
+
+
+def fetch_voices():
+    log.warning('Google get_voices() Cache Miss')
+    client = runtime.get_client('googletts')
+    req = texttospeech.ListVoicesRequest()
+    resp = client.list_voices(req)
+    all_voices = []
+    for voice in resp.voices:
+        # log.info(f'{voice.language_codes=}')
+        # log.info(dir(voice.language_codes))
+        log.debug(f"{voice.ssml_gender=}")
+
+        language_codes = []
+        for code in voice.language_codes:
+            # log.info(f'{code=}')
+            language_codes.append(code)
+        row = {
+            'voice_name': voice.name,
+            'natural_sample_rate_hertz': voice.natural_sample_rate_hertz,
+            'gender': {1: 'Female', 2: 'Male'}[voice.ssml_gender.value],
+            'language_codes': language_codes
+        }
+
+        all_voices.append(row)
+    return all_voices
+
+
+catalog.register('googletts_voice_name', fetch_voices)
+
+
 class GoogleCloudAuthUI(ctk.CTkFrame):
     label = "Google Cloud"
     def __init__(self, *args, **kwargs):
@@ -183,6 +230,7 @@ class GoogleCloudAuthUI(ctk.CTkFrame):
         # Save the credentials for the next run
         with open(token_file, "w") as token:
             token.write(creds.to_json())
+        runtime.reset('googletts')
 
 
 class GoogleCloud(TTSEngine):
@@ -191,13 +239,10 @@ class GoogleCloud(TTSEngine):
     """
     cosmetic = "Google Text-to-Speech"
     key = 'googletts'
+    chunked = True
     auth_ui_class = GoogleCloudAuthUI
 
-    config = (
-        ('Voice Name', 'voice_name', "StringVar", "<unconfigured>", {}, "get_voice_names"),
-        ('Speaking Rate', 'speaking_rate', "DoubleVar", 1, {'min': 0.75, 'max': 1.25, 'digits': 3, 'resolution': 0.25}, None)
-        # ('Voice Pitch', 'voice_pitch', "DoubleVar", 1, {'min': -10, 'max': 10, 'resolution': 0.5}, None)
-    )   
+    config = manifest.ENGINES['googletts']['config']
 
     def _language_code_filter(self, voice):
         """
@@ -267,35 +312,7 @@ class GoogleCloud(TTSEngine):
             return []
 
     def get_voices(self):
-        all_voices = models.diskcache(f'{self.key}_voice_name', force=False)
-
-        if all_voices is None:
-            log.warning('Google get_voices() Cache Miss')
-            client = texttospeech.TextToSpeechClient()
-            req = texttospeech.ListVoicesRequest()
-            resp = client.list_voices(req)
-            all_voices = []
-            for voice in resp.voices:
-                # log.info(f'{voice.language_codes=}')
-                # log.info(dir(voice.language_codes))
-                log.debug(f"{voice.ssml_gender=}")
-
-                language_codes = []
-                for code in voice.language_codes:
-                    # log.info(f'{code=}')
-                    language_codes.append(code)
-                row = {
-                    'voice_name': voice.name,
-                    'natural_sample_rate_hertz': voice.natural_sample_rate_hertz,
-                    'gender': {1: 'Female', 2: 'Male'}[voice.ssml_gender.value],
-                    'language_codes': language_codes
-                }
-
-                all_voices.append(row)
-            
-            models.diskcache(f'{self.key}_voice_name', all_voices)
-
-        return all_voices
+        return catalog.values(f'{self.key}_voice_name') or []
 
     @staticmethod
     def get_voice_gender(voice_name):
@@ -329,14 +346,7 @@ class GoogleCloud(TTSEngine):
             voice_pitch = self.override.get('voice_pitch', self.config_vars["voice_pitch"].get())
         language_code = self.get_voice_language(voice_name)
 
-        kwargs = {}
-        credentials = get_credentials()
-        if credentials:
-            kwargs['credentials'] = credentials
-
-        client = texttospeech.TextToSpeechClient(
-            **kwargs
-        )
+        client = runtime.get_client('googletts')
 
         audio_config = texttospeech.AudioConfig(
             speaking_rate=float(speaking_rate), 
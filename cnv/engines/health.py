@@ -0,0 +1,355 @@
+"""
+Which engines are working right now.
+
+Every engine gets a circuit breaker.  While it is closed everything goes to
+the engine as normal.  FAILURE_THRESHOLD failures in a row and it opens; for
+the next OPEN_SECONDS nobody even tries that engine, they go straight to the
+secondary instead of sitting through another network timeout first.  After
+that one request is let through as a probe (half-open).  If the probe works
+the breaker closes and we're back to normal, if it doesn't the breaker opens
+again for twice as long, up to MAX_OPEN_SECONDS.
+
+    if health.allow("Eleven Labs"):
+        ...
+        health.success("Eleven Labs", seconds)
+
+The chatter, the editor and the re-render workers are all different
+processes, so the breaker state lives in the engine_health table where all of
+them can see it.  It is only written when the state changes, and the newest
+change wins.  Latency and error rate ride along (at most every
+PUBLISH_SECONDS) so the configuration tab can show them; those are from
+whichever process published last.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+
+import cnv.database.models as models
+
+log = logging.getLogger(__name__)
+
+# the parts of Breaker.snapshot() that are the breaker itself
+BREAKER_FIELDS = ('state', 'failures', 'opened_at', 'open_seconds', 'probe_at', 'updated')
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# failures in a row before we stop trying an engine
+FAILURE_THRESHOLD = 3
+# seconds to leave an engine alone after it opens, doubled every time a probe
+# fails
+OPEN_SECONDS = 30
+MAX_OPEN_SECONDS = 600
+# a probe that hasn't reported back after this long is presumed lost, let
+# somebody else try.
+PROBE_SECONDS = 60
+# how many recent calls the latency and error rate cover
+WINDOW = 50
+# seconds between publishing stats when the state hasn't changed
+PUBLISH_SECONDS = 10
+# latencies we want to have seen before trusting our p95 enough to hedge on it
+HEDGE_MIN_SAMPLES = 10
+# never hedge sooner than this, the secondary costs something too
+HEDGE_MIN_SECONDS = 0.5
+
+_breakers = {}
+_lock = threading.Lock()
+
+
+class Breaker:
+    def __init__(self, engine):
+        self.engine = engine
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.open_seconds = OPEN_SECONDS
+        self.probe_at = 0
+        # wall clock, so other processes can tell whose news is newer
+        self.updated = 0
+        self.published = 0
+        self.latencies = deque(maxlen=WINDOW)
+        self.outcomes = deque(maxlen=WINDOW)
+        # renders that could have been hedged, were, and the secondary won
+        self.hedge_renders = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def adopt(self, shared):
+        """
+        Another process changed this engine's state more recently than we did.
+        """
+        if not shared or shared.get('updated', 0) <= self.updated:
+            return
+        self.state = shared.get('state', CLOSED)
+        self.failures = shared.get('failures', 0)
+        self.opened_at = shared.get('opened_at', 0)
+        self.open_seconds = shared.get('open_seconds', OPEN_SECONDS)
+        self.probe_at = shared.get('probe_at', 0)
+        self.updated = shared['updated']
+
+    def ready(self, now):
+        """
+        Would a request be allowed through right now?  Doesn't claim the probe.
+        """
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return now - self.opened_at >= self.open_seconds
+        return now - self.probe_at >= PROBE_SECONDS
+
+    def allow(self, now):
+        """
+        Same as ready(), except an engine that isn't closed hands the caller
+        the probe.  Returns (allowed, changed).
+        """
+        if not self.ready(now):
+            return False, False
+        if self.state == CLOSED:
+            return True, False
+
+        log.info(f'Probing {self.engine}')
+        self.state = HALF_OPEN
+        self.probe_at = now
+        self.updated = now
+        return True, True
+
+    def success(self, seconds, now):
+        """
+        Returns True if that changed the state.
+        """
+        self.outcomes.append(True)
+        if seconds is not None:
+            self.latencies.append(seconds)
+        self.failures = 0
+
+        if self.state == CLOSED:
+            return False
+
+        log.info(f'{self.engine} is working again')
+        self.state = CLOSED
+        self.open_seconds = OPEN_SECONDS
+        self.probe_at = 0
+        self.updated = now
+        return True
+
+    def failure(self, now):
+        self.outcomes.append(False)
+        self.failures += 1
+
+        if self.state == HALF_OPEN:
+            # the probe didn't make it, leave it alone longer this time
+            self.open_seconds = min(self.open_seconds * 2, MAX_OPEN_SECONDS)
+        elif self.state == OPEN or self.failures < FAILURE_THRESHOLD:
+            return False
+
+        log.warning(
+            f'{self.engine} failed {self.failures} times in a row, using the '
+            f'secondary engine for the next {self.open_seconds} seconds'
+        )
+        self.state = OPEN
+        self.opened_at = now
+        self.updated = now
+        return True
+
+    def latency(self, percentile):
+        """
+        Seconds, or None until we have heard back at least once.
+        """
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(percentile / 100 * len(ordered)))
+        return ordered[index]
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def snapshot(self):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'opened_at': self.opened_at,
+            'open_seconds': self.open_seconds,
+            'probe_at': self.probe_at,
+            'updated': self.updated,
+            'p50': self.latency(50),
+            'p95': self.latency(95),
+            'error_rate': self.error_rate(),
+            'calls': len(self.outcomes),
+            'hedge_renders': self.hedge_renders,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+        }
+
+
+def _as_snapshot(row):
+    snapshot = dict(row.stats or {})
+    for field in BREAKER_FIELDS:
+        snapshot[field] = getattr(row, field)
+    return snapshot
+
+
+def shared_state():
+    """
+    engine -> the last snapshot anybody published.
+    """
+    try:
+        with models.db() as session:
+            rows = session.scalars(select(models.EngineHealth)).all()
+    except OperationalError as err:
+        log.warning(f'Could not read engine health: {err}')
+        return {}
+    return {row.engine: _as_snapshot(row) for row in rows}
+
+
+def _shared(engine):
+    try:
+        with models.db() as session:
+            row = session.get(models.EngineHealth, engine)
+            return None if row is None else _as_snapshot(row)
+    except OperationalError as err:
+        log.warning(f'Could not read engine health: {err}')
+        return None
+
+
+def _get(engine):
+    # _lock is held
+    if engine not in _breakers:
+        _breakers[engine] = Breaker(engine)
+    breaker = _breakers[engine]
+    breaker.adopt(_shared(engine))
+    return breaker
+
+
+def _publish(breaker, now, changed):
+    """
+    A state change is written right away, unless somebody else has written
+    a newer one.  Otherwise only the stats, every PUBLISH_SECONDS.  Either way
+    it is one statement, nobody can see half of it.
+    """
+    # _lock is held
+    if not changed and now - breaker.published < PUBLISH_SECONDS:
+        return
+    breaker.published = now
+
+    snapshot = breaker.snapshot()
+    row = {field: snapshot.pop(field) for field in BREAKER_FIELDS}
+    statement = sqlite_insert(models.EngineHealth).values(
+        engine=breaker.engine,
+        stats=snapshot,
+        **row
+    )
+
+    if changed:
+        statement = statement.on_conflict_do_update(
+            index_elements=['engine'],
+            set_=dict(
+                stats=statement.excluded.stats,
+                **{field: getattr(statement.excluded, field) for field in BREAKER_FIELDS}
+            ),
+            where=models.EngineHealth.updated < statement.excluded.updated
+        )
+    else:
+        statement = statement.on_conflict_do_update(
+            index_elements=['engine'],
+            set_={'stats': statement.excluded.stats}
+        )
+
+    try:
+        with models.db() as session:
+            session.execute(statement)
+    except OperationalError as err:
+        log.warning(f'Could not publish {breaker.engine} health: {err}')
+
+
+def available(engine):
+    """
+    Is engine worth trying?  For planning (the pre-renderer), it never
+    hands out the probe.
+    """
+    with _lock:
+        return _get(engine).ready(time.time())
+
+
+def allow(engine):
+    """
+    Should this request go to engine?  False means use the secondary.  If it
+    says True you owe it a success() or failure().
+    """
+    now = time.time()
+    with _lock:
+        breaker = _get(engine)
+        allowed, changed = breaker.allow(now)
+        if changed:
+            _publish(breaker, now, changed)
+        return allowed
+
+
+def success(engine, seconds=None):
+    """
+    engine did what we asked in seconds.  None when the time doesn't mean
+    much (it was streamed, so it includes the playback).
+    """
+    now = time.time()
+    with _lock:
+        breaker = _get(engine)
+        _publish(breaker, now, breaker.success(seconds, now))
+
+
+def failure(engine):
+    now = time.time()
+    with _lock:
+        breaker = _get(engine)
+        _publish(breaker, now, breaker.failure(now))
+
+
+def hedge_budget(engine):
+    """
+    Seconds to give engine before racing the secondary against it, our p95
+    for it.  None if we haven't heard from it enough to know what slow is.
+    """
+    with _lock:
+        breaker = _get(engine)
+        if len(breaker.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_SECONDS, breaker.latency(95))
+
+
+def hedge_result(engine, hedged, won=False):
+    """
+    A render of engine was hedgeable; did we hedge, and did the secondary
+    win the race?
+    """
+    now = time.time()
+    with _lock:
+        breaker = _get(engine)
+        breaker.hedge_renders += 1
+        if hedged:
+            breaker.hedges += 1
+            if won:
+                breaker.hedge_wins += 1
+            log.info(
+                f'{engine} hedged {breaker.hedges} of {breaker.hedge_renders} '
+                f'renders, the secondary won {breaker.hedge_wins}'
+            )
+        _publish(breaker, now, False)
+
+
+def reset(engine):
+    """
+    Forget everything we know about engine, it gets a clean slate.
+    """
+    now = time.time()
+    with _lock:
+        breaker = Breaker(engine)
+        breaker.updated = now
+        _breakers[engine] = breaker
+        _publish(breaker, now, True)
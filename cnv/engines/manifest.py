@@ -0,0 +1,86 @@
+"""
+Everything we need to know about the engines without importing them.
+
+Importing an engine imports its SDK (boto3, google cloud, the azure speech
+sdk, elevenlabs, openai), and that is most of our startup time.  The registry
+lists engines from here and only imports one the first time somebody asks it
+for the engine class.
+
+    key: {
+        'module': where the TTSEngine subclass lives,
+        'cosmetic': what we call it on screen (and in character.engine),
+        'auth': label of its tab under configuration, None if it needs none,
+        'config': (cosmetic, key, varfunc, default, cfg, gatherfunc), ...
+    }
+
+The engine class uses 'config' from here, so there is only one copy of it.
+Every StringVar in 'config' has a voice catalog named <key>_<config key>.
+"""
+
+ENGINES = {
+    'amazonpolly': {
+        'module': 'cnv.engines.amazonpolly',
+        'cosmetic': 'Amazon Polly',
+        'auth': 'Amazon Polly',
+        'config': (
+            ('Engine', 'engine', "StringVar", 'standard', {}, "get_engine_names"),
+            ('Voice Name', 'voice_name', "StringVar", "<unconfigured>", {}, "get_voice_names"),
+            ('Sample Rate', 'sample_rate', "StringVar", '16000', {}, "get_sample_rates")
+        ),
+    },
+    'azure': {
+        'module': 'cnv.engines.azure',
+        'cosmetic': 'Azure',
+        'auth': 'Azure',
+        'config': (
+            ('Voice Name', 'voice', "StringVar", "<unconfigured>", {}, "get_voice_names"),
+        ),
+    },
+    'disabled': {
+        'module': 'cnv.engines.disabled',
+        'cosmetic': 'Disabled',
+        'auth': None,
+        'config': [],
+    },
+    'elevenlabs': {
+        'module': 'cnv.engines.elevenlabs',
+        'cosmetic': 'Eleven Labs',
+        'auth': 'ElevenLabs',
+        'config': (
+            ('Voice Name', 'voice_name', "StringVar", "<unconfigured>", {}, "get_voice_names"),
+            ('Stability', 'stability', "DoubleVar", 0.5, {'min': 0, 'max': 1, 'resolution': 0.025}, None),
+            ('Similarity Boost', 'similarity_boost', "DoubleVar", 0, {'min': 0, 'max': 1, 'resolution': 0.025}, None),
+            ('Style', 'style', "DoubleVar", 0.0, {'min': 0, 'max': 1, 'resolution': 0.025}, None),
+            ('Speaker Boost', 'use_speaker_boost', "BooleanVar", True, {}, None)
+        ),
+    },
+    'googletts': {
+        'module': 'cnv.engines.googlecloud',
+        'cosmetic': 'Google Text-to-Speech',
+        'auth': 'Google Cloud',
+        'config': (
+            ('Voice Name', 'voice_name', "StringVar", "<unconfigured>", {}, "get_voice_names"),
+            ('Speaking Rate', 'speaking_rate', "DoubleVar", 1, {'min': 0.75, 'max': 1.25, 'digits': 3, 'resolution': 0.25}, None)
+            # ('Voice Pitch', 'voice_pitch', "DoubleVar", 1, {'min': -10, 'max': 10, 'resolution': 0.5}, None)
+        ),
+    },
+    'openai': {
+        'module': 'cnv.engines.openai',
+        'cosmetic': 'OpenAI',
+        'auth': 'OpenAI',
+        'config': (
+            ('Voice Name', 'voice_name', "StringVar", "<unconfigured>", {}, "get_voice_names"),
+            ('Voice Model', 'model', "StringVar", "<unconfigured>", {}, "get_models"),
+            ('Speed', 'speed', "DoubleVar", 1.0, {'min': 0.25, 'max': 4.0, 'resolution': 0.25}, None),
+        ),
+    },
+    'windowstts': {
+        'module': 'cnv.engines.windowstts',
+        'cosmetic': 'Windows TTS',
+        'auth': None,
+        'config': (
+            ('Voice Name', 'voice_name', "StringVar", "<unconfigured>", {}, "get_voice_names"),
+            ('Speaking Rate', 'rate', "DoubleVar", 1, {'min': -2.0, 'max': 2.0, 'digits': 2, 'resolution': 0.5}, None)
+        ),
+    },
+}
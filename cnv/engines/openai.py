@@ -12,13 +12,17 @@ from openai import OpenAI, RateLimitError
 from voicebox.audio import Audio
 from voicebox.types import StrOrSSML
 
-from cnv.lib.settings import diskcache
+import cnv.lib.audio as audio
+from cnv.lib import catalog
 
+from . import manifest, quota, runtime
 from .base import MarkdownLabel, TTSEngine, registry, USE_SECONDARY
 
 log = logging.getLogger(__name__)
 
 OPENAI_KEY_FILE = "openai.key"
+# bytes per read when streaming, ~40ms of 24khz 16 bit audio
+STREAM_CHUNK_BYTES = 2048
 
 class OpenAIAuthUI(ctk.CTkFrame):
     label = "OpenAI"
@@ -62,6 +66,7 @@ class OpenAIAuthUI(ctk.CTkFrame):
     def change_openai_key(self, a, b, c):
         with open(OPENAI_KEY_FILE, 'w') as h:
             h.write(self.openai_key.get())
+        runtime.reset('openai')
 
     def get_openai_key(self):
         value = None
@@ -72,22 +77,62 @@ class OpenAIAuthUI(ctk.CTkFrame):
         return value
 
 
+def load_openai_key():
+    if os.path.exists(OPENAI_KEY_FILE):
+        with open(OPENAI_KEY_FILE) as h:
+            return h.read().strip()
+
+
+def build_openai_client():
+    openai_api_key = runtime.get_credentials('openai')
+    if not openai_api_key:
+        log.warning(f"OpenAI Requires valid {OPENAI_KEY_FILE} file")
+        return None
+    # the client holds an httpx connection pool, keep-alive included
+    return OpenAI(api_key=openai_api_key)
+
+
+runtime.register('openai', build_openai_client, credentials=load_openai_key)
+
+
 # female = ['alloy, 'nova', 'shimmer']
 # male = ['echo', 'onyx']
 # neutral = ['fable']
+OPENAI_VOICES = [
+    {'voice_name': 'alloy', 'gender': 'Female'}, 
+    {'voice_name': 'ash', 'gender': 'Male'},  
+    # {'voice_name': 'ballad', 'gender': 'Male'}, 
+    {'voice_name': 'coral', 'gender': 'Male'}, 
+    {'voice_name': 'echo', 'gender': 'Male'},
+    {'voice_name': 'fable', 'gender': 'Female'}, 
+    {'voice_name': 'fable', 'gender': 'Male'},
+    {'voice_name': 'nova', 'gender': 'Female'}, 
+    {'voice_name': 'onyx', 'gender': 'Male'},
+    {'voice_name': 'sage', 'gender': 'Female'}, 
+    {'voice_name': 'shimmer', 'gender': 'Female'}, 
+    # {'voice_name': 'verse', 'gender': 'Female'}, 
+]
+
+OPENAI_MODELS = [
+    {'model': 'tts-1'},
+    {'model': 'tts-1-hd'}
+]
+
+# nothing to ask anybody, these lists are all there is
+catalog.register('openai_model', lambda: OPENAI_MODELS)
+catalog.register('openai_voice_name', lambda: OPENAI_VOICES)
+
+
 class MyOpenAI(TTSEngine):
     """
     OpenAI detects the incoming language; so in theory every voice works with every language.  I have doubts.
     """
     cosmetic = "OpenAI"
     key = "openai"
+    chunked = True
     auth_ui_class = OpenAIAuthUI
 
-    config = (
-        ('Voice Name', 'voice_name', "StringVar", "<unconfigured>", {}, "get_voice_names"),
-        ('Voice Model', 'model', "StringVar", "<unconfigured>", {}, "get_models"),
-        ('Speed', 'speed', "DoubleVar", 1.0, {'min': 0.25, 'max': 4.0, 'resolution': 0.25}, None),
-    )
+    config = manifest.ENGINES['openai']['config']
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -96,41 +141,13 @@ class MyOpenAI(TTSEngine):
 
 
     def get_models(self):
-        all_models = diskcache(
+        all_models = catalog.values(
             f"{self.key}_model"
         )
-        if all_models is None:
-            all_models = diskcache(
-                f"{self.key}_model", [
-                    {'model': 'tts-1'},
-                    {'model': 'tts-1-hd'}
-                ]
-            )
         return [k['model'] for k in all_models]
 
     def get_voices(self) -> list:
-        all_voices = diskcache(
-            f"{self.key}_voice_name"
-        )
-
-        if all_voices is None:
-            all_voices = diskcache(
-                f"{self.key}_voice_name", [
-            {'voice_name': 'alloy', 'gender': 'Female'}, 
-            {'voice_name': 'ash', 'gender': 'Male'},  
-            # {'voice_name': 'ballad', 'gender': 'Male'}, 
-            {'voice_name': 'coral', 'gender': 'Male'}, 
-            {'voice_name': 'echo', 'gender': 'Male'},
-            {'voice_name': 'fable', 'gender': 'Female'}, 
-            {'voice_name': 'fable', 'gender': 'Male'},
-            {'voice_name': 'nova', 'gender': 'Female'}, 
-            {'voice_name': 'onyx', 'gender': 'Male'},
-            {'voice_name': 'sage', 'gender': 'Female'}, 
-            {'voice_name': 'shimmer', 'gender': 'Female'}, 
-            # {'voice_name': 'verse', 'gender': 'Female'}, 
-            ])
-
-        return all_voices
+        return catalog.values(f"{self.key}_voice_name")
 
     def get_voice_names(self, gender=None):
         all_voices = self.get_voices()
@@ -169,18 +186,7 @@ class ttsOpenAI(voicebox.tts.TTS):
     speed: float = 1.0
 
     def get_openai_client(self):
-        if hasattr(self, 'client'):
-            return self.client
-        
-        if os.path.exists(OPENAI_KEY_FILE):
-            with open(OPENAI_KEY_FILE) as h:
-                openai_api_key = h.read().strip()
-
-            client = OpenAI(api_key=openai_api_key)
-            self.client = client
-            return client
-        else:
-            log.warning(f"OpenAI Requires valid {OPENAI_KEY_FILE} file")
+        return runtime.get_client('openai')
 
     def get_speech(self, text: StrOrSSML) -> Audio:
         client = self.get_openai_client()
@@ -197,6 +203,7 @@ class ttsOpenAI(voicebox.tts.TTS):
             )
         except RateLimitError as e:
             log.warning(f"OpenAI API rate limit exceeded: {e}")
+            quota.rate_limited("OpenAI")
             raise USE_SECONDARY
 
         except Exception as e:
@@ -224,5 +231,25 @@ class ttsOpenAI(voicebox.tts.TTS):
 
         return v
 
+    def stream_speech(self, text: StrOrSSML):
+        """
+        The same request as get_speech(), but we get the audio as it arrives.
+        """
+        client = self.get_openai_client()
+        try:
+            with client.audio.speech.with_streaming_response.create(
+                model=self.model,
+                voice=self.voice,
+                response_format="pcm",
+                input=text
+            ) as response:
+                yield from audio.pcm_chunks(
+                    response.iter_bytes(STREAM_CHUNK_BYTES), 24000
+                )
+        except RateLimitError as e:
+            log.warning(f"OpenAI API rate limit exceeded: {e}")
+            quota.rate_limited("OpenAI")
+            raise USE_SECONDARY
+
 # add this class to the the registry of engines
 registry.add_engine(MyOpenAI)
\ No newline at end of file
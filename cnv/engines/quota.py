@@ -0,0 +1,385 @@
+"""
+How much we're allowed to ask of each engine.
+
+Two things, per engine:
+
+    * a token bucket, requests per second with some room for bursts.  Go
+      over it and OpenAI hands back RateLimitError.
+    * a ledger of characters sent this billing period against the quota for
+      it.  Go over that and Eleven Labs says quota_exceeded.
+
+Either way we used to find out with a failed request.  Now voice_builder asks
+first, and if the answer is no the line goes to the secondary engine without
+a round trip.  Live speech gets priority: background work (the pre-renderer,
+re-render jobs) has to leave LIVE_RESERVE of the quota and a token in the
+bucket for whoever is talking right now.
+
+    if quota.acquire("OpenAI", len(message), background=True):
+        ...
+    else:
+        # use something else
+
+Both live in the database (rate_bucket and quota_ledger), so they survive a
+restart and the chatter, editor and re-render workers are all drawing from
+the same bucket.  Taking tokens or spending quota is a single conditional
+UPDATE; two processes can't both spend the last of something.
+"""
+import calendar
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+
+import cnv.database.models as models
+import cnv.lib.settings as settings
+
+log = logging.getLogger(__name__)
+
+# engine -> (requests per second, burst).  config.json "rate_limits" overrides
+# these, same shape.  Anything not listed isn't limited.
+RATE_LIMITS = {
+    'Amazon Polly': (8.0, 8),
+    'Azure': (3.0, 6),
+    'Eleven Labs': (1.0, 3),
+    'Google Text-to-Speech': (5.0, 10),
+    'OpenAI': (0.8, 3),
+}
+
+# config.json "engine_quota" is {engine: characters per month} for anybody who
+# wants to keep themselves under a number.  Engines that can tell us their
+# real quota register a source for it.
+QUOTA_SOURCES = {}
+# seconds between asking an engine what it thinks we've used
+SYNC_SECONDS = 600
+
+# fraction of the quota only live speech can spend
+LIVE_RESERVE = 0.1
+# seconds live speech will wait for a token before giving up on the engine
+LIVE_WAIT = 2.0
+# and background work, which is in less of a hurry.  It still has to give up
+# eventually, an engine that stays rate limited shouldn't park the
+# pre-renderer (or a re-render worker) forever.
+BACKGROUND_WAIT = 30.0
+
+
+def register_source(engine, source):
+    """
+    source() returns (characters used, character limit, unix time the count
+    resets) straight from the provider.
+    """
+    QUOTA_SOURCES[engine] = source
+
+
+def rate_limit(engine):
+    limits = settings.get_config_key("rate_limits", {}) or {}
+    limit = limits.get(engine, RATE_LIMITS.get(engine))
+    return tuple(limit) if limit else None
+
+
+def next_month():
+    """
+    unix time of midnight on the first of next month, when a configured
+    quota starts over.
+    """
+    now = datetime.now()
+    days = calendar.monthrange(now.year, now.month)[1]
+    return datetime(now.year, now.month, 1).timestamp() + days * 86400
+
+
+def _sync(engine, source):
+    """
+    Ask engine what it thinks we've used.  That's a network call, it gets its
+    own thread.
+    """
+    try:
+        used, limit, resets = source()
+    except Exception as err:
+        log.warning(f'Could not ask {engine} about its quota: {err}')
+        return
+
+    try:
+        with models.db() as session:
+            session.execute(
+                update(models.QuotaLedger).where(
+                    models.QuotaLedger.engine == engine
+                ).values(
+                    used=used,
+                    quota_limit=limit,
+                    resets=resets,
+                    exhausted=False
+                )
+            )
+    except OperationalError as err:
+        log.warning(f'Could not save {engine} quota: {err}')
+
+
+def _ledger(session, engine):
+    """
+    engine's ledger row, started over if the period has reset.  If it is time
+    to sync with the engine, whoever claims the sync first does it in the
+    background; until that comes back we go with what we have.
+    """
+    now = time.time()
+    session.execute(
+        sqlite_insert(models.QuotaLedger).values(
+            engine=engine,
+            used=0,
+            resets=next_month(),
+            synced=0,
+            exhausted=False
+        ).on_conflict_do_nothing()
+    )
+
+    session.execute(
+        update(models.QuotaLedger).where(
+            models.QuotaLedger.engine == engine,
+            models.QuotaLedger.resets <= now
+        ).values(used=0, resets=next_month(), exhausted=False)
+    )
+
+    source = QUOTA_SOURCES.get(engine)
+    configured = (settings.get_config_key("engine_quota", {}) or {}).get(engine)
+    if configured and not source:
+        session.execute(
+            update(models.QuotaLedger).where(
+                models.QuotaLedger.engine == engine,
+                models.QuotaLedger.quota_limit.is_distinct_from(int(configured))
+            ).values(quota_limit=int(configured))
+        )
+
+    if source:
+        claimed = session.execute(
+            update(models.QuotaLedger).where(
+                models.QuotaLedger.engine == engine,
+                models.QuotaLedger.synced < now - SYNC_SECONDS
+            ).values(synced=now).returning(models.QuotaLedger.engine)
+        ).first()
+        if claimed:
+            threading.Thread(
+                target=_sync,
+                args=(engine, source),
+                name=f"quota-sync-{engine}",
+                daemon=True
+            ).start()
+
+    return session.get(models.QuotaLedger, engine, populate_existing=True)
+
+
+def _quota_allows(entry, characters, background):
+    if entry.exhausted:
+        return False
+    limit = entry.quota_limit
+    if not limit:
+        return True
+    if background:
+        limit = limit * (1 - LIVE_RESERVE)
+    return entry.used + characters <= limit
+
+
+def _spend(session, engine, characters, background):
+    """
+    Add characters to engine's ledger if there is room for them.  One
+    statement, so nobody else can spend the same room.
+    """
+    ledger = models.QuotaLedger
+    limit = ledger.quota_limit * (1 - LIVE_RESERVE) if background else ledger.quota_limit
+    return session.execute(
+        update(ledger).where(
+            ledger.engine == engine,
+            ledger.exhausted.is_(False),
+            (ledger.quota_limit.is_(None)) | (ledger.quota_limit == 0) |
+            (ledger.used + characters <= limit)
+        ).values(
+            used=ledger.used + characters
+        ).returning(ledger.engine)
+    ).first() is not None
+
+
+def _take_tokens(session, engine, tokens, background):
+    """
+    Take tokens from engine's bucket.  Returns 0 if we got them, otherwise
+    the seconds until there should be enough.
+    """
+    limit = rate_limit(engine)
+    if limit is None:
+        return 0
+    rate, burst = limit
+
+    bucket = models.RateBucket
+    now = time.time()
+    session.execute(
+        sqlite_insert(bucket).values(
+            engine=engine, tokens=burst, at=now
+        ).on_conflict_do_nothing()
+    )
+
+    # background work leaves a token for live speech
+    reserve = 1 if background and burst > 1 else 0
+    # a chunked message is several requests at once; never ask for more than
+    # the bucket can ever hold.
+    tokens = min(tokens, burst - reserve)
+    needed = tokens + reserve
+
+    available = func.min(burst, bucket.tokens + (now - bucket.at) * rate)
+    taken = session.execute(
+        update(bucket).where(
+            bucket.engine == engine,
+            available >= needed
+        ).values(
+            tokens=available - tokens,
+            at=now
+        ).returning(bucket.engine)
+    ).first()
+    if taken:
+        return 0
+
+    available = session.execute(
+        select(available).where(bucket.engine == engine)
+    ).scalar() or 0
+    # somebody else's clock may be a little ahead of ours
+    return max(needed - available, 0.01) / rate
+
+
+def _return_tokens(session, engine, tokens):
+    limit = rate_limit(engine)
+    if limit is None or not tokens:
+        return
+    bucket = models.RateBucket
+    session.execute(
+        update(bucket).where(
+            bucket.engine == engine
+        ).values(
+            tokens=func.min(limit[1], bucket.tokens + tokens)
+        )
+    )
+
+
+def allows(engine, characters, background=False):
+    """
+    Is there quota left on engine for this many characters?  Doesn't spend
+    anything or look at the rate limit.
+    """
+    try:
+        with models.db() as session:
+            return _quota_allows(_ledger(session, engine), characters, background)
+    except OperationalError as err:
+        # the engine will tell us soon enough if we really are out
+        log.warning(f'Could not check {engine} quota: {err}')
+        return True
+
+
+def acquire(engine, characters, requests=1, background=False):
+    """
+    Spend characters of engine's quota and requests tokens from its bucket.
+    Live speech waits up to LIVE_WAIT for the tokens, background work up to
+    BACKGROUND_WAIT.  False means don't call engine, nothing was spent.
+    """
+    deadline = time.monotonic() + (BACKGROUND_WAIT if background else LIVE_WAIT)
+
+    while True:
+        try:
+            with models.db() as session:
+                entry = _ledger(session, engine)
+                if not _quota_allows(entry, characters, background):
+                    log.info(
+                        f'{engine} quota: {entry.used} of {entry.quota_limit} '
+                        f'characters used, not sending {characters} more'
+                    )
+                    return False
+
+                wait = _take_tokens(session, engine, requests, background)
+                if wait == 0:
+                    if _spend(session, engine, characters, background):
+                        return True
+                    # somebody else got the last of it first
+                    _return_tokens(session, engine, requests)
+                    log.info(f'{engine} quota ran out, not sending {characters} more')
+                    return False
+        except OperationalError as err:
+            log.warning(f'Could not check {engine} quota: {err}')
+            return True
+
+        if time.monotonic() + wait > deadline:
+            log.info(f'{engine} is rate limited, {wait:.1f}s until it will take more')
+            return False
+        time.sleep(wait)
+
+
+def refund(engine, characters, requests=0):
+    """
+    The request never made it, those characters (and requests tokens) didn't
+    count.
+    """
+    try:
+        with models.db() as session:
+            session.execute(
+                update(models.QuotaLedger).where(
+                    models.QuotaLedger.engine == engine
+                ).values(
+                    used=func.max(0, models.QuotaLedger.used - characters)
+                )
+            )
+            _return_tokens(session, engine, requests)
+    except OperationalError as err:
+        log.warning(f'Could not refund {engine} quota: {err}')
+
+
+def exhausted(engine):
+    """
+    engine told us we're out.  Believe it until the period resets or the next
+    time we sync with it.
+    """
+    try:
+        with models.db() as session:
+            _ledger(session, engine)
+            session.execute(
+                update(models.QuotaLedger).where(
+                    models.QuotaLedger.engine == engine
+                ).values(exhausted=True)
+            )
+    except OperationalError as err:
+        log.warning(f'Could not save {engine} quota: {err}')
+
+
+def rate_limited(engine):
+    """
+    engine says we're going too fast; empty the bucket so everybody backs
+    off until it refills.
+    """
+    statement = sqlite_insert(models.RateBucket).values(
+        engine=engine, tokens=0, at=time.time()
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=['engine'],
+        set_={'tokens': 0, 'at': statement.excluded.at}
+    )
+    try:
+        with models.db() as session:
+            session.execute(statement)
+    except OperationalError as err:
+        log.warning(f'Could not save {engine} rate limit: {err}')
+
+
+def status():
+    """
+    engine -> ledger entry, for anybody who wants to show it.
+    """
+    try:
+        with models.db() as session:
+            rows = session.scalars(select(models.QuotaLedger)).all()
+    except OperationalError as err:
+        log.warning(f'Could not read quota: {err}')
+        return {}
+    return {
+        row.engine: {
+            'used': row.used,
+            'limit': row.quota_limit,
+            'resets': row.resets,
+            'synced': row.synced,
+            'exhausted': row.exhausted,
+        } for row in rows
+    }
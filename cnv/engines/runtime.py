@@ -0,0 +1,184 @@
+"""
+Long lived clients for the cloud engines.
+
+Every engine used to build its own client whenever it felt like it, often once
+per utterance; re-reading the key file, a new TLS handshake, a new connection
+pool that gets thrown away a second later.  Now each engine registers how to
+load its credentials and how to build its client, and this hands out one
+shared, pooled, keep-alive client per engine for the life of the process.
+
+    runtime.register('openai', make_client, credentials=load_key)
+    client = runtime.get_client('openai')
+
+The clients behind it (httpx, botocore, grpc) are all fine being used from
+several threads at once, so synthesize() runs get_speech() on a small thread
+pool and lets a batch of utterances share one connection pool:
+
+    audio = await runtime.synthesize(tts, "Hello")
+    clips = runtime.synthesize_all(tts, ["one", "two", "three"])
+
+An azure SpeechSynthesizer is one utterance at a time; hand it a second and it
+waits for the first.  Engines like that check a client out instead, and get
+one nobody else is using (built if need be) until they hand it back:
+
+    with runtime.checkout('azure', voice) as synthesizer:
+        ...
+"""
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+# utterances we're willing to have in flight at once, also the connection
+# pool size for the clients that let us pick one.
+POOL_SIZE = 8
+
+# engine key -> factory(*args) that builds a client
+CLIENT_FACTORIES = {}
+# engine key -> loader() that returns credentials, or None
+CREDENTIAL_LOADERS = {}
+
+_clients = {}
+# cache key -> clients nobody has checked out
+_idle = {}
+# engine key -> times reset(), so a client built before one isn't handed back
+_generation = {}
+_credentials = {}
+_lock = threading.RLock()
+
+_loop = None
+_executor = None
+
+
+def register(key, factory, credentials=None):
+    """
+    Tell the runtime how to build the client for engine key.  factory gets
+    any extra arguments passed to get_client().
+    """
+    CLIENT_FACTORIES[key] = factory
+    if credentials:
+        CREDENTIAL_LOADERS[key] = credentials
+
+
+def get_credentials(key):
+    """
+    Credentials for engine key, read from disk the first time somebody asks.
+    """
+    with _lock:
+        if key not in _credentials:
+            loader = CREDENTIAL_LOADERS.get(key)
+            _credentials[key] = loader() if loader else None
+        return _credentials[key]
+
+
+def get_client(key, *args):
+    """
+    The shared client for engine key.  Extra arguments are part of the cache
+    key, for engines that need one client per voice or region.
+    """
+    cache_key = (key, ) + args
+    with _lock:
+        if cache_key not in _clients:
+            log.debug(f'Building {key} client {args}')
+            client = CLIENT_FACTORIES[key](*args)
+            if client is None:
+                # no credentials, don't remember that; they may show up
+                return None
+            _clients[cache_key] = client
+        return _clients[cache_key]
+
+
+@contextmanager
+def checkout(key, *args):
+    """
+    A client for engine key that is ours alone until the with block is done,
+    for the clients that can't be shared.  Same arguments as get_client().
+    Yields None if there are no credentials.
+    """
+    cache_key = (key, ) + args
+    with _lock:
+        generation = _generation.get(key, 0)
+        idle = _idle.setdefault(cache_key, [])
+        client = idle.pop() if idle else None
+
+    if client is None:
+        log.debug(f'Building {key} client {args}')
+        client = CLIENT_FACTORIES[key](*args)
+        if client is None:
+            yield None
+            return
+
+    # if the block blew up (or was abandoned part way through a stream) we
+    # don't know what state the client is in; let it go.
+    yield client
+
+    with _lock:
+        # unless reset() threw the old ones away while we had it
+        if _generation.get(key, 0) == generation:
+            _idle.setdefault(cache_key, []).append(client)
+
+
+def reset(key):
+    """
+    The credentials for engine key changed, forget everything we built with
+    the old ones.
+    """
+    with _lock:
+        _credentials.pop(key, None)
+        _generation[key] = _generation.get(key, 0) + 1
+        for cache_key in [k for k in _clients if k[0] == key]:
+            del _clients[cache_key]
+        for cache_key in [k for k in _idle if k[0] == key]:
+            del _idle[cache_key]
+
+
+def get_loop():
+    """
+    The runtime's event loop, running in its own daemon thread.
+    """
+    global _loop, _executor
+    with _lock:
+        if _loop is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=POOL_SIZE,
+                thread_name_prefix="tts"
+            )
+            _loop = asyncio.new_event_loop()
+            _loop.set_default_executor(_executor)
+            threading.Thread(
+                target=_loop.run_forever,
+                name="tts-runtime",
+                daemon=True
+            ).start()
+        return _loop
+
+
+async def synthesize(tts, text):
+    """
+    tts.get_speech(text) without blocking the event loop.  Returns the
+    voicebox Audio.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, tts.get_speech, text)
+
+
+def submit(coroutine):
+    """
+    Run a coroutine on the runtime loop from any thread.  Returns a
+    concurrent.futures.Future.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop())
+
+
+def synthesize_all(tts, texts):
+    """
+    Render every text at once, blocking until they are all done.  Audio comes
+    back in the same order as texts.
+    """
+    async def gather():
+        return await asyncio.gather(*[synthesize(tts, text) for text in texts])
+
+    return submit(gather()).result()
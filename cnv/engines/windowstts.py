@@ -1,13 +1,14 @@
 import logging
 from dataclasses import dataclass
 
-import cnv.database.models as models
 import cnv.lib.settings as settings
+from cnv.lib import catalog
 import numpy as np
 import voicebox
 from voicebox.audio import Audio
 from voicebox.types import StrOrSSML
 
+from . import manifest
 from .base import TTSEngine, registry
 
 log = logging.getLogger(__name__)
@@ -463,10 +464,7 @@ class WindowsTTS(TTSEngine):
         },
     }
 
-    config = (
-        ('Voice Name', 'voice_name', "StringVar", "<unconfigured>", {}, "get_voice_names"),
-        ('Speaking Rate', 'rate', "DoubleVar", 1, {'min': -2.0, 'max': 2.0, 'digits': 2, 'resolution': 0.5}, None)
-    )
+    config = manifest.ENGINES['windowstts']['config']
 
     def get_tts(self):
         """
@@ -489,31 +487,10 @@ class WindowsTTS(TTSEngine):
         machine to machine.
         """
         log.debug(f'Retrieving TTS voice names filtered to only show gender {self.gender}')
-        # all_voices = models.diskcache(f"{self.key}_voice_name")
-        all_voices = None
-
-        if all_voices is None:
-            all_voices = []
-            wintts = Sapi()
-            voices = wintts.get_voice_names()
-            for v in voices:
-                if "Desktop" in v:
-                    continue
-
-                name = " ".join(v.split("-")[0].split()[1:])
-                if name in self.VOICE_SUPERSET:
-                    all_voices.append({
-                        'voice_name': name,
-                        'gender': self.name_to_gender(name),
-                        'language_code': self.VOICE_SUPERSET[name]['language_code']
-                    })
-                else:
-                    all_voices.append({
-                        'voice_name': name,
-                        'gender': self.name_to_gender(name)
-                    })
-            
-            models.diskcache(f"{self.key}_voice_name", all_voices)
+        # always ask, it is local and cheap.  The catalog gets a copy for
+        # create_character.
+        all_voices = fetch_voices()
+        catalog.put(f"{self.key}_voice_name", all_voices)
       
         allowed_language_codes = settings.get_voice_language_codes()
         nice_names = []
@@ -539,6 +516,31 @@ class WindowsTTS(TTSEngine):
         return sorted(nice_names)
 
 
+def fetch_voices():
+    """
+    The SAPI voices installed on this machine.
+    """
+    all_voices = []
+    for v in Sapi().get_voice_names():
+        if "Desktop" in v:
+            continue
+
+        name = " ".join(v.split("-")[0].split()[1:])
+        known = WindowsTTS.VOICE_SUPERSET.get(name, {})
+        voice = {
+            'voice_name': name,
+            'gender': known.get('gender', 'Neutral')
+        }
+        if 'language_code' in known:
+            voice['language_code'] = known['language_code']
+        all_voices.append(voice)
+
+    return all_voices
+
+
+catalog.register('windowstts_voice_name', fetch_voices)
+
+
 @dataclass
 class WindowsSapi(voicebox.tts.TTS):
     rate: int = 1
@@ -1,11 +1,15 @@
 """
 These are high level manipulations of audio files.
 """
-from pedalboard.io import AudioFile
-from voicebox.tts.utils import get_audio_from_wav_file
+import io
 import logging
 from pathlib import Path
 
+import numpy as np
+from pedalboard.io import AudioFile
+from voicebox.audio import Audio
+from voicebox.tts.utils import get_audio_from_samples
+
 log = logging.getLogger(__name__)
 
 def replace_extension(pathfn, extension):
@@ -66,11 +70,46 @@ def mp3file_to_wavfile(mp3filename, wavfilename=None):
     return wavfilename
 
 
+def _decode_to_Audio(source):
+    """
+    source is a filename or file-like object holding mp3 (or anything else
+    pedalboard can read).  Decoded straight into memory, no wav detour.
+    """
+    with AudioFile(source) as input:
+        samples = input.read(input.frames)
+        sample_rate = input.samplerate
+
+    # voicebox wants mono, pedalboard gives us (channels, frames)
+    return Audio(samples.mean(axis=0), int(sample_rate))
+
+
 def mp3file_to_Audio(mp3filename):
     """
     We want this mp3 as a voicebox Voice() object.
     """
-    wavfilename = mp3file_to_wavfile(mp3filename)
-    return get_audio_from_wav_file(
-        wavfilename
-    )       
+    return _decode_to_Audio(str(mp3filename))
+
+
+def mp3bytes_to_Audio(data: bytes):
+    """
+    Same thing, for an mp3 we only have in memory.
+    """
+    return _decode_to_Audio(io.BytesIO(data))       
+
+
+def pcm_chunks(byte_chunks, sample_rate):
+    """
+    Raw 16 bit mono PCM arriving in whatever size pieces the network feels
+    like, as a series of voicebox Audio.  A piece can end halfway through a
+    sample, the odd byte waits for the next piece.
+    """
+    leftover = b""
+    for chunk in byte_chunks:
+        data = leftover + chunk
+        usable = len(data) - (len(data) % 2)
+        leftover = data[usable:]
+        if usable:
+            yield get_audio_from_samples(
+                np.frombuffer(data[:usable], dtype=np.int16),
+                sample_rate
+            )
@@ -0,0 +1,240 @@
+"""
+Every engine's voice list, in memory and indexed.
+
+The voice lists live in the weekly diskcache (cache/<engine>_<field>.json).
+Reading them straight from there meant a stat, a read and a json.loads every
+time anybody wanted to know a voice's id, then a walk down the list to find
+it.  Now each list is loaded once and indexed by id, name, language and
+gender:
+
+    voices = catalog.get('elevenlabs_voice_name')
+    voices.by_name['Rachel']['id']
+
+Engines that know how to fetch their list register it.  When the copy on
+disk is more than a week old we keep answering from the old one while a
+background thread fetches the new one, then swap it in.
+
+    catalog.register('elevenlabs_voice_name', fetch_voices)
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+from cnv.lib import settings
+
+log = logging.getLogger(__name__)
+
+# same as diskcache
+TTL = 7 * 24 * 60 * 60
+
+# the different names engines use for the same things
+NAME_FIELDS = ('voice_name', 'voice', 'model')
+ID_FIELDS = ('id', 'Id')
+LANGUAGE_FIELDS = ('language_code', 'language_codes', 'locale')
+
+# key -> fetch() that returns a fresh list
+REFRESHERS = {}
+
+_catalogs = {}
+_refreshing = set()
+_lock = threading.Lock()
+
+
+class Catalog:
+    """
+    One list from the diskcache, with the indexes built once.
+    """
+    def __init__(self, key, entries, loaded):
+        self.key = key
+        self.entries = list(entries)
+        # when the list was fetched, for the TTL
+        self.loaded = loaded
+
+        self.by_name = {}
+        self.by_id = {}
+        self.by_language = defaultdict(list)
+        self.by_gender = defaultdict(list)
+        # (language regex, gender) -> choices()
+        self._choices = {}
+
+        for entry in self.entries:
+            if not isinstance(entry, dict):
+                continue
+
+            for field in NAME_FIELDS:
+                if field in entry:
+                    self.by_name.setdefault(str(entry[field]).strip(), entry)
+                    break
+
+            for field in ID_FIELDS:
+                if field in entry:
+                    self.by_id.setdefault(entry[field], entry)
+                    break
+
+            for code in self.language_codes(entry):
+                self.by_language[code].append(entry)
+
+            if entry.get('gender'):
+                self.by_gender[entry['gender'].title()].append(entry)
+
+    @staticmethod
+    def language_codes(entry):
+        for field in LANGUAGE_FIELDS:
+            value = entry.get(field)
+            if isinstance(value, str):
+                return [value]
+            if value:
+                return list(value)
+        return []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stale(self):
+        return time.time() - self.loaded > TTL
+
+    def choices(self, language_regex=None, gender=None):
+        """
+        The entries worth picking from for a new character.  Only voices
+        matching language_regex (when the list has a language_code), and
+        only gender, unless that would leave nothing.  Worked out once per
+        combination.
+        """
+        memo = (language_regex, gender.title() if gender else None)
+        if memo in self._choices:
+            return self._choices[memo]
+
+        values = self.entries
+        if language_regex and values and 'language_code' in values[0]:
+            # a few dozen languages to match, not a few hundred voices.  A
+            # voice with more than one language is only in here once.
+            values = list({
+                id(entry): entry
+                for code, entries in self.by_language.items()
+                if re.match(language_regex, code)
+                for entry in entries
+            }.values())
+
+        if gender and values and 'gender' in values[0]:
+            gendered = self.by_gender.get(gender.title(), [])
+            if values is not self.entries:
+                # only the ones the language filter kept
+                kept = {id(entry) for entry in values}
+                gendered = [entry for entry in gendered if id(entry) in kept]
+            if gendered:
+                values = gendered
+            else:
+                log.debug('Gender filter removed all voice name entries')
+
+        self._choices[memo] = values
+        return values
+
+
+def register(key, fetch):
+    """
+    fetch() returns the current list for key, from wherever it comes from.
+    """
+    REFRESHERS[key] = fetch
+
+
+def _filename(key):
+    return os.path.join(settings.CACHE_DIR, key + ".json")
+
+
+def _load(key):
+    """
+    Whatever is on disk for key, however old it is.
+    """
+    filename = _filename(key)
+    try:
+        loaded = os.path.getmtime(filename)
+        with open(filename, "rb") as h:
+            entries = json.loads(h.read())
+    except (OSError, ValueError):
+        return None
+
+    if not entries:
+        return None
+    return Catalog(key, entries, loaded)
+
+
+def _refresh(key):
+    try:
+        log.info(f'Refreshing voice catalog {key}')
+        put(key, REFRESHERS[key]())
+    except Exception as err:
+        log.warning(f'Could not refresh voice catalog {key}: {err}')
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+
+def get(key):
+    """
+    The Catalog for key, None if we don't have one and can't fetch it.
+    """
+    with _lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _load(key)
+            if catalog is not None:
+                _catalogs[key] = catalog
+
+        refresh = (
+            key in REFRESHERS
+            and catalog is not None
+            and catalog.stale()
+            and key not in _refreshing
+        )
+        if refresh:
+            _refreshing.add(key)
+
+    if catalog is None and key in REFRESHERS:
+        # nothing to answer with in the meantime, this one has to wait
+        try:
+            return put(key, REFRESHERS[key]())
+        except Exception as err:
+            log.error(f'Could not fetch voice catalog {key}: {err}')
+            return None
+
+    if refresh:
+        threading.Thread(
+            target=_refresh,
+            args=(key, ),
+            name=f"catalog-{key}",
+            daemon=True
+        ).start()
+
+    return catalog
+
+
+def values(key):
+    """
+    The list for key, or None.  What diskcache(key) used to give you.
+    """
+    catalog = get(key)
+    return None if catalog is None else catalog.entries
+
+
+def put(key, entries):
+    """
+    A new list for key; saved to the diskcache and the indexes rebuilt.
+    """
+    settings.diskcache(key, entries)
+    catalog = Catalog(key, entries, time.time())
+    with _lock:
+        _catalogs[key] = catalog
+    return catalog
+
+
+def reload(key):
+    """
+    Somebody wrote key's diskcache without telling us.
+    """
+    with _lock:
+        _catalogs.pop(key, None)
+    return get(key)
@@ -1,10 +1,14 @@
 import datetime
+import functools
 import hashlib
 import inspect
 import json
 import logging
 import os
 import re
+import sqlite3
+import threading
+from urllib.request import pathname2url
 
 LOGLEVEL = logging.INFO
 # this is the ultimate fallback engine if there is nothing configured
@@ -263,18 +267,76 @@ ALL_NPC_FN = os.path.join(
     "..", '..',
     "all_npcs.json"
 )
+# the same thing indexed by name, see raw_data_condenser.py
+ALL_NPC_DB = os.path.join(
+    os.path.dirname(__file__), 
+    "..", '..',
+    "all_npcs.db"
+)
+_npc_db = None
+_npc_lock = threading.Lock()
 
-def get_npc_data(character_name):
+
+def _npc_query(sql, character_name):
+    """
+    One row from all_npcs.db, or None.  False if there is no all_npcs.db.
+    """
+    global _npc_db
+    with _npc_lock:
+        if _npc_db is None:
+            if not os.path.exists(ALL_NPC_DB):
+                return False
+            # immutable: nobody writes it, so sqlite can skip the locking
+            _npc_db = sqlite3.connect(
+                f"file:{pathname2url(os.path.abspath(ALL_NPC_DB))}?immutable=1",
+                uri=True,
+                check_same_thread=False
+            )
+        return _npc_db.execute(sql, (character_name, )).fetchone()
+
+
+def _load_all_npcs():
+    # no all_npcs.db, do it the old way
     global ALL_NPC
-    log.debug(f"get_npc_data({character_name=})")
     if not ALL_NPC:
-        # log.info(os.listdir(
-        #     os.path.dirname(ALL_NPC_FN)
-        # ))
-
         with open(ALL_NPC_FN, "r") as h:
             ALL_NPC = json.loads(h.read())
-    return ALL_NPC.get(character_name)
+    return ALL_NPC
+
+
+@functools.lru_cache(maxsize=1024)
+def get_npc_data(character_name):
+    """
+    {'gender': ..., 'group_name': ...} or None if we've never heard of them.
+    Don't change it, it's shared.
+    """
+    log.debug(f"get_npc_data({character_name=})")
+    row = _npc_query(
+        "SELECT gender, group_name FROM npc WHERE name = ?",
+        character_name
+    )
+    if row is False:
+        npc_data = _load_all_npcs().get(character_name)
+        if npc_data is None:
+            return None
+        row = (npc_data.get("gender"), npc_data.get("group_name"))
+    elif row is None:
+        return None
+
+    return {"gender": row[0], "group_name": row[1]}
+
+
+def get_npc_description(character_name):
+    """
+    Only the biography wants these, so they aren't in get_npc_data().
+    """
+    row = _npc_query(
+        "SELECT description FROM npc_description WHERE name = ?",
+        character_name
+    )
+    if row is False:
+        return _load_all_npcs().get(character_name, {}).get("description", "")
+    return row[0] if row else ""
 
 
 def get_npc_gender(character_name):
@@ -147,7 +147,11 @@ def main():
                 # we got an action (no exception)
                 key, value = event_queue.get()
                 
-                log.info(f'{key}({value}) event received')
+                if key == "DAMAGE":
+                    # these show up every second or so during a fight
+                    log.debug(f'{key} event received')
+                else:
+                    log.info(f'{key}({value}) event received')
 
                 if key == "SET_CHARACTER":
                     speaking_queue.put(
@@ -162,9 +166,15 @@ def main():
                     #char.set_hero()
                     last_character_update = datetime.now()
                 elif key == "SPOKE":
-                    # name, category = value
-                    log.debug('Refreshing character list...')
-                    mtv.tabdict['Voices'].listside.refresh_character_list()
+                    name, category = value
+                    log.debug(f'Moving {name} to the top of the character list...')
+                    mtv.tabdict['Voices'].listside.character_spoke(name, category)
+                elif key == "DAMAGE":
+                    mtv.tabdict['Character'].damageframe.apply_delta(value)
+                elif key == "DAMAGE_RESET":
+                    mtv.tabdict['Character'].damageframe.clear()
+                elif key == "PRERENDER":
+                    mtv.tabdict['Voices'].listside.prerender_progress(value)
                 elif key == "RECHARGED":
                     log.debug(f'Power {value} has recharged.')
                     if value in ["Hasten", "Domination"]:
@@ -8,14 +8,18 @@ import cnv.database.models as models
 import customtkinter as ctk
 import matplotlib.dates as mdates
 # import numpy as np
-from cnv.chatlog import npc_chatter
+from cnv.chatlog import dps, npc_chatter
 from cnv.lib import settings
+from cnv.voices import prerender
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 from sqlalchemy import func, select
 
 log = logging.getLogger(__name__)
 
+# Power Name, Hit Rate, Type, Special, Average, Total, DPS
+DAMAGE_COLUMNS = 7
+
 # when you are level X, how many xp do you need to reach the next level?
 xp_table = {
    1: 106,
@@ -108,26 +112,13 @@ class ChartFrame(ctk.CTkFrame):
         return raw_samples
     
     def get_binned_samples(self, hero_id, start_time, end_time, session):
-        # do some binning in per-minute buckets in the database.
+        # per-minute buckets, already summed up by models.add_hero_stat_event
         log.debug('Gathering binned samples')
 
         try:
-            samples = session.execute(
-                select(
-                    func.STRFTIME('%Y-%m-%d %H:%M:00', models.HeroStatEvent.event_time).label('EventMinute'),
-                    func.sum(models.HeroStatEvent.xp_gain).label('xp_gain'),
-                    func.sum(models.HeroStatEvent.inf_gain).label('inf_gain')
-                ).where(
-                    models.HeroStatEvent.hero_id == hero_id,
-                    models.HeroStatEvent.event_time >= start_time,
-                    models.HeroStatEvent.event_time <= end_time,
-                ).group_by(
-                    'EventMinute'
-                    # func.STRFTIME('%Y-%m-%d %H:%M:00', models.HeroStatEvent.event_time)
-                ).order_by(
-                    'EventMinute'
-                )
-            ).all()
+            samples = models.get_hero_stat_rollup(
+                session, hero_id, start_time, end_time
+            )
         except Exception as err:
             log.error('Error gathering data samples')
             log.error(err)
@@ -195,15 +186,15 @@ class ChartFrame(ctk.CTkFrame):
             for row in binned_samples:
                 # per bin
                 log.debug(f'row: {row}')
-                datestring, xp_gain, inf_gain = row
+                event_time = row.bucket_start
+                xp_gain = row.xp_gain
+                inf_gain = row.inf_gain
 
                 if xp_gain:
                     sum_xp += xp_gain
 
                 if inf_gain:
                     sum_inf += inf_gain
-
-                event_time = datetime.strptime(datestring, "%Y-%m-%d %H:%M:%S") 
                 
                 while previous_event and (event_time - previous_event) > timedelta(minutes=1, seconds=30):
                     log.debug('Adding a zero value to fill in a gap')
@@ -325,142 +316,104 @@ class ChartFrame(ctk.CTkFrame):
             log.debug('graph constructed')      
 
 
-class TypedDamage:
-    def __init__(self, damage_type, special='', count=0, total=0):
-        self.damage_type = damage_type
-        self.special = special
-        self.count = count
-        self.total = total
+class PowerRow(ctk.CTkFrame):
+    """
+    One power in the DamageFrame.  The labels are created once and after that
+    only their text changes.
+    """
+    def __init__(self, parent, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+        self.total = 0
+        # (damage_type, special) -> (type, special, average, total) labels
+        self.typed_rows = {}
+        self.total_row = None
 
+        for column in range(DAMAGE_COLUMNS):
+            self.grid_columnconfigure(column, weight=1, uniform="damage")
 
-class PowerStat:
-    def __init__(self, name):
-        self.hit = 0
-        self.miss = 0
-        self.typed = {}
-        self.height = None
+        # Power Name
+        self.name_label = ctk.CTkLabel(self, text="")
+        self.name_label.grid(column=0, row=0, sticky="ew", padx=5)
 
-        if ':' in name:
-            self.name = name.split(':')[0] + " (proc)"
-        else:
-            self.name = name
-    
-    def record_damage(self, damage_type:str, special:str, damage:float):
-        self.hit += 1
+        # Hit Rate
+        self.rate_label = ctk.CTkLabel(self, text="")
+        self.rate_label.grid(column=1, row=0)
 
-        key = (damage_type, special)
-        if key not in self.typed:
-            self.typed[key] = TypedDamage(damage_type, special)
+        # DPS
+        self.dps_label = ctk.CTkLabel(self, text="")
+        self.dps_label.grid(column=6, row=0)
 
-        self.typed[key].count += 1
-        self.typed[key].total += damage
+    def add_typed_row(self, row_index, damage_type, special):
+        # Type
+        damage_type = ctk.CTkLabel(
+            self, text=damage_type, corner_radius=0, padx=0
+        )
+        damage_type.grid(column=2, row=row_index)
 
-    def row_height(self):
-        if self.height:
-            return self.height 
-        
-        self.height = 0
-        for damage_type, special in self.typed:
-            if damage_type != "":
-                self.height += 1
-
-        if self.height == 0:
-            self.height = 1
-
-        if self.height > 1:
-            # one more for "all"
-            self.height += 1
-        return self.height
-
-    def calculate_grid(self):
-        self.hits = 0
-        self.total_damage = 0
-        self.tries = 0        
-        
-        for damage_type, special in self.typed:
-            key = (damage_type, special)
-            # misses don't have a damage type
-            if damage_type:
-                self.hits += self.typed[key].count
-            self.tries += self.typed[key].count
-            self.total_damage += self.typed[key].total
-            
-        # Hit Rate
-        self.perc = 100 * float(self.hits) / float(self.tries)
+        # Special
+        special = ctk.CTkLabel(self, text=special, corner_radius=0, padx=0)
+        special.grid(column=3, row=row_index)
 
-    def draw_grid_row(self, parent, row_index):
-        self.height = self.row_height()
-        # Power Name
-        ctk.CTkLabel(
-            parent,
-            text=self.name
-        ).grid(
-            column=0, 
-            row=row_index,
-            rowspan=self.height,
-            sticky="ew", 
-            padx=5
-        )        
+        # Average
+        average = ctk.CTkLabel(self, text="", corner_radius=0, padx=0)
+        average.grid(column=4, row=row_index)
 
-        # Hit Rate
-        ctk.CTkLabel(
-            parent, 
-            text=f"{self.hits} of {self.tries}: {self.perc:0.2f}%"
-        ).grid(
-            column=1, 
-            row=row_index,
-            rowspan=self.height
+        # Total
+        total = ctk.CTkLabel(self, text="", corner_radius=0, padx=0)
+        total.grid(column=5, row=row_index)
+
+        return damage_type, special, average, total
+
+    def update_stats(self, stats):
+        self.total = stats['total']
+        self.name_label.configure(text=stats['label'])
+
+        if stats['tries']:
+            perc = 100 * float(stats['hits']) / float(stats['tries'])
+        else:
+            perc = 0
+        self.rate_label.configure(
+            text=f"{stats['hits']} of {stats['tries']}: {perc:0.2f}%"
+        )
+        self.dps_label.configure(
+            text=" / ".join(f"{value:,.1f}" for value in stats['dps'].values())
         )
 
-        # for the the per-damage type, grid-within-grid
-        def draw_damage_type_grid(typed_damage, row_index):
-            
-            # Type
-            ctk.CTkLabel(
-                parent, text=typed_damage.damage_type, corner_radius=0, padx=0
-            ).grid(column=2, row=row_index)
-
-            # Special
-            ctk.CTkLabel(
-                parent, text=typed_damage.special, corner_radius=0, padx=0
-            ).grid(column=3, row=row_index)
-
-            # Average
-            ctk.CTkLabel(
-                parent, 
-                text=f"{typed_damage.total / typed_damage.count:,.2f}",
-                corner_radius=0, padx=0
-            ).grid(column=4, row=row_index)
-
-            # Total
-            ctk.CTkLabel(
-                parent, text=f"{typed_damage.total:,}",
-                corner_radius=0, padx=0
-            ).grid(column=5, row=row_index)
-
-        count = 0
-        for damage_type, special in self.typed:
-            count += 1
-
-            key = (damage_type, special)
-            if damage_type:
-                typed_damage = self.typed[key]
-                draw_damage_type_grid(typed_damage, row_index)
-                row_index += 1
-        
-        if count > 1:
+        for typed in stats['typed']:
+            # misses don't have a damage type
+            if not typed['damage_type']:
+                continue
+
+            key = (typed['damage_type'], typed['special'])
+            if key not in self.typed_rows:
+                self.typed_rows[key] = self.add_typed_row(
+                    len(self.typed_rows), typed['damage_type'], typed['special']
+                )
+
+            _, _, average, total = self.typed_rows[key]
+            average.configure(text=f"{typed['total'] / typed['count']:,.2f}")
+            total.configure(text=f"{typed['total']:,.2f}")
+
+        height = max(1, len(self.typed_rows))
+        if len(self.typed_rows) > 1:
             # multiple damage types, we add some cosmetics and a 'Total' row to
             # show aggregate stats from all types.
-            total_damage = TypedDamage('Total', count=self.hits, total=self.total_damage)
-            
-            hline = tk.Frame(parent, borderwidth=1, relief="solid", height=1)
-            hline.grid(column=2, row=row_index, columnspan=4, sticky="ew")
-            row_index += 1
+            if self.total_row is None:
+                self.hline = tk.Frame(self, borderwidth=1, relief="solid", height=1)
+                self.total_row = self.add_typed_row(height + 1, 'Total', '')
 
-            draw_damage_type_grid(total_damage, row_index)
-        
-        # the _next_ row available
-        return row_index
+            # more types may have shown up since last time
+            self.hline.grid(column=2, row=height, columnspan=4, sticky="ew")
+            for label in self.total_row:
+                label.grid(row=height + 1)
+
+            _, _, average, total = self.total_row
+            average.configure(text=f"{stats['total'] / max(1, stats['hits']):,.2f}")
+            total.configure(text=f"{stats['total']:,.2f}")
+            height += 2
+
+        for label in (self.name_label, self.rate_label, self.dps_label):
+            label.grid(rowspan=height)
 
 
 class DamageFrame(ctk.CTkScrollableFrame):
@@ -468,82 +421,84 @@ class DamageFrame(ctk.CTkScrollableFrame):
     Damage is different than XP/Inf.  I'm not interested in rates or projections.
     I want to know how much damage each power is doing and how often I use them.
     We will scope to this session, so we will do this in memory.
+
+    The chatter process keeps the totals (cnv.chatlog.dps) and sends us the
+    powers that changed, only those rows get touched.
     """
     def __init__(self, parent, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
+        # power name -> PowerRow
+        self.rows = {}
+        # power names, in the order they are gridded
+        self.order = []
+        self.header_rows = self.create_grid_header()
 
-        self.create_grid_header()
-        
     def create_grid_header(self):
         self.grid_rowconfigure(0, weight=0)
-        self.grid_columnconfigure(0, weight=1)
-        ctk.CTkLabel(self, text="Power Name").grid(column=0, row=0, sticky='ew')
-
-        self.grid_columnconfigure(1, weight=1)
-        ctk.CTkLabel(self, text="Hit Rate").grid(column=1, row=0, sticky='ew')
-
-        self.grid_columnconfigure(2, weight=1)
-        ctk.CTkLabel(self, text="Type").grid(column=2, row=0, sticky='ew')
-        
-        self.grid_columnconfigure(3, weight=1)
-        ctk.CTkLabel(self, text="Special").grid(column=3, row=0, sticky='ew')
-        
-        self.grid_columnconfigure(4, weight=1)
-        ctk.CTkLabel(self, text="Average").grid(column=4, row=0, sticky='ew')
-        
-        self.grid_columnconfigure(5, weight=1)
-        ctk.CTkLabel(self, text="Total").grid(column=5, row=0, sticky='ew')
+        for column, title in enumerate((
+            "Power Name", "Hit Rate", "Type", "Special", "Average", "Total",
+            "DPS (" + " / ".join(f"{window}s" for window in dps.DPS_WINDOWS) + ")"
+        )):
+            self.grid_columnconfigure(column, weight=1, uniform="damage")
+            ctk.CTkLabel(self, text=title).grid(column=column, row=0, sticky='ew')
 
         hline = tk.Frame(self, borderwidth=1, relief="solid", height=2)
-        hline.grid(column=0, row=1, columnspan=6, sticky="ew")
-        
-        # how many grid rows we occupy
-        return 2    
+        hline.grid(column=0, row=1, columnspan=DAMAGE_COLUMNS, sticky="ew")
 
-    def refresh_damage_panel(self):
-        log.debug("refresh_damage_panel")
-        # clear any old data
-        for widget in self.winfo_children():
-            widget.destroy()
-        row_index = self.create_grid_header()
+        self.session_label = ctk.CTkLabel(self, text="")
+        self.session_label.grid(column=0, row=2, columnspan=DAMAGE_COLUMNS, sticky="ew")
 
-        # how much of the math in python vs sqlite?
-        with models.db() as session:
-            all_damage = session.scalars(
-                select(models.Damage)
-            ).all()
-
-        powers = {}
-        for row in all_damage:
-            if row.power not in powers:
-                powers[row.power] = PowerStat(name=row.power)
-
-            power = powers[row.power]     
-            power.record_damage(row.damage_type, row.special, row.damage)
-
-        for powername in powers:
-            power = powers[powername]
-            # calcualte the totals for every power so we have something to sort by
-            power.calculate_grid()
+        # how many grid rows we occupy
+        return 3
 
-        for powername in sorted(powers, key=lambda p: powers[p].total_damage, reverse=True):
-            power = powers[powername]
-            
-            # draw the grid to self in grid row `row_index`
-            row_index = power.draw_grid_row(self, row_index)
+    def clear(self):
+        log.debug('Clearing damage panel')
+        for row in self.rows.values():
+            row.destroy()
+        self.rows = {}
+        self.order = []
+        self.session_label.configure(text="")
 
-            # horizontal line between each power
-            hline = tk.Frame(self, borderwidth=1, relief="groove", height=2)
-            hline.grid(column=0, row=row_index + 1, columnspan=6, sticky="ew")
+    def apply_delta(self, delta):
+        """
+        delta comes from DamageAggregator.flush()
+        """
+        for stats in delta['powers']:
+            row = self.rows.get(stats['power'])
+            if row is None:
+                row = PowerRow(self)
+                self.rows[stats['power']] = row
+            row.update_stats(stats)
+
+        session = delta['session']
+        self.session_label.configure(
+            text=(
+                f"Session: {session['hits']} of {session['tries']} hit for "
+                f"{session['total']:,.2f} damage, DPS " +
+                " / ".join(f"{value:,.1f}" for value in session['dps'].values())
+            )
+        )
 
-            row_index += 2
+        # biggest total first.  Only re-grid the rows that moved.
+        order = sorted(self.rows, key=lambda p: self.rows[p].total, reverse=True)
+        for index, power in enumerate(order):
+            if index >= len(self.order) or self.order[index] != power:
+                self.rows[power].grid(
+                    column=0,
+                    row=self.header_rows + index,
+                    columnspan=DAMAGE_COLUMNS,
+                    sticky="ew",
+                    pady=(0, 2)
+                )
+        self.order = order
 
 
 class ChatterService:
     def start(self, event_queue, speaking_queue):
         log.info('ChatterService.start()')
         
-        npc_chatter.TightTTS(speaking_queue, event_queue)
+        tts = npc_chatter.TightTTS(speaking_queue, event_queue)
+        prerender.PrerenderScheduler(event_queue, tts.busy)
         speaking_queue.put((None, "Attaching to most recent log...", 'system'))
 
         logdir = settings.log_dir()
@@ -666,7 +621,6 @@ class CharacterTab(ctk.CTkFrame):
     def subtab_selected(self, *args, **kwargs):
         selected_tab = self.character_subtabs.get()
         if selected_tab == "Damage":
-            self.damageframe.refresh_damage_panel()
             self.damageframe.pack(fill="both", expand=True)
         elif selected_tab == "Graph":
             pass
@@ -710,11 +664,6 @@ class CharacterTab(ctk.CTkFrame):
         except Exception as err:
             log.error(err)
 
-        try:
-            self.damageframe.refresh_damage_panel()
-        except Exception as err:
-            log.error(err)
-
         self.progress_chart = ChartFrame(self.graph, hero)
         self.graph.grid_columnconfigure(0, weight=1)
         self.graph.grid_rowconfigure(0, weight=1)
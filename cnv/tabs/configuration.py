@@ -4,8 +4,10 @@ import tkinter as tk
 from tkinter import ttk
 import customtkinter as ctk
 import hashlib
+import time
 import cnv.lib.settings as settings
-from cnv.engines.base import registry as engine_registry
+from cnv.engines.base import UnknownEngine, registry as engine_registry
+from cnv.engines import health
 
 log = logging.getLogger(__name__)
 
@@ -33,6 +35,9 @@ TOGGLES = [
     ("Speak League", "on"),
     ("Speak Tell", "on"),
     ("Speak NPC", "on"),
+    ("Pre-render Clips", "off"),
+    ("Streaming Speech", "off"),
+    ("Hedge Slow Engines", "off"),
 ]
 
 
@@ -49,15 +54,32 @@ class EngineAuthentication(ctk.CTkTabview):
     """
 
     def __init__(self, parent, *args, **kwargs):
-        super().__init__(parent, *args, **kwargs)
+        super().__init__(parent, *args, command=self.draw_selected, **kwargs)
+
+        # label -> engine key.  Drawing a panel means importing that engine
+        # (and its SDK), so it waits until somebody looks at the tab.
+        self.engine_keys = {}
+        self.drawn = set()
+        for label, key in engine_registry.auth_list():
+            self.add(name=label)
+            self.engine_keys[label] = key
+
+        self.draw_selected()
+
+    def draw_selected(self):
+        label = self.get()
+        if not label or label in self.drawn:
+            return
+        self.drawn.add(label)
+
+        try:
+            engine_ui = engine_registry.get_engine(self.engine_keys[label])
+        except UnknownEngine:
+            return
+
+        panel = engine_ui.auth_ui_class(self.tab(label))
+        panel.pack(fill="both", expand=True)
 
-        for _, engine_ui in engine_registry.engine_list():
-            if engine_ui.auth_ui_class:
-                                
-                tab = self.add(name=engine_ui.auth_ui_class.label)
-                panel = engine_ui.auth_ui_class(tab)
-                panel.pack(fill="both", expand=True)
-                
 
 class ChannelToEngineMap(ctk.CTkFrame):
     """
@@ -166,7 +188,7 @@ class ChannelToEngineMap(ctk.CTkFrame):
             frame, 
             variable=engine_var,
             state='readonly',
-            values=[e.cosmetic for (_, e) in engine_registry.engine_list()]
+            values=engine_registry.cosmetic_list()
         )
         default_engine_combo.grid(column=1, row=0)
 
@@ -328,6 +350,90 @@ class DirectoryChoices(ctk.CTkFrame):
         ).grid(column=2, row=1, sticky="w")
 
 
+class EngineHealth(ctk.CTkFrame):
+    """
+    How each engine has been doing lately, from the circuit breakers in
+    engines/health.py.  Any engine that has been used shows up here.
+    """
+    # milliseconds between refreshes
+    REFRESH = 2000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rows = {}
+
+        for col in range(7):
+            self.columnconfigure(col, weight=1, uniform="enginehealth")
+
+        for index, label in enumerate([
+            'Engine',
+            'State',
+            'Latency (p50)',
+            'Latency (p95)',
+            'Errors',
+            'Hedged (won)',
+            '',
+        ]):
+            ctk.CTkLabel(
+                self,
+                text=label,
+                anchor="n",
+            ).grid(column=index, row=0, sticky='n')
+
+        self.refresh()
+
+    def add_row(self, engine):
+        row = len(self.rows) + 1
+        ctk.CTkLabel(self, text=engine, anchor="w").grid(column=0, row=row, sticky='w')
+
+        labels = []
+        for col in range(1, 6):
+            label = ctk.CTkLabel(self, text="", anchor="n")
+            label.grid(column=col, row=row, sticky='n')
+            labels.append(label)
+
+        ctk.CTkButton(
+            self,
+            text="Reset",
+            width=60,
+            command=lambda: health.reset(engine)
+        ).grid(column=6, row=row, sticky='n')
+
+        self.rows[engine] = labels
+
+    def refresh(self):
+        def seconds(value):
+            return "-" if value is None else f"{value:.2f}s"
+
+        for engine, snapshot in sorted(health.shared_state().items()):
+            if engine not in self.rows:
+                self.add_row(engine)
+
+            state = snapshot.get('state', health.CLOSED)
+            if state == health.OPEN:
+                retry = snapshot['opened_at'] + snapshot['open_seconds'] - time.time()
+                state = f"open, retry in {max(0, int(retry))}s"
+
+            state_label, p50_label, p95_label, errors_label, hedge_label = self.rows[engine]
+            state_label.configure(text=state)
+            p50_label.configure(text=seconds(snapshot.get('p50')))
+            p95_label.configure(text=seconds(snapshot.get('p95')))
+            errors_label.configure(
+                text=f"{snapshot.get('error_rate', 0):.0%} of {snapshot.get('calls', 0)}"
+            )
+
+            hedges = snapshot.get('hedges', 0)
+            if hedges:
+                hedge_label.configure(
+                    text=f"{hedges / snapshot['hedge_renders']:.0%} "
+                    f"({snapshot.get('hedge_wins', 0) / hedges:.0%})"
+                )
+            else:
+                hedge_label.configure(text="-")
+
+        self.after(self.REFRESH, self.refresh)
+
+
 class ConfigurationTab(tk.Frame):
   
     def __init__(self, parent, event_queue, speaking_queue, *args, **kwargs):
@@ -338,6 +444,7 @@ class ConfigurationTab(tk.Frame):
 
         ChannelToEngineMap(self).pack(side="top", fill="x")
         SpeakingToggles(self).pack(side="top", fill="x")
+        EngineHealth(self).pack(side="top", fill="x")
         EngineAuthentication(
             self,
         ).pack(side="top", fill="x")
@@ -0,0 +1,233 @@
+"""
+Long lines, a sentence at a time.
+
+A wall of League chat or a long caption used to go to the engine as one big
+request.  The cloud engines take longer the more you send them, and if any
+part of it fails the whole thing is gone.  ChunkedTTS cuts the message at
+sentence (or clause) boundaries, renders all the pieces at once through the
+engine runtime, and crossfades them back together before the effects see it.
+
+Each piece is cached on its own, so "Thank you!" in the middle of one message
+is free the next time somebody else's message has it too.
+"""
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import re
+
+import numpy as np
+import voicebox
+from voicebox.audio import Audio
+from voicebox.sinks import WaveFile
+from voicebox.tts.utils import get_audio_from_wav_file
+
+import cnv.lib.settings as settings
+from cnv.engines import runtime
+
+log = logging.getLogger(__name__)
+
+# messages shorter than this are one request, same as always
+SPLIT_OVER = 160
+# pieces longer than this get split again at commas and friends
+MAX_CHARS = 200
+# pieces shorter than this get glued to the next one; a request per
+# "Yes." is silly and sounds choppy.
+MIN_CHARS = 40
+# seconds of overlap between pieces
+CROSSFADE_SECONDS = 0.02
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+CLAUSE_END = re.compile(r'(?<=[,;:])\s+')
+
+# the parts of a tts that are about the voice, not about how we talk to it
+NOT_VOICE = ('client', 'api_key')
+
+
+def _split_long(piece):
+    """
+    One sentence that is too long by itself; commas first, then anywhere
+    there is a space.
+    """
+    if len(piece) <= MAX_CHARS:
+        return [piece]
+
+    out = []
+    for clause in CLAUSE_END.split(piece):
+        if len(clause) <= MAX_CHARS:
+            out.append(clause)
+            continue
+
+        words = []
+        for word in clause.split():
+            if words and len(" ".join(words + [word])) > MAX_CHARS:
+                out.append(" ".join(words))
+                words = []
+            words.append(word)
+        if words:
+            out.append(" ".join(words))
+    return out
+
+
+def split(message):
+    """
+    message as a list of pieces worth rendering separately.  Short messages
+    come back as [message].
+    """
+    message = message.strip()
+    if len(message) <= SPLIT_OVER:
+        return [message]
+
+    pieces = []
+    for sentence in SENTENCE_END.split(message):
+        pieces.extend(_split_long(sentence))
+
+    # glue the little ones onto whatever follows them
+    chunks = []
+    carry = ""
+    for piece in pieces:
+        piece = (carry + " " + piece).strip() if carry else piece
+        if len(piece) < MIN_CHARS:
+            carry = piece
+        else:
+            chunks.append(piece)
+            carry = ""
+
+    if carry:
+        if chunks:
+            chunks[-1] = chunks[-1] + " " + carry
+        else:
+            chunks.append(carry)
+
+    return chunks
+
+
+def crossfade(audios):
+    """
+    Join a series of Audio, overlapping CROSSFADE_SECONDS of each one with
+    the next.  Yields Audio as soon as it is final, so it works while the
+    later pieces are still being rendered.
+    """
+    held = None
+    for audio in audios:
+        sample_rate = audio.sample_rate
+        signal = audio.signal
+        overlap = int(CROSSFADE_SECONDS * sample_rate)
+
+        if held is not None:
+            size = min(overlap, len(held), len(signal))
+            ramp = np.linspace(0.0, 1.0, size, endpoint=False)
+            mixed = held[len(held) - size:] * (1 - ramp) + signal[:size] * ramp
+            yield Audio(np.concatenate([held[:len(held) - size], mixed]), sample_rate)
+            signal = signal[size:]
+
+        # hang on to the end of this one to fade into the next
+        keep = min(overlap, len(signal))
+        held = signal[len(signal) - keep:]
+        if len(signal) > keep:
+            yield Audio(signal[:len(signal) - keep], sample_rate)
+
+    if held is not None and len(held):
+        yield Audio(held, sample_rate)
+
+
+class ChunkedTTS(voicebox.tts.TTS):
+    """
+    Wraps any engine's tts.  Messages too short to split go straight through.
+    """
+    def __init__(self, tts, engine_key):
+        self.tts = tts
+        self.engine_key = engine_key
+
+    def voice_key(self):
+        """
+        Everything about the tts that changes what it sounds like.  None if we
+        can't tell, then nothing gets cached.
+        """
+        if not dataclasses.is_dataclass(self.tts):
+            return None
+
+        voice = {
+            field.name: repr(getattr(self.tts, field.name))
+            for field in dataclasses.fields(self.tts)
+            if field.name not in NOT_VOICE
+        }
+        voice['class'] = type(self.tts).__name__
+        return json.dumps(voice, sort_keys=True)
+
+    def chunk_filename(self, voice_key, text):
+        digest = hashlib.sha256(
+            (voice_key + "\n" + text).encode("utf-8")
+        ).hexdigest()[:24]
+        return os.path.join(
+            settings.clip_library_dir(), "chunks", self.engine_key, digest + ".wav"
+        )
+
+    def render(self, chunks):
+        """
+        Generator of Audio for each chunk, in order.  Everything not already
+        cached is sent off at once; a chunk that fails gets one more try on
+        its own before we give up.
+        """
+        voice_key = self.voice_key()
+
+        futures = {}
+        for index, text in enumerate(chunks):
+            if voice_key and os.path.exists(self.chunk_filename(voice_key, text)):
+                continue
+            futures[index] = runtime.submit(runtime.synthesize(self.tts, text))
+
+        for index, text in enumerate(chunks):
+            if index not in futures:
+                log.debug(f'Chunk cache hit: {text!r}')
+                yield get_audio_from_wav_file(self.chunk_filename(voice_key, text))
+                continue
+
+            try:
+                audio = futures[index].result()
+            except Exception as err:
+                log.warning(f'Chunk {text!r} failed ({err}), trying it again')
+                audio = self.tts.get_speech(text)
+
+            if voice_key:
+                filename = self.chunk_filename(voice_key, text)
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                WaveFile(filename).play(audio)
+
+            yield audio
+
+    def get_speech(self, text) -> Audio:
+        chunks = split(text)
+        if len(chunks) == 1:
+            return self.tts.get_speech(text)
+
+        log.debug(f'Rendering {len(chunks)} chunks in parallel')
+        pieces = list(crossfade(self.render(chunks)))
+        return Audio(
+            np.concatenate([piece.signal for piece in pieces]),
+            pieces[0].sample_rate
+        )
+
+    def stream_speech(self, text):
+        """
+        Play the first sentence while the rest are still rendering.  Only
+        when can_stream(self, text) says so.
+        """
+        chunks = split(text)
+        if len(chunks) == 1:
+            yield from self.tts.stream_speech(text)
+            return
+
+        yield from crossfade(self.render(chunks))
+
+
+def can_stream(tts, text):
+    """
+    Will tts.stream_speech(text) hand us audio before all of it is rendered?
+    Every ChunkedTTS has a stream_speech(), but for a one piece message it is
+    only as good as the engine underneath it.
+    """
+    if isinstance(tts, ChunkedTTS):
+        return hasattr(tts.tts, 'stream_speech') or len(split(text)) > 1
+    return hasattr(tts, 'stream_speech')
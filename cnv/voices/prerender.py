@@ -0,0 +1,346 @@
+"""
+Render clips before anybody needs them.
+
+The phrases table already knows what every NPC has said.  The first time a line
+is heard we otherwise sit and wait on a cloud TTS round trip, so while nobody is
+talking this walks the phrases looking for clips that don't exist yet (or are
+older than the character's voice) and renders them.
+
+It is polite about it:
+    * it only works while TightTTS is idle
+    * each engine gets a minimum gap between requests
+    * paid engines get a daily character budget
+    * it comes after live speech for rate limits and quota (engines/quota.py)
+"""
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import pythoncom
+from sqlalchemy import delete, desc, exists, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import cnv.database.models as models
+import cnv.lib.settings as settings
+
+log = logging.getLogger(__name__)
+
+TOGGLE = "Pre-render Clips"
+
+# minimum seconds between pre-render requests to the same engine
+ENGINE_INTERVAL = {
+    'Windows TTS': 0.1,
+    'Amazon Polly': 1.0,
+    'Azure': 1.0,
+    'Google Text-to-Speech': 1.0,
+    'OpenAI': 2.0,
+    'Eleven Labs': 5.0,
+}
+DEFAULT_INTERVAL = 1.0
+
+# these cost money by the character
+PAID_ENGINES = (
+    'Amazon Polly',
+    'Azure',
+    'Eleven Labs',
+    'Google Text-to-Speech',
+    'OpenAI',
+)
+# characters per day, per paid engine, we're willing to spend on clips nobody
+# has asked for yet.  config.json "prerender_budget" overrides it.
+DEFAULT_BUDGET = 10000
+
+# how long things have to be quiet before we start working
+IDLE_SECONDS = 3
+# after a full pass, how long until we look again
+PASS_INTERVAL = 10 * 60
+# send a progress event every this many phrases
+PROGRESS_EVERY = 25
+
+
+def request(*character_ids):
+    """
+    character_ids have new voices, re-render anything older than right now.
+    Safe to call from any process, it is one upsert into prerender_request.
+    """
+    if not character_ids:
+        return
+
+    now = time.time()
+    statement = sqlite_insert(models.PrerenderRequest).values([
+        {'character_id': character_id, 'requested': now}
+        for character_id in character_ids
+    ])
+    with models.db() as session:
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=['character_id'],
+                set_={'requested': statement.excluded.requested}
+            )
+        )
+
+
+def take_requests():
+    """
+    {character_id: timestamp} for every outstanding request, clearing them.
+    One DELETE .. RETURNING, so a request made meanwhile is either in what
+    we return or still waiting for next time.
+    """
+    with models.db() as session:
+        rows = session.execute(
+            delete(models.PrerenderRequest).returning(
+                models.PrerenderRequest.character_id,
+                models.PrerenderRequest.requested
+            )
+        ).all()
+    return {character_id: requested for character_id, requested in rows}
+
+
+def has_requests():
+    with models.db() as session:
+        return session.scalar(select(exists().select_from(models.PrerenderRequest)))
+
+
+class Budget:
+    """
+    Characters sent to each paid engine today, kept in the database so a
+    restart doesn't hand us a fresh budget.
+    """
+    def __init__(self):
+        self.limit = int(
+            settings.get_config_key('prerender_budget', DEFAULT_BUDGET)
+        )
+
+    def spent(self, engine):
+        with models.db() as session:
+            return session.scalar(
+                select(models.PrerenderSpend.characters).where(
+                    models.PrerenderSpend.day == date.today().isoformat(),
+                    models.PrerenderSpend.engine == engine
+                )
+            ) or 0
+
+    def allows(self, engine, characters):
+        if engine not in PAID_ENGINES:
+            return True
+        return self.spent(engine) + characters <= self.limit
+
+    def spend(self, engine, characters):
+        if engine not in PAID_ENGINES:
+            return
+
+        today = date.today().isoformat()
+        statement = sqlite_insert(models.PrerenderSpend).values(
+            day=today,
+            engine=engine,
+            characters=characters
+        )
+        with models.db() as session:
+            session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=['day', 'engine'],
+                    set_={
+                        'characters': models.PrerenderSpend.characters + statement.excluded.characters
+                    }
+                )
+            )
+            # yesterday's budget doesn't matter any more
+            session.execute(
+                delete(models.PrerenderSpend).where(
+                    models.PrerenderSpend.day < today
+                )
+            )
+
+
+def clip_mtime(name, message, category_str):
+    """
+    modification time of the newest clip for this line, or None.
+    """
+    newest = None
+    for rank in ['primary', 'secondary']:
+        wav_fn = settings.get_cachefile(name, message, category_str, rank) + ".wav"
+        try:
+            mtime = os.path.getmtime(wav_fn)
+        except OSError:
+            continue
+        if newest is None or mtime > newest:
+            newest = mtime
+    return newest
+
+
+class PrerenderScheduler(threading.Thread):
+    def __init__(self, event_queue, is_busy):
+        """
+        is_busy() should be True whenever live speech is happening, or about
+        to.
+        """
+        threading.Thread.__init__(self)
+        self.event_queue = event_queue
+        self.is_busy = is_busy
+        self.daemon = True
+        self.budget = Budget()
+        # engine -> time.monotonic() of the last request
+        self.last_request = {}
+        # character_id -> re-render clips older than this
+        self.stale_before = {}
+        self.start()
+
+    def enabled(self):
+        return settings.get_toggle(settings.taggify(TOGGLE))
+
+    def wait_for_idle(self):
+        """
+        Block until nobody has said anything for IDLE_SECONDS.
+        """
+        quiet_since = None
+        while True:
+            if self.is_busy():
+                quiet_since = None
+            elif quiet_since is None:
+                quiet_since = time.monotonic()
+            elif time.monotonic() - quiet_since >= IDLE_SECONDS:
+                return
+            time.sleep(0.25)
+
+    def wait_for_engine(self, engine):
+        interval = ENGINE_INTERVAL.get(engine, DEFAULT_INTERVAL)
+        last = self.last_request.get(engine)
+        if last is not None:
+            remaining = interval - (time.monotonic() - last)
+            if remaining > 0:
+                time.sleep(remaining)
+        self.last_request[engine] = time.monotonic()
+
+    def report(self, **progress):
+        self.event_queue.put(("PRERENDER", progress))
+
+    def find_work(self, session):
+        """
+        Every (phrase, character) worth a look; characters with a fresh
+        voice first, then whoever spoke most recently.
+        """
+        player = models.category_str2int("player")
+        rows = session.execute(
+            select(models.Phrases.id, models.Character).join(
+                models.Character,
+                models.Character.id == models.Phrases.character_id
+            ).where(
+                models.Character.category != player
+            ).order_by(
+                desc(models.Character.last_spoke)
+            )
+        ).all()
+        return sorted(rows, key=lambda row: row[1].id not in self.stale_before)
+
+    def needs_render(self, character, message):
+        mtime = clip_mtime(character.name, message, character.cat_str())
+        if mtime is None:
+            return True
+        stale_before = self.stale_before.get(character.id)
+        return stale_before is not None and mtime < stale_before
+
+    def engine_for(self, character, message):
+        # voice_builder -> engines -> prerender, so this can't be at the top
+        from cnv.engines import health, quota
+        if not health.available(character.engine):
+            return character.engine_secondary
+        if not quota.allows(character.engine, len(message), background=True):
+            return character.engine_secondary
+        return character.engine
+
+    def render(self, character, message, session):
+        import cnv.voices.voice_builder as voice_builder
+        voice_builder.create(character, message, session, background=True)
+
+    def run_pass(self):
+        self.stale_before.update(take_requests())
+
+        with models.db() as session:
+            work = self.find_work(session)
+            total = len(work)
+            rendered = 0
+            skipped = 0
+            # characters with a new voice that still have an old clip
+            unfinished = set()
+            log.info(f'Pre-render pass over {total} phrases')
+
+            for index, (phrase_id, character) in enumerate(work):
+                if not self.enabled():
+                    log.info('Pre-rendering disabled, stopping this pass')
+                    unfinished.update(
+                        row[1].id for row in work[index:]
+                        if row[1].id in self.stale_before
+                    )
+                    break
+
+                if index % PROGRESS_EVERY == 0:
+                    self.report(
+                        state="running", checked=index, total=total,
+                        rendered=rendered, skipped=skipped,
+                        character=character.name
+                    )
+
+                message, _ = models.get_translated(phrase_id)
+                if not self.needs_render(character, message):
+                    continue
+
+                engine = self.engine_for(character, message)
+                if not self.budget.allows(engine, len(message)):
+                    skipped += 1
+                    unfinished.add(character.id)
+                    continue
+
+                self.wait_for_idle()
+                self.wait_for_engine(engine)
+
+                try:
+                    self.render(character, message, session)
+                except Exception as err:
+                    log.error(f'Pre-render of {character.name}: {message!r} failed: {err}')
+                    unfinished.add(character.id)
+                    continue
+
+                # create() can skip a line without raising, when no engine
+                # would take it
+                if self.needs_render(character, message):
+                    unfinished.add(character.id)
+                    continue
+
+                self.budget.spend(engine, len(message))
+                rendered += 1
+
+        # a character whose clips were all re-rendered is done.  Anybody we
+        # skipped, or didn't get to, stays for the next pass; edits made while
+        # we were working are still waiting in prerender_request.
+        self.stale_before = {
+            character_id: requested
+            for character_id, requested in self.stale_before.items()
+            if character_id in unfinished
+        }
+        self.report(
+            state="idle", checked=total, total=total,
+            rendered=rendered, skipped=skipped, character=None,
+            finished=datetime.now().isoformat(timespec="seconds")
+        )
+
+    def run(self):
+        log.info('Pre-render scheduler is running')
+        # Windows TTS wants this in every thread that uses it
+        pythoncom.CoInitialize()
+
+        while True:
+            if self.enabled():
+                try:
+                    self.run_pass()
+                except Exception as err:
+                    log.error(f'Pre-render pass failed: {err}')
+
+            # sleep until the next pass, or until somebody edits a voice
+            waited = 0
+            while waited < PASS_INTERVAL:
+                time.sleep(5)
+                waited += 5
+                if has_requests():
+                    break
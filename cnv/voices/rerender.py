@@ -0,0 +1,301 @@
+"""
+Re-render everything a character has ever said.
+
+After a voice edit every clip we have for that character is stale, and
+TightTTS will happily keep playing the old primary (or secondary) file.  A
+RerenderJob throws those clips away and renders every phrase again.  Same
+thing for a whole group at once after apply_group_preset().
+
+The rendering happens in a small pool of worker processes.  The engines are
+still tk widgets, so they can't share the GUI thread; each worker process
+makes its own (hidden) tk root for them.  The workers run at below normal
+priority so live speech always wins.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+import tkinter as tk
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from sqlalchemy import select
+
+import cnv.database.models as models
+import cnv.lib.settings as settings
+
+log = logging.getLogger(__name__)
+
+# config.json "rerender_workers" overrides it
+DEFAULT_WORKERS = 3
+
+# character_id (or "group:<group_name>") -> RerenderJob, at most one each
+JOBS = {}
+JOBS_LOCK = threading.Lock()
+
+
+def clip_files(name, message, category_str):
+    """
+    every file that could be holding audio for this line
+    """
+    for rank in ['primary', 'secondary']:
+        cachefile = settings.get_cachefile(name, message, category_str, rank)
+        for extension in ['.wav', '.mp3']:
+            yield cachefile + extension
+
+
+def invalidate(name, message, category_str):
+    """
+    Delete any clips of this line.  Returns how many files were removed.
+    """
+    removed = 0
+    for filename in clip_files(name, message, category_str):
+        try:
+            os.unlink(filename)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as err:
+            # probably being played right now
+            log.warning(f'Could not remove {filename}: {err}')
+    return removed
+
+
+def _worker_init():
+    """
+    Runs once in each worker process.  The engines are tk widgets with tk
+    variables, they need a root.  Left to itself tkinter would make a default
+    one the first time an engine is built, and show it.
+    """
+    root = tk.Tk()
+    root.withdraw()
+
+    if sys.platform == "win32":
+        import pythoncom
+        import win32api
+        import win32process
+
+        win32process.SetPriorityClass(
+            win32api.GetCurrentProcess(),
+            win32process.BELOW_NORMAL_PRIORITY_CLASS
+        )
+        # Windows TTS wants this
+        pythoncom.CoInitialize()
+    else:
+        os.nice(10)
+
+
+def _render_phrase(character_id, phrase_id):
+    """
+    Runs in a worker process.  Returns (phrase_id, error), error is None when
+    it worked.
+    """
+    # voice_builder -> engines -> prerender -> ..., keep it out of module scope
+    import cnv.voices.voice_builder as voice_builder
+
+    try:
+        message, _ = models.get_translated(phrase_id)
+        with models.db() as session:
+            character = session.get(models.Character, character_id)
+            voice_builder.create(character, message, session, background=True)
+    except Exception as err:
+        return phrase_id, str(err)
+    return phrase_id, None
+
+
+class RerenderJob(threading.Thread):
+    """
+    Lives in whatever process started it, farms the actual rendering out to
+    worker processes.  Poll progress() to find out how it is going.
+    """
+    def __init__(self, character_ids, workers=None, job_key=None, name=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.character_ids = list(character_ids)
+        self.job_key = job_key if job_key is not None else self.character_ids[0]
+        self.workers = workers or int(
+            settings.get_config_key('rerender_workers', DEFAULT_WORKERS)
+        )
+        self.cancelled = threading.Event()
+        self.state = "starting"
+        # a group job is named after the group, one character after them
+        self.character_name = name
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.started = None
+        self.start()
+
+    def cancel(self):
+        """
+        Stop handing out work.  Anything a worker is already rendering will
+        finish, everything else is left for live speech to render on demand.
+        """
+        self.cancelled.set()
+
+    def rate(self):
+        """
+        phrases per second since rendering started, None before that
+        """
+        if not self.started or not self.done:
+            return None
+        return self.done / max(time.monotonic() - self.started, 0.001)
+
+    def progress(self):
+        rate = self.rate()
+        eta = None
+        if rate and self.state == "running":
+            eta = (self.total - self.done) / rate
+
+        return {
+            'state': self.state,
+            'characters': len(self.character_ids),
+            'name': self.character_name,
+            'total': self.total,
+            'done': self.done,
+            'failed': self.failed,
+            'rate': rate,
+            'eta': eta,
+        }
+
+    def find_phrases(self):
+        """
+        [(character_id, phrase_id, name, category_str, message)] for
+        everything these characters have said
+        """
+        with models.db() as session:
+            rows = session.execute(
+                select(
+                    models.Phrases.character_id,
+                    models.Phrases.id,
+                    models.Character.name,
+                    models.Character.category,
+                ).join(
+                    models.Character,
+                    models.Character.id == models.Phrases.character_id
+                ).where(
+                    models.Phrases.character_id.in_(self.character_ids),
+                    models.Phrases.text != ""
+                )
+            ).all()
+
+            if self.character_name is None:
+                character = session.get(models.Character, self.character_ids[0])
+                self.character_name = character.name
+
+        phrases = []
+        for character_id, phrase_id, name, category in rows:
+            message, _ = models.get_translated(phrase_id)
+            phrases.append((
+                character_id,
+                phrase_id,
+                name,
+                models.category_int2str(category),
+                message
+            ))
+        return phrases
+
+    def run(self):
+        try:
+            self.state = "invalidating"
+            phrases = self.find_phrases()
+            self.total = len(phrases)
+
+            # throw away the old clips first.  If we get cancelled halfway
+            # the leftovers get rendered fresh the next time they are spoken,
+            # nobody hears the old voice.
+            for _, _, name, category_str, message in phrases:
+                invalidate(name, message, category_str)
+
+            log.info(
+                f'Re-rendering {self.total} phrases for {self.character_name} '
+                f'({len(self.character_ids)} characters)'
+            )
+            self.state = "running"
+            self.started = time.monotonic()
+            self.render(phrases)
+        except Exception as err:
+            log.error(f'Re-render of {self.job_key} failed: {err}')
+            self.state = "failed"
+            return
+        finally:
+            with JOBS_LOCK:
+                if JOBS.get(self.job_key) is self:
+                    del JOBS[self.job_key]
+
+        self.state = "cancelled" if self.cancelled.is_set() else "finished"
+        rate = self.rate()
+        log.info(
+            f'Re-render of {self.character_name} {self.state}: '
+            f'{self.done}/{self.total} ({self.failed} failed)'
+            + (f', {rate:.2f} phrases/s' if rate else '')
+        )
+
+    def render(self, phrases):
+        pending = iter(phrases)
+        running = set()
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_worker_init
+        ) as pool:
+            while True:
+                # keep every worker busy, but no more than that.  Queueing
+                # everything up front would make cancel() wait on all of it.
+                while not self.cancelled.is_set() and len(running) < self.workers:
+                    phrase = next(pending, None)
+                    if phrase is None:
+                        break
+                    running.add(
+                        pool.submit(_render_phrase, phrase[0], phrase[1])
+                    )
+
+                if not running:
+                    return
+
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    phrase_id, error = future.result()
+                    if error:
+                        log.warning(f'Re-render of phrase {phrase_id} failed: {error}')
+                        self.failed += 1
+                    self.done += 1
+
+
+def start(character_id, workers=None):
+    """
+    Re-render everything character_id has said.  If a job is already running
+    for them you get that one back instead of a second one.
+    """
+    with JOBS_LOCK:
+        job = JOBS.get(character_id)
+        if job is None:
+            job = RerenderJob([character_id], workers=workers)
+            JOBS[character_id] = job
+    return job
+
+
+def start_group(group_name, character_ids, workers=None):
+    """
+    Re-render everything said by character_ids, the members of group_name.
+    One job per group, same as start().  None if there is nobody to do.
+    """
+    if not character_ids:
+        return None
+
+    job_key = f"group:{group_name}"
+    with JOBS_LOCK:
+        job = JOBS.get(job_key)
+        if job is None:
+            job = RerenderJob(
+                character_ids,
+                workers=workers,
+                job_key=job_key,
+                name=group_name
+            )
+            JOBS[job_key] = job
+    return job
+
+
+def get_job(character_id):
+    return JOBS.get(character_id)
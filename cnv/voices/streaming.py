@@ -0,0 +1,214 @@
+"""
+Start talking before the clip is finished.
+
+Normally the whole line is rendered, run through the effects, written to the
+cache and only then played.  For a long caption that is a long silence.  When
+the engine can hand us audio as it arrives (tts.stream_speech()) and every
+effect can work a piece at a time, each piece goes through the effects and
+straight to the pygame channel.  The whole clip still lands in the cache at
+the end, exactly like it would have.
+
+Effects that need to see the whole clip at once (normalize, glitch, the
+vocoder..) can't stream; those voices quietly use the old way.
+"""
+import logging
+import time
+from math import gcd
+
+import numpy as np
+import pygame
+from scipy.signal import resample_poly, sosfilt
+from voicebox.audio import Audio
+from voicebox.effects import Filter, PedalboardEffect
+
+log = logging.getLogger(__name__)
+
+TOGGLE = "Streaming Speech"
+
+# seconds of audio to collect before handing it to pygame.  The first block is
+# small so we start talking quickly, after that we're only trying to stay
+# ahead of the playback.
+FIRST_BLOCK = 0.2
+BLOCK = 0.5
+
+
+class PluginStep:
+    """
+    A pedalboard plugin that keeps its state between pieces of audio.
+    """
+    def __init__(self, plugin):
+        self.plugin = plugin
+        # samples the plugin took but hasn't given back yet
+        self.pending = 0
+
+    def process(self, signal, sample_rate):
+        out = self.plugin.process(
+            signal.astype(np.float32), sample_rate, reset=False
+        ).reshape(-1)
+        self.pending += len(signal) - len(out)
+        return out
+
+    def flush(self, sample_rate):
+        """
+        Whatever the plugin is still holding.  Same trick as the chorus docs:
+        feed it silence with reset=True and it gives the rest back.
+        """
+        if self.pending <= 0:
+            self.plugin.reset()
+            return np.zeros(0, dtype=np.float32)
+
+        out = self.plugin.process(
+            np.zeros(self.pending, dtype=np.float32), sample_rate, reset=True
+        ).reshape(-1)
+        self.pending = 0
+        return out
+
+
+class FilterStep:
+    """
+    A voicebox IIR filter, carrying the filter state from one piece to the
+    next so the seams don't click.
+    """
+    def __init__(self, filter_param_builder):
+        self.filter_param_builder = filter_param_builder
+        self.sos = None
+        self.zi = None
+
+    def process(self, signal, sample_rate):
+        if self.sos is None:
+            self.sos = self.filter_param_builder.build(sample_rate)
+            self.zi = np.zeros((self.sos.shape[0], 2))
+
+        out, self.zi = sosfilt(self.sos, signal, zi=self.zi)
+        return out
+
+    def flush(self, sample_rate):
+        return np.zeros(0, dtype=np.float32)
+
+
+class StreamingEffects:
+    """
+    The effect chain, one piece at a time.
+    """
+    def __init__(self, steps):
+        self.steps = steps
+
+    @classmethod
+    def build(cls, effects):
+        """
+        None if any of these effects can't stream.
+        """
+        steps = []
+        for effect in effects:
+            if isinstance(effect, PedalboardEffect):
+                steps.append(PluginStep(effect.plugin))
+            elif isinstance(effect, Filter):
+                steps.append(FilterStep(effect.filter_param_builder))
+            else:
+                log.debug(f'{effect} can not stream')
+                return None
+        return cls(steps)
+
+    def process(self, audio: Audio) -> Audio:
+        signal = audio.signal
+        for step in self.steps:
+            if len(signal) == 0:
+                break
+            signal = step.process(signal, audio.sample_rate)
+        return audio.copy(signal=signal)
+
+    def flush(self, sample_rate) -> Audio:
+        """
+        The tail end every step was holding on to, run through the steps
+        after it.
+        """
+        tail = np.zeros(0, dtype=np.float32)
+        for step in self.steps:
+            if len(tail):
+                tail = step.process(tail, sample_rate)
+            tail = np.concatenate([tail, step.flush(sample_rate)])
+        return Audio(tail, sample_rate)
+
+
+class ChannelFeeder:
+    """
+    Collects audio into blocks and queues them on a pygame channel.
+    """
+    def __init__(self, channel, started=None):
+        self.channel = channel
+        # when somebody started waiting for this line, for time-to-first-audio
+        self.started = started or time.monotonic()
+        self.first_audio = None
+        self.buffered = []
+        self.buffered_samples = 0
+        self.sample_rate = None
+
+    def __call__(self, audio: Audio):
+        if len(audio) == 0:
+            return
+
+        self.sample_rate = audio.sample_rate
+        self.buffered.append(audio.signal)
+        self.buffered_samples += len(audio)
+
+        block = FIRST_BLOCK if self.first_audio is None else BLOCK
+        if self.buffered_samples >= block * self.sample_rate:
+            self.send()
+
+    def finish(self):
+        if self.buffered:
+            self.send()
+
+    def send(self):
+        signal = np.concatenate(self.buffered)
+        self.buffered = []
+        self.buffered_samples = 0
+
+        # pygame plays a buffer exactly as it is; it has to already be in
+        # the mixer's rate, sample format and channel count.
+        frequency, _, channels = pygame.mixer.get_init()
+        if self.sample_rate != frequency:
+            divisor = gcd(frequency, self.sample_rate)
+            signal = resample_poly(
+                signal, frequency // divisor, self.sample_rate // divisor
+            )
+
+        samples = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+        if channels > 1:
+            samples = np.repeat(samples[:, np.newaxis], channels, axis=1)
+        sound = pygame.sndarray.make_sound(np.ascontiguousarray(samples))
+
+        # one sound playing, one queued.  Wait for a spot.
+        while self.channel.get_queue():
+            pygame.time.wait(10)
+        self.channel.queue(sound)
+
+        if self.first_audio is None:
+            self.first_audio = time.monotonic() - self.started
+
+
+def speak(tts, message, effects: StreamingEffects, sink, play: ChannelFeeder):
+    """
+    Render message with tts, playing it as it arrives.  sink gets the entire
+    clip once we have all of it.
+    """
+    processed = []
+    sample_rate = None
+
+    for chunk in tts.stream_speech(message):
+        sample_rate = chunk.sample_rate
+        audio = effects.process(chunk)
+        if len(audio):
+            processed.append(audio.signal)
+            play(audio)
+
+    if sample_rate is None:
+        raise RuntimeError(f'No audio came back for {message!r}')
+
+    tail = effects.flush(sample_rate)
+    if len(tail):
+        processed.append(tail.signal)
+        play(tail)
+    play.finish()
+
+    sink.play(Audio(np.concatenate(processed), sample_rate))
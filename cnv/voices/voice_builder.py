@@ -1,16 +1,25 @@
 import logging
 import os
+import queue
 import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
 
 import pyfiglet
+import pythoncom
 from sqlalchemy import select
 from voicebox.sinks import Distributor, WaveFile
 
 import cnv.database.models as models
 import cnv.lib.settings as settings
-from cnv.effects.base import registry as effect_registry
+from cnv.database import search
+from cnv.effects.base import fuse_effects, registry as effect_registry
 from cnv.engines.base import registry as engine_registry
 from cnv.engines.base import USE_SECONDARY
+from cnv.engines import health, quota
+from cnv.voices import chunker
 
 
 
@@ -18,14 +27,98 @@ log = logging.getLogger(__name__)
 
 PLAYER_CATEGORY = models.category_str2int("player")
 
-# I'm actually a little curious to see exactly how this will behave.  From npcChatter this is being called in
-# a subprocess, but when the editor triggers it we are in a thread.  The thread dies, the new thread doesn't know
-# ENGINE_OVERRIDE has been triggered and we keep smacking elevenlabs even though we've run out of credits.
+HEDGE_TOGGLE = "Hedge Slow Engines"
 
-ENGINE_OVERRIDE = {}
+class RenderLock:
+    """
+    A re-entrant lock where live speech goes first.  Whenever it comes free, a
+    live line waiting for it gets it before any background work does; the
+    pre-renderer runs in the same process as live speech.
+
+        with RENDER_LOCK.hold(background):
+            ...
+    """
+    def __init__(self):
+        self._changed = threading.Condition()
+        self._owner = None
+        self._depth = 0
+        self._live_waiting = 0
+
+    def _free_for(self, thread, background):
+        if self._owner is thread:
+            return True
+        if self._owner is not None:
+            return False
+        return not background or self._live_waiting == 0
+
+    @contextmanager
+    def hold(self, background=False):
+        thread = threading.current_thread()
+        with self._changed:
+            if not background:
+                self._live_waiting += 1
+            try:
+                self._changed.wait_for(lambda: self._free_for(thread, background))
+            finally:
+                if not background:
+                    self._live_waiting -= 1
+            self._owner = thread
+            self._depth += 1
+        try:
+            yield
+        finally:
+            with self._changed:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._owner = None
+                    self._changed.notify_all()
 
 
-def create(character, message, session):
+# live speech and the pre-renderer both come through here from different
+# threads, and the engines (and effect editors) are still tk widgets.  Building
+# them, and reading their settings into a tts, holds this.  Nothing else does:
+# once we have the tts and the effects, rendering doesn't need tk, and a slow
+# engine shouldn't hold up everybody else.
+RENDER_LOCK = RenderLock()
+
+# seconds a hedged line waits for either engine before it gives up on
+# playing it.  Whatever finishes after that is still cached for next time.
+HEDGE_TIMEOUT = 30
+
+
+def say(engine_instance, message, effect_list, sink, play=None, tts=None):
+    """
+    Returns True if the audio was streamed to play() while it rendered.
+    """
+    if play is not None and engine_instance.say_streaming(
+        message, effect_list, sink, play, tts=tts
+    ):
+        return True
+
+    engine_instance.say(message, effect_list, sink=sink, tts=tts)
+    return False
+
+
+def tracked_say(engine_name, engine_instance, message, effect_list, sink, play=None, tts=None):
+    """
+    say(), letting engine health know how it went.
+    """
+    started = time.monotonic()
+    try:
+        streamed = say(engine_instance, message, effect_list, sink, play, tts=tts)
+    except Exception:
+        health.failure(engine_name)
+        raise
+
+    # a streamed clip took as long as it took to play, that isn't latency
+    health.success(
+        engine_name,
+        None if streamed else time.monotonic() - started
+    )
+    return streamed
+
+
+def create(character, message, session, play=None, hedge=False, background=False):
     """
     This NPC exists in our database but we don't
     have this particular message rendered.
@@ -37,29 +130,28 @@ def create(character, message, session):
        the npc_id
     2. Render message based on that data
     3. persist as an mp3 in cachefile
+
+    play is an optional streaming.ChannelFeeder, when the engine and effects
+    allow it the audio goes there while it is still being rendered.  Returns
+    True if that happened, False if the caller still needs to play the
+    cachefile.
+
+    hedge lets a slow primary engine race the secondary, see hedged().
+    background is for anybody who isn't live speech (the pre-renderer,
+    re-render jobs); they come second on rate limits and quota.
     """
-    global ENGINE_OVERRIDE
     log.debug(f'voice_builder.create({character=}, {message=})')
-    
-    voice_effects = session.scalars(
-        select(models.Effects).where(
-            models.Effects.character_id == character.id
-        )
-    ).all()
-    
-    effect_list = []
-    for effect in voice_effects:
-        log.debug(f'Adding effect {effect} found in the database')
-        effect_class = effect_registry.get_effect(effect.effect_name)
-        effect_instance = effect_class(None)
 
-        effect_instance.effect_id.set(effect.id)
-        effect_instance.load()  # load the DB config for this effect
-
-        effect_list.append(effect_instance.get_effect())
+    effect_list = build_effects(character, session, background)
 
+    # if the primary engine has been failing, or we're out of quota for it, we
+    # don't even try it.  See engines/health.py and engines/quota.py.  This
+    # only looks; the breaker's probe is claimed in build_engine(), once we
+    # know we are really going to call the engine.
     rank = 'primary'
-    if ENGINE_OVERRIDE.get(character.engine, False):
+    if not quota.allows(character.engine, len(message), background):
+        rank = 'secondary'
+    elif not health.available(character.engine):
         rank = 'secondary'
 
     # have we seen this particular phrase before?
@@ -87,91 +179,336 @@ def create(character, message, session):
     #     #     SimpleAudioDevice()
     #     # ])
     #     save = False 
+
+    # somebody else who sounds exactly like this character may have already
+    # said it.  No engine, no quota.
+    engine_name = character.engine if rank == 'primary' else secondary_engine(character)
+    if reuse_clip(character, message, rank, engine_name, session):
+        return False
     
-    name = character.name
-    category = character.category
-    
-    # character.engine may already have a value.  It probably does.  We're over-writing it
-    # with anything we have in the dict ENGINE_OVERRIDE.  But if we don't have anything, you can keep
-    # your previous value and carry on.
+    if rank == 'primary' and hedge:
+        budget = health.hedge_budget(character.engine)
+        if budget is not None:
+            return hedged(character, message, effect_list, budget, session, background)
 
     try:
         if rank == 'secondary':
             raise USE_SECONDARY
-        
-        cachefile = settings.get_cachefile(
-            character.name, 
-            message, 
-            character.cat_str(),
-            rank
-        )
-
-        #if save:
-        sink = Distributor([
-            #SimpleAudioDevice(),
-            WaveFile(cachefile + '.wav')
-        ])
-        # else:
-        #     sink = Distributor([
-        #         SimpleAudioDevice()
-        #     ])
 
         log.debug(f'Using engine: {character.engine}')
-        
+
         # every character gets a primary engine config, even if it's os TTS.
-        engine = engine_registry.get_engine(character.engine)
-
-        #TTSEngine.__init__(self, parent, rank, name, category, *args, **kwargs):
-        engine(
-            None, 
-            'primary', 
-            name, 
-            category
-        ).say(
-            message, 
-            effect_list, 
-            sink=sink
-        )
+        return render(character, 'primary', character.engine, message, effect_list, play, background=background)
 
     except USE_SECONDARY:
-        rank = 'secondary'
-        # our chosen engine for this character isn't working.  So we're going to switch
-        # to the secondary and use that for the rest of this session.
-        ENGINE_OVERRIDE[character.engine] = True
+        # our chosen engine for this character isn't working (or hasn't been
+        # lately), so this one comes from the secondary.
         log.debug("\n" + pyfiglet.figlet_format(
                 "Engaging\nSecondary\nEngine", 
                 font="3d_diagonal", width=120
             )
         )
-        
-        # new rank, new cachefile
-        cachefile = settings.get_cachefile(
-            character.name, 
-            message, 
+        return fallback(character, message, effect_list, play, background=background)
+     
+        # End result: cachefile + ".wav" exists, for at least one of primary/secondary.
+
+
+def build_effects(character, session, background=False):
+    """
+    character's effects, ready to use.  The effect editors are tk widgets, they
+    are built under RENDER_LOCK.
+    """
+    voice_effects = session.scalars(
+        select(models.Effects).where(
+            models.Effects.character_id == character.id
+        )
+    ).all()
+    
+    effect_list = []
+    with RENDER_LOCK.hold(background):
+        for effect in voice_effects:
+            log.debug(f'Adding effect {effect} found in the database')
+            effect_class = effect_registry.get_effect(effect.effect_name)
+            effect_instance = effect_class(None)
+
+            effect_instance.effect_id.set(effect.id)
+            effect_instance.load()  # load the DB config for this effect
+
+            effect_list.append(effect_instance.get_effect())
+
+    # each run of pedalboard effects becomes one Pedalboard
+    return fuse_effects(effect_list)
+
+
+def secondary_engine(character):
+    if character.engine_secondary:
+        # use the secondary engine config defined for this character
+        return character.engine_secondary
+
+    # use the global default secondary engine
+    return settings.get_config_key(f"{character.category}_engine_secondary")
+
+
+def reuse_clip(character, message, rank, engine_name, session):
+    """
+    Copy another character's clip of exactly this message into our cachefile
+    for rank, if they use the same engine, engine settings and effects that
+    we do.  True if we did.
+    """
+    try:
+        found = search.find_clips(
+            message,
+            exclude_character_id=character.id,
+            rank=rank,
+            session=session
+        )
+    except Exception as err:
+        log.warning(f'Could not look for a clip to reuse: {err}')
+        return False
+
+    signature = None
+    for hit, clip in found:
+        other = session.get(models.Character, hit.character_id)
+        if other is None:
+            continue
+
+        other_engine = other.engine if rank == 'primary' else secondary_engine(other)
+        if other_engine != engine_name:
+            continue
+
+        if signature is None:
+            signature = search.voice_signature(session, character.id, rank)
+        if search.voice_signature(session, other.id, rank) != signature:
+            continue
+
+        wav_fn = settings.get_cachefile(
+            character.name,
+            message,
             character.cat_str(),
             rank
+        ) + '.wav'
+        try:
+            shutil.copyfile(clip, wav_fn + '.part')
+            os.replace(wav_fn + '.part', wav_fn)
+        except OSError as err:
+            log.warning(f'Could not reuse {clip}: {err}')
+            continue
+
+        log.info(f'{character.name} is reusing what {other.name} said: {message!r}')
+        return True
+    return False
+
+
+def fallback(character, message, effect_list, play=None, background=False):
+    """
+    render() with the secondary engine.  If that says no too there is nowhere
+    left to go, the line is skipped.
+    """
+    engine_name = secondary_engine(character)
+    try:
+        return render(character, 'secondary', engine_name, message, effect_list, play, background=background)
+    except USE_SECONDARY:
+        log.warning(f'{engine_name} can not say {message!r} right now either, skipping it')
+        return False
+
+
+def requests_for(engine, message):
+    """
+    How many requests message is to engine; a chunked engine sends each
+    piece as its own.
+    """
+    return len(chunker.split(message)) if engine.chunked else 1
+
+
+def build_engine(character, rank, engine_name, message, background=False):
+    """
+    Spend engine_name's quota for message and build the engine.  Returns
+    (engine, tts), tts being the engine's get_chunked_tts().  Engines are tk
+    widgets, they are built under RENDER_LOCK.
+
+    Raises USE_SECONDARY without building anything if its rate limit or
+    quota says no.  For the primary, the last thing it does is ask
+    health.allow(), which may hand us the breaker's probe; whoever gets the
+    engine back has to call it, tracked_say() reports how that went.
+    """
+    engine = engine_registry.get_engine(engine_name)
+    requests = requests_for(engine, message)
+    if not quota.acquire(engine_name, len(message), requests, background):
+        raise USE_SECONDARY
+
+    try:
+        with RENDER_LOCK.hold(background):
+            #TTSEngine.__init__(self, parent, rank, name, category, *args, **kwargs):
+            engine_instance = engine(None, rank, character.name, character.category)
+            tts = engine_instance.get_chunked_tts()
+    except Exception:
+        quota.refund(engine_name, len(message), requests)
+        raise
+
+    if rank == 'primary' and not health.allow(engine_name):
+        # somebody else got the probe since we looked
+        quota.refund(engine_name, len(message), requests)
+        raise USE_SECONDARY
+    return engine_instance, tts
+
+
+def render(character, rank, engine_name, message, effect_list, play=None, partial=False, background=False):
+    """
+    Render message with engine_name into the cachefile for rank.  partial
+    writes it somewhere else first and moves it into place when it is
+    complete, for when somebody might be looking for that cachefile while
+    we're still writing it.
+
+    Raises USE_SECONDARY without calling the engine if its rate limit or
+    quota says no, or if the engine fails.  Anything else the engine raises
+    comes out as is.  Either way the quota it reserved is given back.
+    """
+    engine_instance, tts = build_engine(character, rank, engine_name, message, background)
+    return speak(
+        character, rank, engine_name, engine_instance, message, effect_list,
+        play=play, partial=partial, tts=tts
+    )
+
+
+def speak(character, rank, engine_name, engine_instance, message, effect_list, play=None, partial=False, tts=None):
+    """
+    The rest of render(), once the engine is built.  tts is from
+    build_engine(); with it this doesn't touch tk, and it runs without
+    RENDER_LOCK.
+    """
+    cachefile = settings.get_cachefile(
+        character.name, 
+        message, 
+        character.cat_str(),
+        rank
+    )
+    wav_fn = cachefile + '.wav'
+
+    #if save:
+    sink = Distributor([
+        #SimpleAudioDevice(),
+        WaveFile(wav_fn + '.part' if partial else wav_fn)
+    ])
+    # else:
+    #     sink = Distributor([
+    #         SimpleAudioDevice()
+    #     ])
+
+    try:
+        streamed = tracked_say(
+            engine_name,
+            engine_instance,
+            message,
+            effect_list,
+            sink,
+            play,
+            tts=tts
+        )
+    except Exception:
+        # the engine never got to (or couldn't) say it, that shouldn't count
+        quota.refund(
+            engine_name,
+            len(message),
+            requests_for(engine_instance, message)
         )
+        if partial and os.path.exists(wav_fn + '.part'):
+            os.unlink(wav_fn + '.part')
+        raise
 
-        # new cachefile, new sink.
-        #if save:
-        sink = Distributor([
-            #SimpleAudioDevice(),
-            WaveFile(cachefile + '.wav')
-        ])
-        # else:
-        #     sink = Distributor([
-        #         SimpleAudioDevice()
-        #     ])
-
-        if character.engine_secondary:
-            # use the secondary engine config defined for this character
-            engine_instance = engine_registry.get_engine(character.engine_secondary)
-            engine_instance(None, 'secondary', name, category).say(message, effect_list, sink=sink)
-        else:
-            # use the global default secondary engine
-            engine_name = settings.get_config_key(f"{character.category}_engine_secondary")
-            engine_instance = engine_registry.get_engine(engine_name)
-            engine_instance(None, 'secondary', name, category).say(message, effect_list, sink=sink)
-     
-        # End result: cachefile + ".wav" exists, for at least one of primary/secondary.
+    if partial:
+        os.replace(wav_fn + '.part', wav_fn)
+    return streamed
+
+
+def hedged(character, message, effect_list, budget, session, background=False):
+    """
+    The primary engine gets budget seconds to itself.  If it isn't done by
+    then the secondary starts too and whichever finishes first is what gets
+    played.  The other one keeps going and gets cached under its own rank
+    like always.  If neither is done within HEDGE_TIMEOUT we stop waiting,
+    live speech has other lines to get to.
+
+    Each side's engine, tts and effects are built here (under RENDER_LOCK,
+    see build_engine()); the rendering happens in its own thread and the
+    waiting doesn't hold anything.
+
+    Hedged lines don't stream, two engines can't both be talking into the
+    same channel.
+    """
+    secondary = secondary_engine(character)
+    finished = queue.Queue()
+
+    def attempt(rank, engine_name, engine_instance, tts, effects):
+        # Windows TTS wants this in every thread that uses it
+        pythoncom.CoInitialize()
+        try:
+            speak(
+                character, rank, engine_name, engine_instance, message,
+                effects, partial=True, tts=tts
+            )
+            finished.put((rank, True))
+        except Exception as err:
+            log.warning(f'Hedged {rank} render with {engine_name} failed: {err}')
+            finished.put((rank, False))
+        finally:
+            pythoncom.CoUninitialize()
+
+    def start(rank, engine_name, effects):
+        engine_instance, tts = build_engine(character, rank, engine_name, message, background)
+        threading.Thread(
+            target=attempt,
+            args=(rank, engine_name, engine_instance, tts, effects),
+            name=f"hedge-{rank}",
+            daemon=True
+        ).start()
+
+    try:
+        start('primary', character.engine, effect_list)
+    except USE_SECONDARY:
+        return fallback(character, message, effect_list, background=background)
+
+    try:
+        rank, ok = finished.get(timeout=budget)
+    except queue.Empty:
+        rank = None
+
+    if rank is not None:
+        health.hedge_result(character.engine, hedged=False)
+        if ok:
+            return False
+        # it didn't take long to fail; plain old failover
+        return fallback(character, message, effect_list, background=background)
+
+    log.info(
+        f'{character.engine} has taken more than {budget:.2f}s, '
+        f'starting {secondary} too'
+    )
+    running = 1
+    try:
+        # the primary is still using effect_list, the secondary gets its own
+        start('secondary', secondary, build_effects(character, session, background))
+        running += 1
+    except USE_SECONDARY:
+        log.info(f'{secondary} is rate limited, waiting on {character.engine}')
+
+    deadline = time.monotonic() + HEDGE_TIMEOUT
+    for _ in range(running):
+        try:
+            rank, ok = finished.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            log.error(
+                f'Gave up on {message!r} after {HEDGE_TIMEOUT}s, '
+                f'whatever finishes will be cached for next time'
+            )
+            return False
+
+        if ok:
+            health.hedge_result(
+                character.engine,
+                hedged=True,
+                won=rank == 'secondary'
+            )
+            return False
 
+    log.error(f'Neither {character.engine} nor {secondary} could say {message!r}')
+    return False
@@ -13,15 +13,22 @@ from sqlalchemy import delete, desc, select
 from translate import Translator
 from voicebox.sinks import Distributor, SoundDevice, WaveFile
 
-from cnv.database import db, models
+from cnv.database import db, models, search
 from cnv.effects import registry
+from cnv.effects.base import fuse_effects
 from cnv.engines.base import USE_SECONDARY
 from cnv.engines import registry as engine_registry
+from cnv.engines import health
 from cnv.lib import settings
 from cnv.lib.gui import Feather
+from cnv.voices import prerender, rerender
 
 log = logging.getLogger(__name__)
-ENGINE_OVERRIDE = {}
+
+# milliseconds to wait for more changes before refreshing the character list
+REFRESH_DELAY = 250
+# most phrases the phrase search will offer
+PHRASE_SEARCH_LIMIT = 100
 
 
 
@@ -80,6 +87,23 @@ class WavfileMajorFrame(ctk.CTkFrame):
         self.spec = None
         self.canvas = None
 
+        # narrow the phrase list down to what matches, see database/search.py
+        search_frame = ctk.CTkFrame(self)
+        ctk.CTkLabel(
+            search_frame,
+            text="Search",
+            anchor="e"
+        ).pack(side="left", padx=5)
+
+        self.pending_filter = None
+        self.phrase_filter = tk.StringVar(value="")
+        self.phrase_filter.trace_add('write', self.apply_phrase_filter)
+        ctk.CTkEntry(
+            search_frame,
+            textvariable=self.phrase_filter
+        ).pack(side="left", fill="x", expand=True)
+        search_frame.pack(side="top", expand=True, fill="x")
+
         frame = ctk.CTkFrame(self)
         
         self.translated = tk.StringVar(value="")
@@ -181,8 +205,42 @@ class WavfileMajorFrame(ctk.CTkFrame):
         self.clear_wave()
         self.play_btn.configure(state="disabled")
 
+    def apply_phrase_filter(self, a, b, c):
+        """
+        Search after the typing stops, not once per letter.
+        """
+        if self.pending_filter is not None:
+            self.after_cancel(self.pending_filter)
+        self.pending_filter = self.after(REFRESH_DELAY, self.populate_phrases)
+
+    def find_phrases(self, session, character, query):
+        """
+        The phrases of character's that match query, best match first.  A
+        match on the translation counts too.
+        """
+        hits = search.search(
+            session,
+            query,
+            limit=PHRASE_SEARCH_LIMIT,
+            character_id=character.id
+        )
+        # a phrase and its translation can both match
+        phrase_ids = list(dict.fromkeys(hit.phrase_id for hit in hits))
+        if not phrase_ids:
+            return []
+
+        by_id = {
+            phrase.id: phrase for phrase in session.scalars(
+                select(models.Phrases).where(
+                    models.Phrases.id.in_(phrase_ids)
+                )
+            ).all()
+        }
+        return [by_id[phrase_id] for phrase_id in phrase_ids if phrase_id in by_id]
+
     def populate_phrases(self):
         log.debug('** populate_phrases() called **')
+        self.pending_filter = None
         
         try:
             character = models.get_selected_character()
@@ -190,13 +248,18 @@ class WavfileMajorFrame(ctk.CTkFrame):
             # no character selected
             return 
 
+        query = self.phrase_filter.get().strip()
+
         # pull phrases for this character from the database
         with models.db() as session:
-            character_phrases = session.scalars(
-                select(models.Phrases).where(
-                    models.Phrases.character_id == character.id
-                )
-            ).all()
+            if query:
+                character_phrases = self.find_phrases(session, character, query)
+            else:
+                character_phrases = session.scalars(
+                    select(models.Phrases).where(
+                        models.Phrases.character_id == character.id
+                    )
+                ).all()
 
         values = []
         self.phrase_id = []
@@ -219,6 +282,9 @@ class WavfileMajorFrame(ctk.CTkFrame):
                 self.translated.set(message)
             else:
                 self.translated.set("")
+        elif query:
+            # leave whatever was chosen alone, nothing matched
+            log.debug(f'No phrases of {character.name} match {query!r}')
         else:
             self.chosen_phrase.set(
                 f'I have no record of what {character.name} says.')
@@ -304,7 +370,6 @@ class WavfileMajorFrame(ctk.CTkFrame):
         """
         Play the cachefile
         """
-        global ENGINE_OVERRIDE
         message = self.chosen_phrase.get()
         
         character = models.get_selected_character()
@@ -348,7 +413,6 @@ class WavfileMajorFrame(ctk.CTkFrame):
         doing this with the selected value instead of the db value for the current
         character was a bad idea.  sorry.
         """
-        global ENGINE_OVERRIDE
         message = self.chosen_phrase.get()    
 
         log.debug(f"Speak: {message}")
@@ -357,9 +421,9 @@ class WavfileMajorFrame(ctk.CTkFrame):
         ttsengine = engine_registry.get_engine(engine_name)
         log.debug(f"Engine: {ttsengine}")
 
-        effect_list = [
+        effect_list = fuse_effects([
             e.get_effect() for e in models.get_effects()
-        ]
+        ])
 
         character = models.get_selected_character()
         
@@ -413,7 +477,11 @@ class WavfileMajorFrame(ctk.CTkFrame):
                 log.debug(f'{ttsengine}(None, {self.rank}, name={character.name}, category={character.category}).say(msg, effect_list, sink={sink})')
                 ttsengine(None, self.rank, name=character.name, category=character.category).say(msg, effect_list, sink=sink)
             except USE_SECONDARY:
+                health.failure(engine_name)
                 return
+
+            # somebody asking for it by hand is as good a probe as any
+            health.success(engine_name)
                     
             self.show_wave(cachefile + ".wav")
 
@@ -482,7 +550,7 @@ class EngineSelectAndConfigure(ctk.CTkFrame):
             speech_engine_selection, 
             variable=self.selected_engine,
             state='readonly',
-            values=[e.cosmetic for (_, e) in engine_registry.engine_list()]
+            values=engine_registry.cosmetic_list()
         )
 
         base_tts.grid(
@@ -637,6 +705,7 @@ class EngineSelectAndConfigure(ctk.CTkFrame):
                 change = True
 
             if change:
+                prerender.request(character.id)
                 log.debug(
                     f'''Saving {self.rank} changed engine_string {character.name}
                         {character.engine=} 
@@ -810,6 +879,7 @@ class EffectList(ctk.CTkFrame):
                 session.add(effect)
                 session.commit()
                 session.refresh(effect)
+                prerender.request(character.id)
 
             for key in effect_config_frame.tkvars:
                 # save the current effect configuration, these will presumably
@@ -842,6 +912,10 @@ class EffectList(ctk.CTkFrame):
                 )
             )
 
+            effect = session.get(models.Effects, effect_id)
+            if effect:
+                prerender.request(effect.character_id)
+
             # clear the effect itself
             session.execute(
                 delete(models.Effects).where(
@@ -985,6 +1059,27 @@ class DetailSide(ctk.CTkScrollableFrame):
             command=self.remove_character
         ).place(relx=1, rely=0, anchor='ne')
 
+        # put the preset back on everybody in this character's group
+        self.preset_group = None
+        preset_frame = ctk.CTkFrame(biography, fg_color="transparent")
+        self.apply_preset_button = ctk.CTkButton(
+            preset_frame,
+            text="Apply Preset",
+            command=self.apply_group_preset,
+            state="disabled",
+            width=100
+        )
+        self.apply_preset_button.pack(side="top")
+        self.preset_rerender = tk.BooleanVar(value=False)
+        ctk.CTkCheckBox(
+            preset_frame,
+            text="and re-render",
+            variable=self.preset_rerender,
+            onvalue=True,
+            offvalue=False
+        ).pack(side="top")
+        preset_frame.place(relx=0, rely=0, anchor='nw')
+
         biography.grid(column=0, row=0, sticky='nsew')
 
         self.engine_notebook = ctk.CTkTabview(
@@ -1015,6 +1110,16 @@ class DetailSide(ctk.CTkScrollableFrame):
         )
         randomize.place(relx=1, rely=0.014, anchor='ne')
 
+        # throw away and re-render every clip this character has
+        self.rerender_job = None
+        self.rerender_button = ctk.CTkButton(
+            self.engine_notebook,
+            text="Re-render",
+            command=self.rerender,
+            width=100
+        )
+        self.rerender_button.place(relx=1, x=-110, rely=0.014, anchor='ne')
+
         self.primary_tab = EngineSelectAndConfigure(
             'primary', primary, 
         )
@@ -1053,6 +1158,89 @@ class DetailSide(ctk.CTkScrollableFrame):
         self.load_character(character.category, character.name)
         return
 
+    def rerender(self):
+        """
+        Start re-rendering every clip for the selected character, or cancel
+        the job that is already running.
+        """
+        if self.rerender_job is not None and self.rerender_job.is_alive():
+            self.rerender_job.cancel()
+            self.rerender_button.configure(text="Cancelling")
+            return
+
+        character = models.get_selected_character()
+        self.rerender_job = rerender.start(character.id)
+        self.rerender_button.configure(text="Cancel")
+        self.after(500, self.rerender_progress)
+
+    def apply_group_preset(self):
+        """
+        Re-apply the group preset to every character in the selected
+        character's group, then either re-render all of their clips now or
+        leave it to the pre-renderer.
+        """
+        if not self.preset_group:
+            return
+
+        with models.db() as session:
+            character_ids = models.apply_group_preset(self.preset_group, session)
+
+        if not character_ids:
+            return
+
+        if self.preset_rerender.get():
+            if self.rerender_job is not None and self.rerender_job.is_alive():
+                self.rerender_job.cancel()
+            self.rerender_job = rerender.start_group(self.preset_group, character_ids)
+            self.rerender_button.configure(text="Cancel")
+            self.after(500, self.rerender_progress)
+        else:
+            prerender.request(*character_ids)
+            if self.listside:
+                self.listside.status.set(
+                    f"Applied the {self.preset_group} preset to "
+                    f"{len(character_ids)} characters"
+                )
+
+        # the selected character is one of them
+        character = models.get_selected_character()
+        self.load_character(character.cat_str(), character.name)
+
+    def rerender_progress(self):
+        """
+        the job runs in its own thread, we poll it from here so tk only gets
+        touched by the tk thread.
+        """
+        job = self.rerender_job
+        progress = job.progress()
+
+        if self.listside:
+            if progress['state'] in ("starting", "invalidating"):
+                message = "Re-render: finding clips"
+            elif progress['state'] == "running":
+                message = (
+                    f"Re-rendering {progress['name']} "
+                    f"{progress['done']}/{progress['total']}"
+                )
+                if progress['rate']:
+                    message += (
+                        f" {progress['rate']:.1f}/s, "
+                        f"{int(progress['eta'])}s left"
+                    )
+            else:
+                message = (
+                    f"Re-render {progress['state']}: "
+                    f"{progress['done']}/{progress['total']}"
+                )
+            if progress['failed']:
+                message += f" ({progress['failed']} failed)"
+            self.listside.status.set(message)
+
+        if job.is_alive():
+            self.after(500, self.rerender_progress)
+        else:
+            self.rerender_button.configure(text="Re-render")
+
     def selected_category_and_name(self):
         """
         returns tuple of category, name, item
@@ -1117,7 +1305,7 @@ class DetailSide(ctk.CTkScrollableFrame):
             npc_data = settings.get_npc_data(name)
             description = ""   
             if npc_data:
-                description = npc_data["description"]
+                description = settings.get_npc_description(name)
                 group_name = npc_data["group_name"]
             self.character_description.set(description)
             self.group_name.set(group_name)
@@ -1135,6 +1323,14 @@ class DetailSide(ctk.CTkScrollableFrame):
                 character.group_name = group_name
                 session.commit()
 
+        self.preset_group = character.group_name
+        has_preset = bool(
+            self.preset_group and models.get_group_preset(self.preset_group)
+        )
+        self.apply_preset_button.configure(
+            state="normal" if has_preset else "disabled"
+        )
+
         # set the engines itself
         # log.debug('b character: %s | %s | %s', character, character.engine, character.engine_secondary)
         self.primary_tab.set_engine(character.engine)
@@ -1188,6 +1384,11 @@ class ListSide(ctk.CTkFrame):
 
         self.list_filter.trace_add('write', self.apply_list_filter)
 
+        # (category, name) -> tree node, group label -> tree node
+        self.nodes = {}
+        self.groups = {}
+        self.pending_refresh = None
+
         #listarea = ctk.CTkFrame(self)
         columns = ('name', )
         self.character_tree = ttk.Treeview(
@@ -1211,6 +1412,13 @@ class ListSide(ctk.CTkFrame):
 
         vsb.grid(column=2, row=1, sticky='ns')
 
+        self.status = tk.StringVar(value="")
+        ctk.CTkLabel(
+            self,
+            textvariable=self.status,
+            anchor="w"
+        ).grid(column=0, row=2, sticky='w')
+
         ctk.CTkButton(
             self,
             text="Refresh",
@@ -1229,7 +1437,16 @@ class ListSide(ctk.CTkFrame):
         self.character_tree.yview_scroll(int(-1*(event.delta/120)), "units")
 
     def apply_list_filter(self, a, b, c):
-        self.refresh_character_list()
+        self.request_refresh()
+
+    def request_refresh(self, delay=REFRESH_DELAY):
+        """
+        Refresh the list after things calm down; typing "Positron" into the
+        filter is one refresh, not eight.
+        """
+        if self.pending_refresh is not None:
+            self.after_cancel(self.pending_refresh)
+        self.pending_refresh = self.after(delay, self.refresh_character_list)
 
     def selected_category_and_name(self):
         """
@@ -1272,84 +1489,179 @@ class ListSide(ctk.CTkFrame):
                     open=True
                 )
 
+    def prerender_progress(self, progress):
+        """
+        progress is the PRERENDER event from prerender.PrerenderScheduler
+        """
+        if progress['state'] == "running":
+            self.status.set(
+                f"Pre-rendering {progress['checked']}/{progress['total']} "
+                f"({progress['rendered']} new)"
+            )
+        else:
+            self.status.set(
+                f"Pre-rendered {progress['rendered']} clips"
+                + (f", {progress['skipped']} over budget" if progress['skipped'] else "")
+            )
+
+    def get_parent(self, category, group_name):
+        """
+        The tree node (creating it if we need to) a character belongs under,
+        and the tag for the character row.
+        """
+        if group_name:
+            label = group_name
+        elif category == models.category_str2int("player"):
+            label = "Players"
+        else:
+            return "", "base"
+
+        parent = self.groups.get(label)
+        if parent is None:
+            log.debug(f'Creating new group for {label!r}')
+            parent = self.character_tree.insert(
+                "", 
+                'end', 
+                values=(label, ),
+                tags=('grouprow')
+            )
+            self.groups[label] = parent
+        return parent, "member"
+
+    def place_character(self, category, name, group_name, index):
+        """
+        Make sure (category, name) is in the tree, under the right parent, at
+        index.  Only touches this one row.
+        """
+        parent, tag = self.get_parent(category, group_name)
+        key = (category, name)
+        node = self.nodes.get(key)
+
+        if node is None:
+            node = self.character_tree.insert(
+                parent, 
+                index, 
+                values=(name, ),
+                tags=(models.category_int2str(category), tag)
+            )
+            self.nodes[key] = node
+        elif (
+            self.character_tree.parent(node) != parent or 
+            self.character_tree.index(node) != index
+        ):
+            self.character_tree.move(node, parent, index)
+            self.character_tree.item(
+                node, tags=(models.category_int2str(category), tag)
+            )
+        return node
+
+    def matching_characters(self, session, name=None, category=None):
+        """
+        The characters that pass the list filter, most recent speakers first.
+        The filtering is done by sqlite, we only get back the columns we draw.
+        """
+        query = select(
+            models.Character.name,
+            models.Character.category,
+            models.Character.group_name,
+        )
+
+        filter_string = self.list_filter.get()
+        if filter_string:
+            escaped = (
+                filter_string.replace("\\", "\\\\")
+                .replace("%", "\\%")
+                .replace("_", "\\_")
+            )
+            query = query.where(
+                models.Character.name.ilike(f"%{escaped}%", escape="\\")
+            )
+
+        if name is not None:
+            query = query.where(
+                models.Character.name == name,
+                models.Character.category == category
+            )
+
+        return session.execute(
+            query.order_by(
+                desc(models.Character.last_spoke),
+            ).order_by(
+                models.Character.category,
+            )
+        ).all()
+
     def refresh_character_list(self):
         log.debug('Refreshing Character list from the database...')
+        self.pending_refresh = None
 
-        filter_string = self.list_filter.get()
+        with models.db() as session:
+            all_characters = self.matching_characters(session)
+
+        # walk the list in order, moving/inserting only what is out of place
+        wanted = set()
+        positions = {}
+        # groups go where their first member is
+        root_order = []
+        for name, category, group_name in all_characters:
+            parent, _ = self.get_parent(category, group_name)
+            index = positions.get(parent, 0)
+            positions[parent] = index + 1
+
+            node = self.place_character(category, name, group_name, index)
+            wanted.add((category, name))
+
+            if parent == "":
+                root_order.append(node)
+            elif index == 0:
+                root_order.append(parent)
+
+        # and get rid of everything that isn't there anymore
+        for key in list(self.nodes):
+            if key not in wanted:
+                self.character_tree.delete(self.nodes.pop(key))
+
+        for label in list(self.groups):
+            group = self.groups[label]
+            if not self.character_tree.get_children(group):
+                self.character_tree.delete(group)
+                del self.groups[label]
+
+        for root_index, node in enumerate(root_order):
+            if self.character_tree.index(node) != root_index:
+                self.character_tree.move(node, "", root_index)
+
+        if not self.character_tree.selection() and all_characters:
+            name, category, group_name = all_characters[0]
+            self.character_tree.selection_set(
+                [self.nodes[(category, name)], ]
+            )
+        
+        self.character_tree.tag_configure('grouprow', background='grey28', foreground='white')
+        self.character_tree.tag_configure('member', background='grey60', foreground='black')
+
+    def character_spoke(self, name, category):
+        """
+        name just said something; move them (and only them) to the top of their
+        part of the list.
+        """
+        if isinstance(category, str):
+            category = models.category_str2int(category)
 
         with models.db() as session:
-            all_characters = session.scalars(
-                select(
-                    models.Character
-                ).order_by(
-                    desc(models.Character.last_spoke),
-                ).order_by(
-                    models.Character.category,
-                )
-            ).all()
+            found = self.matching_characters(session, name=name, category=category)
 
-            # yes, this could/should be baked into the query and that would be 
-            # more efficient
-            if filter_string not in [None, ""]:
-                all_characters = [
-                    character for character in all_characters if filter_string.upper() in character.name.upper()
-                ]
+        if not found:
+            # filtered out, or not somebody we know about.
+            return
 
-        if all_characters:
-            self.character_tree.delete(*self.character_tree.get_children())
-            self.character_tree["columns"] = ("Name", )
-            
-            groups = {}
-            first = None
-            player_category = models.category_str2int("player")
-            for c in all_characters:
-                if c.group_name:
-                    parent = groups.get(c.group_name)
-                    if parent is None:
-                        log.debug(f'Creating new group for {c.group_name!r}')
-                        parent = self.character_tree.insert(
-                            "", 
-                            'end', 
-                            values=(c.group_name, ),
-                            tags=('grouprow')
-                        )
-                        groups[c.group_name] = parent
-                    tag = "member"
-                elif c.category == player_category:
-                    parent = groups.get("Players")
-                    if parent is None:
-                        log.debug('Creating new group for Players')
-                        parent = self.character_tree.insert(
-                            "", 
-                            'end', 
-                            values=("Players", ),
-                            tags=('grouprow')
-                        )
-                        groups["Players"] = parent
-                    tag = "member"
-                else:
-                    # log.debug(f'Not a player or group member {c=}')
-                    parent = ""
-                    tag = "base"
-
-                node = self.character_tree.insert(
-                    parent, 
-                    'end', 
-                    values=(c.name, ),
-                    tags=(models.category_int2str(c.category), tag)
-                )
+        name, category, group_name = found[0]
+        self.place_character(category, name, group_name, 0)
 
-                if first is None:
-                    first = node
+        parent = self.character_tree.parent(self.nodes[(category, name)])
+        if parent and self.character_tree.index(parent) != 0:
+            self.character_tree.move(parent, "", 0)
 
-            # resetting to the first entry is obviously wrong
-            self.character_tree.selection_set(
-                [first, ]
-            )
-            
-            self.character_tree.tag_configure('grouprow', background='grey28', foreground='white')
-            self.character_tree.tag_configure('member', background='grey60', foreground='black')
-    
     def delete_selected_character(self):
         category, name, item = self.selected_category_and_name()
 
@@ -1443,6 +1755,12 @@ class ListSide(ctk.CTkFrame):
             # if our parent was deleted because we were the last
             # member of the group this will fail with an error.
             self.character_tree.delete(current_item)
+
+        # forget about the rows we just removed
+        self.nodes.pop((models.category_str2int(category), name), None)
+        for label in list(self.groups):
+            if not self.character_tree.exists(self.groups[label]):
+                del self.groups[label]
         # self.character_tree.selection_remove(current_item)
 
         # de-select the previously chosen item (which should be gone anyway)
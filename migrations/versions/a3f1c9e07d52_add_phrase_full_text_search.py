@@ -0,0 +1,61 @@
+"""add phrase full text search
+
+Revision ID: a3f1c9e07d52
+Revises: 4b8e2d1c7a90
+Create Date: 2024-08-17 09:41:52.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f1c9e07d52'
+down_revision: Union[str, None] = '4b8e2d1c7a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_TABLES = (
+    ('phrases_fts', 'phrases'),
+    ('translations_fts', 'translations'),
+)
+
+
+def upgrade() -> None:
+    # alembic doesn't know about virtual tables or triggers, this is all by hand.
+    # It is deliberately a frozen copy of cnv/database/search.py fts_ddl() as
+    # of this revision, not an import of it: a migration has to keep doing
+    # what it did when it was written.  A change to fts_ddl() needs a new
+    # migration.
+    for fts_table, content_table in FTS_TABLES:
+        op.execute(
+            f"CREATE VIRTUAL TABLE {fts_table} USING fts5("
+            f"text, content='{content_table}', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {content_table} BEGIN "
+            f"INSERT INTO {fts_table}(rowid, text) VALUES (new.id, new.text); "
+            "END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {content_table} BEGIN "
+            f"INSERT INTO {fts_table}({fts_table}, rowid, text) VALUES ('delete', old.id, old.text); "
+            "END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {fts_table}_au AFTER UPDATE ON {content_table} BEGIN "
+            f"INSERT INTO {fts_table}({fts_table}, rowid, text) VALUES ('delete', old.id, old.text); "
+            f"INSERT INTO {fts_table}(rowid, text) VALUES (new.id, new.text); "
+            "END"
+        )
+        # index everything that is already there
+        op.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    for fts_table, content_table in FTS_TABLES:
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {fts_table}")
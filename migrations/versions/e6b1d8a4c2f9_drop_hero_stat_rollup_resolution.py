@@ -0,0 +1,33 @@
+"""drop hero_stat_rollup resolution
+
+Revision ID: e6b1d8a4c2f9
+Revises: d9a3f6c1e4b8
+Create Date: 2024-08-25 16:03:41.582267
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b1d8a4c2f9'
+down_revision: Union[str, None] = 'd9a3f6c1e4b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # every bucket is per-minute, the column never said anything
+    op.drop_index('ix_hero_stat_rollup_bucket', table_name='hero_stat_rollup')
+    with op.batch_alter_table('hero_stat_rollup') as batch_op:
+        batch_op.drop_column('resolution')
+    op.create_index('ix_hero_stat_rollup_bucket', 'hero_stat_rollup', ['hero_id', 'bucket_start'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_hero_stat_rollup_bucket', table_name='hero_stat_rollup')
+    with op.batch_alter_table('hero_stat_rollup') as batch_op:
+        batch_op.add_column(sa.Column('resolution', sa.Integer(), nullable=False, server_default='60'))
+    op.create_index('ix_hero_stat_rollup_bucket', 'hero_stat_rollup', ['hero_id', 'resolution', 'bucket_start'], unique=True)
@@ -19,11 +19,66 @@ Output is a json file with a bunch of entries like:
   },
 ...
 }
+
+It also writes the same thing as all_npcs.db, which is what Sidekick actually
+reads.  Loading the json meant parsing all 1.5 MB of it, descriptions and all,
+in every process, just to find out one NPC's gender.  The db is indexed by
+name, looking somebody up doesn't read anything else, and the descriptions
+are in their own table for when the biography wants one.
+
+No raw_data handy?  Rebuild the db from the json we already have:
+
+    python raw_data_condenser.py --from-json
 """
+import argparse
 import os
 import json
+import sqlite3
 
-def main():
+NPC_JSON = 'all_npcs.json'
+NPC_DB = 'all_npcs.db'
+
+
+def write_index(output, filename=NPC_DB):
+    """
+    output is the all_npcs.json dict.
+    """
+    # start fresh, it's all or nothing anyway
+    if os.path.exists(filename):
+        os.unlink(filename)
+
+    connection = sqlite3.connect(filename)
+    with connection:
+        connection.execute(
+            "CREATE TABLE npc ("
+            "name TEXT PRIMARY KEY, gender TEXT, group_name TEXT"
+            ") WITHOUT ROWID"
+        )
+        connection.execute(
+            "CREATE TABLE npc_description ("
+            "name TEXT PRIMARY KEY, description TEXT"
+            ") WITHOUT ROWID"
+        )
+        connection.executemany(
+            "INSERT INTO npc VALUES (?, ?, ?)",
+            [
+                (name, entry.get("gender"), entry.get("group_name"))
+                for name, entry in sorted(output.items())
+            ]
+        )
+        connection.executemany(
+            "INSERT INTO npc_description VALUES (?, ?)",
+            [
+                (name, entry["description"])
+                for name, entry in sorted(output.items())
+                if entry.get("description")
+            ]
+        )
+    connection.execute("VACUUM")
+    connection.close()
+
+
+def condense():
     output = {}
     for filename in os.listdir("raw_data"):
         with open(os.path.join("raw_data", filename), "r") as infile:
@@ -49,15 +104,36 @@ def main():
                             "group_name": group_name,
                             "description": description
                         }
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '--from-json',
+        action='store_true',
+        help=f'skip raw_data, build {NPC_DB} from {NPC_JSON}'
+    )
+    args = parser.parse_args()
+
+    if args.from_json:
+        with open(NPC_JSON, 'r') as infile:
+            output = json.loads(infile.read())
+    else:
+        output = condense()
 
-    with open('all_npcs.json', 'w') as outfile:
-        outfile.write(
-            json.dumps(
-                output, 
-                indent=2,
-                sort_keys=True
+        with open(NPC_JSON, 'w') as outfile:
+            outfile.write(
+                json.dumps(
+                    output, 
+                    indent=2,
+                    sort_keys=True
+                )
             )
-        )
+
+    write_index(output)
+    print(f'{len(output)} NPCs written to {NPC_DB}')
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
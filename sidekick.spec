@@ -12,7 +12,7 @@ a = Analysis(
         ('.venv\\Lib\\site-packages\\pyfiglet', '.\\pyfiglet'),
         ('sidekick.ico', '.'),
         ('cnv\\lib\\icons\\trash-2.png', 'cnv\\lib\\icons\\'),
-        ('all_npcs.json', '.'),
+        ('all_npcs.db', '.'),
     ],
     datas=[
         ('cnv\\effects\\*', 'cnv\\effects\\'),
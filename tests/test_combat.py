@@ -0,0 +1,129 @@
+import pytest
+
+from cnv.chatlog import combat
+from cnv.chatlog.combat import Debuff, Gain, Hit, Miss
+
+
+HIT_LINES = [
+    (
+        "You hit Abomination with your Assassin's Psi Blade for 43.22 points of Psionic damage.",
+        Hit("Abomination", "Assassin's Psi Blade", 43.22, "Psionic"),
+    ),
+    (
+        "You hit Zealot with your Bitter Ice Blast for 13088 points of Cold damage (SCOURGE)",
+        Hit("Zealot", "Bitter Ice Blast", 13088, "Cold", special="Scourge"),
+    ),
+    (
+        "You hit Button Man Buckshot with your Dart Burst for 10.61 points of Lethal damage over time.",
+        Hit("Button Man Buckshot", "Dart Burst", 10.61, "Lethal", over_time=True),
+    ),
+    (
+        "You hit Arva with your Freeze Ray for 7.49 points of Cold damage over time (SCOURGE).",
+        Hit("Arva", "Freeze Ray", 7.49, "Cold", over_time=True, special="Scourge"),
+    ),
+    (
+        "You hit Lost Hunter with your Fire Blast for 1 point of Fire damage (CRITICAL)",
+        Hit("Lost Hunter", "Fire Blast", 1, "Fire", special="Critical"),
+    ),
+    (
+        "You hit Council Marauder with your Total Focus for 1,204.5 points of Smashing damage.",
+        Hit("Council Marauder", "Total Focus", 1204.5, "Smashing"),
+    ),
+]
+
+DEBUFF_LINES = [
+    (
+        "You hit Gravedigger Slammer with your Twilight Grasp reducing their damage and chance to hit and healing you and your allies!",
+        Debuff("Gravedigger Slammer", "Twilight Grasp"),
+    ),
+]
+
+MISS_LINES = [
+    (
+        "MISSED Mamba Blade!! Your Contaminated Strike power had a 95.00% chance to hit, you rolled a 95.29.",
+        Miss("Mamba Blade", "Contaminated Strike", 95.0, 95.29),
+    ),
+    (
+        "MISSED Tsoo Ink Man!! Your Ice Bolt power had a 75.00% chance to hit, you rolled a 80.1",
+        Miss("Tsoo Ink Man", "Ice Bolt", 75.0, 80.1),
+    ),
+]
+
+GAIN_LINES = [
+    ("You gain 104 experience and 36 influence.", Gain(104, 36)),
+    ("You gain 15 experience, work off 15 debt, and gain 14 influence.", Gain(15, 14, 15)),
+    ("You gain 26 experience and work off 2,676 debt.", Gain(26, None, 2676)),
+    ("You gain 70 experience.", Gain(70)),
+    ("You gain 250 influence.", Gain(None, 250)),
+    ("You gain 1,250 infamy.", Gain(None, 1250)),
+    ("You gain 12 information.", Gain(None, 12)),
+]
+
+# none of these are combat lines we count
+NOT_COMBAT = [
+    "You gain 2 stacks of Blood Frenzy!",
+    "You gain the Fury badge!",
+    "You hit the ground running.",
+    "MISSED the bus.",
+    "Hellfrost hits you with their Chilling Embrace for 12.5 points of Cold damage.",
+    "Mamba Blade MISSES! Their Contaminated Strike power had a 95.00% chance to hit, but they rolled a 97.29.",
+    "You have defeated Abomination",
+    "",
+]
+
+
+@pytest.mark.parametrize("text,expected", HIT_LINES + DEBUFF_LINES + MISS_LINES + GAIN_LINES)
+def test_parse(text, expected):
+    assert combat.parse(text) == expected
+
+
+@pytest.mark.parametrize("text", NOT_COMBAT)
+def test_parse_not_combat(text):
+    assert combat.parse(text) is None
+
+
+@pytest.mark.parametrize("text,_", HIT_LINES)
+def test_hit_pattern(text, _):
+    assert combat.HIT_PATTERN.fullmatch(text)
+    assert combat.NO_DAMAGE_PATTERN.fullmatch(text) is None
+    assert combat.MISS_PATTERN.fullmatch(text) is None
+
+
+@pytest.mark.parametrize("text,_", DEBUFF_LINES)
+def test_no_damage_pattern(text, _):
+    assert combat.NO_DAMAGE_PATTERN.fullmatch(text)
+    assert combat.HIT_PATTERN.fullmatch(text) is None
+
+
+@pytest.mark.parametrize("text,_", MISS_LINES)
+def test_miss_pattern(text, _):
+    assert combat.MISS_PATTERN.fullmatch(text)
+    assert combat.HIT_PATTERN.fullmatch(text) is None
+
+
+@pytest.mark.parametrize("text,expected", GAIN_LINES)
+def test_gain_patterns(text, expected):
+    for pattern, value in [
+        (combat.GAIN_EXPERIENCE, expected.experience),
+        (combat.GAIN_INFLUENCE, expected.influence),
+        (combat.GAIN_DEBT, expected.debt),
+    ]:
+        m = pattern.search(text)
+        if value is None:
+            assert m is None
+        else:
+            assert combat._number(m.group(1)) == value
+
+
+@pytest.mark.parametrize("text", NOT_COMBAT)
+def test_patterns_not_combat(text):
+    assert combat.HIT_PATTERN.fullmatch(text) is None
+    assert combat.NO_DAMAGE_PATTERN.fullmatch(text) is None
+    assert combat.MISS_PATTERN.fullmatch(text) is None
+    assert combat.GAIN_EXPERIENCE.search(text) is None
+    assert combat.GAIN_INFLUENCE.search(text) is None
+
+
+def test_critical():
+    assert combat.parse(HIT_LINES[4][0]).critical
+    assert not combat.parse(HIT_LINES[0][0]).critical